@@ -0,0 +1,71 @@
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from qsig import DataRepo
+from qsig.indicators import ItemIndicatorCache
+
+# ------------------------------------------------------------------------------
+# Compare computing standard indicators over one item of 2M rows (about 23
+# days of 1s bars) in memory, against chunked mode, which reads the item from a
+# DataRepo in chunks and streams the results back to it.  Chunked mode bounds
+# the peak memory by the chunk size rather than the length of the history.
+# ------------------------------------------------------------------------------
+
+EXPRESSIONS = ["SMA(5m)", "SMA(30m)", "FAST=EWMA(10m)", "RET(1m)[FAST]", "DEN(5m)[volume]",
+               "MAX(60m)", "FWD(1m)", "Z=FAST-SMA(30m)"]
+
+
+def make_bars(rows=2_000_000):
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2024-01-01", periods=rows, freq="s")
+    return pd.DataFrame({"close": 100 + rng.standard_normal(rows).cumsum() * 0.01,
+                         "volume": rng.uniform(0, 10, rows)}, index=index)
+
+
+def make_cache():
+    cache = ItemIndicatorCache(instrument="BTCUSDT")
+    for expr in EXPRESSIONS:
+        cache.add_indicator(expr)
+    return cache
+
+
+def traced(func):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def in_memory(library):
+    cache = make_cache()
+    cache.add_data(library.read("BTCUSDT"))
+    cache.compute()
+    return cache.to_frame(include_data=False)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        repo = DataRepo(path)
+        bars, results = repo.get_library("bars"), repo.get_library("results")
+        bars.write("BTCUSDT", make_bars())
+
+        memory_sec, memory_peak, expected = traced(lambda: in_memory(bars))
+        print(f"in memory:          {memory_sec:6.2f}s  peak {memory_peak / 2**20:7.1f}MB")
+        for chunk_rows in [50_000, 200_000]:
+            chunked_sec, chunked_peak, _ = traced(lambda: make_cache().compute_chunked(
+                bars, "BTCUSDT", results, "BTCUSDT", chunk_rows))
+            pd.testing.assert_frame_equal(results.read("BTCUSDT"), expected,
+                                          check_freq=False, rtol=1e-12)
+            print(f"chunks of {chunk_rows:7}:  {chunked_sec:6.2f}s  "
+                  f"peak {chunked_peak / 2**20:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import statistics
+import subprocess
+import sys
+
+# ------------------------------------------------------------------------------
+# Time the import of the package in a fresh interpreter, as paid by every
+# short CLI job and worker process, against the bare interpreter start.  The
+# heavy modules should only be imported when their features are used.
+# ------------------------------------------------------------------------------
+
+STATEMENTS = {
+    "python": "pass",
+    "import qsig": "import qsig",
+    "import qsig.indicators": "import qsig.indicators",
+    "qsig.DataRepo": "import qsig; qsig.DataRepo",
+    "ItemIndicatorCache": "from qsig.indicators import ItemIndicatorCache",
+}
+
+HEAVY_MODULES = ["pandas", "numpy", "talib", "webbrowser"]
+
+
+def time_statement(statement: str, repeat: int = 7) -> float:
+    code = f"import time; t0 = time.perf_counter(); {statement}; print(time.perf_counter() - t0)"
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(float(output.split()[-1]))
+    return statistics.median(timings)
+
+
+def heavy_modules(statement: str) -> list:
+    code = f"import sys; {statement}; print(' '.join(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], check=True,
+                            capture_output=True, text=True).stdout
+    loaded = set(output.split())
+    return [x for x in HEAVY_MODULES if x in loaded]
+
+
+def main():
+    for label, statement in STATEMENTS.items():
+        print(f"{label:24} {time_statement(statement) * 1e3:7.1f}ms  "
+              f"heavy modules: {', '.join(heavy_modules(statement)) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from qsig.indicators import ItemIndicatorCache
+
+# ------------------------------------------------------------------------------
+# Compare a parameter sweep of 60 windows added as separate indicators, against
+# the same sweep declared as a family, eg SMA(1m..60m:1m), whose members are
+# computed together from a single read of the input.
+# ------------------------------------------------------------------------------
+
+CODES = ["SMA", "EWMA", "RET"]
+
+
+def make_bars(rows):
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2024-01-01", periods=rows, freq="min")
+    return pd.DataFrame({"close": 100 + rng.standard_normal(rows).cumsum()}, index=index)
+
+
+def run(data, expressions):
+    cache = ItemIndicatorCache("BTCUSDT")
+    cache.add_data(data)
+    for expr in expressions:
+        cache.add_indicator(expr)
+    t0 = time.perf_counter()
+    cache.compute(max_workers=1)
+    return time.perf_counter() - t0, cache.to_frame(include_data=False)
+
+
+def main():
+    for rows in [1440, 100_000]:
+        data = make_bars(rows)
+        for code in CODES:
+            separate_sec, separate = run(data, [f"{code}({x}m)[close]" for x in range(1, 61)])
+            family_sec, family = run(data, [f"{code}(1m..60m:1m)[close]"])
+            pd.testing.assert_frame_equal(family[separate.columns], separate, rtol=1e-10)
+            print(f"{code:5} rows={rows:<7} separate: {separate_sec * 1e3:6.1f}ms  "
+                  f"family: {family_sec * 1e3:6.1f}ms  ({separate_sec / family_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from qsig.indicators.indicator_cache import RootIndicatorCache
+
+# ------------------------------------------------------------------------------
+# Compare computing standard indicators over a wide universe (500 symbols, one
+# day of 1m bars) with one ItemIndicatorCache per symbol, against panel mode,
+# where each indicator is evaluated once on the whole feature frame.
+# ------------------------------------------------------------------------------
+
+EXPRESSIONS = ["SMA(5m)", "SMA(30m)", "EWMA(10m)", "RET(1m)", "DEN(5m)[volume]", "FWD(5m)"]
+
+
+def make_panels(rows=1440, symbols=500):
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2024-01-01", periods=rows, freq="min")
+    columns = [f"SYM{i:03d}" for i in range(symbols)]
+    close = pd.DataFrame(100 + rng.standard_normal((rows, symbols)).cumsum(axis=0),
+                         index=index, columns=columns)
+    close.name = "close"
+    volume = pd.DataFrame(rng.uniform(0, 10, (rows, symbols)), index=index, columns=columns)
+    volume.name = "volume"
+    return close, volume
+
+
+def run(panel: bool, close, volume):
+    t0 = time.perf_counter()
+    cache = RootIndicatorCache(panel=panel)
+    cache.add_data(close)
+    cache.add_data(volume)
+    cache.set_universe(list(close.columns))
+    for expr in EXPRESSIONS:
+        cache.add_indicator(expr)
+    cache.compute(max_workers=1)
+    results = [cache.results(expr) for expr in EXPRESSIONS]
+    return time.perf_counter() - t0, results
+
+
+def main():
+    close, volume = make_panels()
+    item_sec, item_results = run(False, close, volume)
+    panel_sec, panel_results = run(True, close, volume)
+    for a, b in zip(item_results, panel_results):
+        pd.testing.assert_frame_equal(a, b, check_names=False)
+    print(f"per-item: {item_sec:.3f}s")
+    print(f"panel:    {panel_sec:.3f}s  ({item_sec / panel_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from qsig.indicators.indicator_cache import RootIndicatorCache
+
+# ------------------------------------------------------------------------------
+# Compare computing standard indicators over a wide universe (500 symbols, one
+# week of 1m bars) in a single process, against sharded mode, where the
+# universe is split across a pool of processes.  Indicators are evaluated per
+# item, which is where the GIL-bound parts of the evaluation dominate.
+# ------------------------------------------------------------------------------
+
+EXPRESSIONS = ["SMA(5m)", "SMA(30m)", "FAST=EWMA(10m)", "RET(1m)[FAST]", "DEN(5m)[volume]",
+               "MAX(60m)", "Z=FAST-SMA(30m)"]
+
+
+def make_panels(rows=7 * 1440, symbols=500):
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2024-01-01", periods=rows, freq="min")
+    columns = [f"SYM{i:03d}" for i in range(symbols)]
+    close = pd.DataFrame(100 + rng.standard_normal((rows, symbols)).cumsum(axis=0),
+                         index=index, columns=columns)
+    close.name = "close"
+    volume = pd.DataFrame(rng.uniform(0, 10, (rows, symbols)), index=index, columns=columns)
+    volume.name = "volume"
+    return close, volume
+
+
+def run(processes, close, volume):
+    cache = RootIndicatorCache()
+    cache.add_data(close)
+    cache.add_data(volume)
+    cache.set_universe(list(close.columns))
+    for expr in EXPRESSIONS:
+        cache.add_indicator(expr)
+    t0 = time.perf_counter()
+    cache.compute(max_workers=1, processes=processes)
+    return time.perf_counter() - t0, cache.results()
+
+
+def main():
+    close, volume = make_panels()
+    single_sec, expected = run(None, close, volume)
+    print(f"single process: {single_sec:6.2f}s")
+    for processes in sorted({2, 4, 8, os.cpu_count() or 1} - {1}):
+        sharded_sec, results = run(processes, close, volume)
+        pd.testing.assert_frame_equal(results, expected)
+        print(f"{processes:3} processes:  {sharded_sec:6.2f}s  ({single_sec / sharded_sec:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
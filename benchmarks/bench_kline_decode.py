@@ -0,0 +1,53 @@
+import json
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from qsig.data.binance.binance_fetch_bars import _decode_klines, _klines_to_frame, _normalise_klines
+
+# ------------------------------------------------------------------------------
+# Compare decoding a day of 1s klines (86,400 rows, as 87 replies of up to 1000
+# rows) using the json.loads + DataFrame + astype path, against decoding
+# straight into typed numpy arrays.
+# ------------------------------------------------------------------------------
+
+
+def make_replies(rows=86_400, rows_per_reply=1000):
+    t0 = 1_704_067_200_000
+    replies = []
+    for start in range(0, rows, rows_per_reply):
+        klines = []
+        for i in range(start, min(start + rows_per_reply, rows)):
+            t = t0 + i * 1000
+            klines.append([t, f"{42000 + i % 97}.12000000", "42100.00000000",
+                           "41900.00000000", f"{42000 + i % 89}.55000000",
+                           "1.23400000", t + 999, "51825.01234000", i % 50,
+                           "0.61700000", "25912.50617000", "0"])
+        replies.append(json.dumps(klines, separators=(",", ":")))
+    return replies
+
+
+def decode_pandas(replies):
+    dfs = [pd.DataFrame(json.loads(raw)) for raw in replies]
+    return _normalise_klines(pd.concat(dfs).reset_index(drop=True))
+
+
+def decode_numpy(replies):
+    return _klines_to_frame(np.concatenate([_decode_klines(raw) for raw in replies]))
+
+
+def main():
+    replies = make_replies()
+    a = decode_pandas(replies)
+    b = decode_numpy(replies)
+    for col in b.columns:
+        assert (a[col].values == b[col].values).all(), col
+
+    for name, func in [("json + pandas", decode_pandas), ("numpy", decode_numpy)]:
+        best = min(timeit.repeat(lambda: func(replies), number=1, repeat=5))
+        print(f"{name:>15}: {best * 1e3:8.1f} ms per symbol-day")
+
+
+if __name__ == "__main__":
+    main()
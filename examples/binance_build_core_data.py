@@ -31,11 +31,12 @@ def main():
 
     # --------------------------------------------------------------------------
     # Fetch the raw market data (OHLC bars) from Binance. These files are stored
-    # under the tick data directory.  Files already downloaded are not
-    # downloaded again.
+    # under the tick data directory.  Only bars missing from files already
+    # downloaded are fetched, and for coarse bar intervals requests are
+    # coalesced across days.
     # --------------------------------------------------------------------------
 
-    fetch_binance_bars(universe, date_from, date_upto, bin_interval)
+    fetch_binance_bars(universe, date_from, date_upto, bin_interval, coalesce=True)
 
     # --------------------------------------------------------------------------
     # Build core market data features dataframes.  This step will always rebuild
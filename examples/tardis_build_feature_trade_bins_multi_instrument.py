@@ -1,13 +1,11 @@
 import datetime as dt
-import pandas as pd
 import getpass
 import logging
 
 from qsig import BarInterval
 from qsig.data.tardis.tardis_downloader import TardisDownloader
-from qsig.data.tardis.tardis_binner import create_trade_bins, build_trade_bin_uri
+from qsig.data.tardis.tardis_binner import create_trade_bins, assemble_feature_panels
 from qsig.model.instrument import Instrument, ExchCode
-from qsig.util.time import date_range
 import qsig
 
 
@@ -47,18 +45,16 @@ def main():
     # create the Tardis downloader
     tardis = TardisDownloader(api_key=api_key)
 
-    # Download Tardis data files for each date - files are only downloaded if
-    # they don't already exist locally.
+    # Download Tardis data files for each symbol and date, several files at a
+    # time - files are only downloaded if they don't already exist locally.
     logging.info("fetching Tardis CSV files ...")
-    for tardis_symbol in tardis_symbols:
-        for date in date_range(date_from, date_upto):
-            location = tardis.fetch_csv_file(year=date.year,
-                                             month=date.month,
-                                             day=date.day,
-                                             dataset=dataset,
-                                             exchange=tardis_exchange,
-                                             symbol=tardis_symbol)
-            logging.info(f"csv location: {location}")
+    results = tardis.fetch_csv_files(exchange=tardis_exchange,
+                                     dataset=dataset,
+                                     symbols=tardis_symbols,
+                                     date_from=date_from,
+                                     date_upto=date_upto)
+    for result in results:
+        logging.info(f"csv {result.status}: {result.path}")
 
     # ----------------------------------------------------------------------
     # Create trade bins from Tardis trade files
@@ -100,26 +96,8 @@ def main():
     features = ["open", "high", "low", "close", "buy_volume", "sell_volume",
                 "volume", "count", "vwap"]
 
-    for feature in features:
-        logging.info(f"building feature '{feature}' in library '{lib.name}'")
-        per_feature_dataframes = []
-        for inst in universe:
-            per_inst_dataframes = []
-            for date in date_range(date_from, date_upto):
-                # locate the previously generated trade bin file
-                uri = build_trade_bin_uri(inst, date, bin_rule)
-                trade_bins = pd.read_parquet(uri.path)
-                per_inst_dataframes.append(trade_bins[feature])
-
-            df = pd.concat(per_inst_dataframes)
-            df.name = inst.ticker()
-            per_feature_dataframes.append(df)
-            del df, per_inst_dataframes
-
-        df = pd.concat(per_feature_dataframes, axis=1)
-        df.name = feature
-        lib.write(feature, df)
-        del df, per_feature_dataframes
+    assemble_feature_panels(universe, date_from, date_upto, bin_rule,
+                            features, lib)
 
     logging.info("items in repo: {}".format(", ".join(lib.list_keys())))
 
@@ -4,6 +4,7 @@ import getpass
 
 from qsig.data.tardis.tardis_downloader import TardisDownloader
 from qsig.data.tardis.tardis_binner import create_trade_bins, build_trade_bin_uri
+from qsig.data.tickfiles import read_tick_file
 from qsig.model.instrument import Instrument, ExchCode
 from qsig.util.time import date_range
 import qsig
@@ -80,7 +81,7 @@ def main():
 
     for date in date_range(dt_from, dt_upto):
         uri = build_trade_bin_uri(instrument, date, bin_rule)
-        dataframes.append(pd.read_parquet(uri.path))
+        dataframes.append(read_tick_file(uri))
 
     data = pd.concat(dataframes, axis=0)
 
@@ -0,0 +1,31 @@
+import logging
+
+from qsig.data.tickfiles import migrate_tick_files_to_monthly
+import qsig
+
+
+def main():
+    qsig.init()
+
+    # ----------------------------------------------------------------------
+    # Coalesce daily tick files into monthly files
+    # ----------------------------------------------------------------------
+
+    # The daily tick file layout writes one small parquet file per symbol per
+    # day.  For many symbols over many years, opening all those files can
+    # dominate the time taken to build research datasets.  Here we coalesce
+    # the daily parquet files under the tick data home into one file per
+    # symbol per month, with each day stored as a parquet row group.  The QSig
+    # functions that read tick files work with either layout.
+    #
+    # Each monthly file is checked against the daily files it replaces before
+    # the daily files are removed.
+
+    monthly_files = migrate_tick_files_to_monthly(qsig.settings.tick_data_home(),
+                                                  remove_daily=True)
+
+    logging.info(f"monthly tick files written: {len(monthly_files)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,40 @@
+import importlib
 import logging
 import sys
 
-from .model.marketdata import BarInterval
 from .model.instrument import ExchCode, Instrument
 
-from .util.report import quick_plot
-from .util.datarepo import DataRepo, DataRepoError
-
 __version__ = "0.1.0"
 
+# Attributes loaded on first access, so that importing qsig stays fast for
+# short jobs and worker processes: these modules import pandas, and the
+# report module the browser and compression modules.
+_LAZY = {
+    "BarInterval": ".model.marketdata",
+    "quick_plot": ".util.report",
+    "DataRepo": ".util.datarepo",
+    "DataRepoError": ".util.datarepo",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        # submodules, such as qsig.settings, are also imported on access
+        try:
+            return importlib.import_module(f".{name}", __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+            raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
+
 BPS = 1.0e4
 
 def init(debug=False):
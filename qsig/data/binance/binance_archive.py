@@ -0,0 +1,172 @@
+import datetime as dt
+import logging
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from qsig.data.binance.binance_data import instrument_to_binance_feedcode, build_tick_file_uri
+from qsig.data.tickfiles import tick_file_exists, write_tick_files
+from qsig.data.binance.binance_fetch_bars import (
+    KLINE_COLUMNS, BINANCE_CLOSE_TIME_COL_INDEX, DAY_MS, _klines_to_frame, _to_binance_interval)
+from qsig.model.instrument import Instrument
+from qsig.model.marketdata import BarInterval
+from qsig.util.time import date_range
+
+# Ingest the Binance public kline archives (as published on data.binance.vision)
+# from a local mirror directory.  The mirror is expected to keep the archive
+# layout found below the 'data/' path of the public site, for example:
+#
+#   <archive_dir>/spot/monthly/klines/BTCUSDT/1h/BTCUSDT-1h-2024-01.zip
+#   <archive_dir>/spot/daily/klines/BTCUSDT/1h/BTCUSDT-1h-2024-02-01.zip
+#
+# Each zip holds a single headerless CSV, with the same columns as the REST
+# klines endpoint.  Monthly archives are preferred; daily archives are used for
+# the days not covered by a monthly archive.
+
+# Spot archives from 2025 onwards have microsecond timestamps; any timestamp
+# above this value is taken to be in microseconds.
+_MAX_MS_TIMESTAMP = 10**14
+
+
+@dataclass
+class _ArchiveIngestReport:
+    archives_read: int = 0
+    days_missing: int = 0
+    files_written: int = 0
+    files_already_existed: int = 0
+
+
+def _archive_folder(archive_dir, market: str, period: str, symbol: str, interval: str):
+    return Path(archive_dir, market, period, "klines", symbol, interval)
+
+
+# Return a list of (archive path, dates) pairs, where dates are the days of
+# the requested range that the archive provides, and the list of days that
+# have no archive.
+def find_kline_archives(archive_dir,
+                        symbol: str,
+                        interval: BarInterval,
+                        date_from: dt.date,
+                        date_upto: dt.date,
+                        market: str = "spot"):
+    binance_interval = _to_binance_interval(interval)
+    monthly = _archive_folder(archive_dir, market, "monthly", symbol, binance_interval)
+    daily = _archive_folder(archive_dir, market, "daily", symbol, binance_interval)
+
+    archives = dict()
+    missing = []
+    for date in date_range(date_from, date_upto):
+        path = monthly / f"{symbol}-{binance_interval}-{date.year:04d}-{date.month:02d}.zip"
+        if not os.path.isfile(path):
+            path = daily / f"{symbol}-{binance_interval}-{date.isoformat()}.zip"
+            if not os.path.isfile(path):
+                missing.append(date)
+                continue
+        archives.setdefault(path, []).append(date)
+    return list(archives.items()), missing
+
+
+# Decode the CSV inside a kline archive into a 2-D float64 array with one row
+# per kline, and times in milliseconds.  The CSV is read directly from the zip
+# member stream, without extracting to disk.
+def read_kline_archive(path) -> np.ndarray:
+    with zipfile.ZipFile(path) as archive:
+        members = [x for x in archive.namelist() if x.endswith(".csv")]
+        assert len(members) == 1, f"expected a single CSV in '{path}'"
+        with archive.open(members[0]) as raw:
+            # some archives have a header row, so check the first byte
+            has_header = not raw.peek(1)[:1].isdigit()
+            df = pd.read_csv(raw, header=None, skiprows=1 if has_header else 0,
+                             dtype=np.float64, engine="c")
+
+    klines = df.to_numpy()
+    assert klines.shape[1] == len(KLINE_COLUMNS), f"unexpected columns in '{path}'"
+    for col in [0, BINANCE_CLOSE_TIME_COL_INDEX]:
+        is_us = klines[:, col] > _MAX_MS_TIMESTAMP
+        klines[is_us, col] = np.floor(klines[is_us, col] / 1000)
+    return klines
+
+
+# Read one archive, and write the daily bar files for `dates`.  Days whose bar
+# file already exists are not rewritten, unless `overwrite` is set.
+def _ingest_archive(path, symbol: str, interval: BarInterval, dates: List[dt.date],
+                    tick_home, overwrite: bool) -> _ArchiveIngestReport:
+    report = _ArchiveIngestReport()
+    uris = {date: build_tick_file_uri(symbol, date, interval, tick_home=tick_home)
+            for date in dates}
+    todo = [date for date, uri in uris.items() if overwrite or not tick_file_exists(uri)]
+    report.files_already_existed = len(dates) - len(todo)
+    if not todo:
+        return report
+
+    logging.info(f"reading binance kline archive '{path}'")
+    klines = read_kline_archive(path)
+    report.archives_read += 1
+    bar_days = klines[:, 0].astype(np.int64) // DAY_MS
+
+    # write the days together, so that each monthly tick file is rewritten once
+    uris_written, frames = [], []
+    for date in todo:
+        day_start = int(pd.Timestamp(date).value // 10**6)
+        day = day_start // DAY_MS
+        rows = klines[(bar_days == day) &
+                      (klines[:, BINANCE_CLOSE_TIME_COL_INDEX] < day_start + DAY_MS)]
+        if rows.shape[0] == 0:
+            logging.warning(f"no bars for {symbol} @ {date} in archive '{path}'")
+            continue
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        uri = uris[date]
+        logging.info(f"writing binance market-data bars to '{uri.path}'")
+        uris_written.append(uri)
+        frames.append(_klines_to_frame(rows))
+    write_tick_files(uris_written, frames)
+    report.files_written += len(uris_written)
+    return report
+
+
+# Ingest Binance kline archives from a local mirror into the daily bar files
+# used by `build_tick_file_uri`.  Archives are processed in parallel in a
+# process pool, one archive per task.
+def ingest_binance_kline_archives(universe: List[Union[Instrument, str]],
+                                  date_from: dt.date,
+                                  date_upto: dt.date,
+                                  interval: BarInterval,
+                                  archive_dir,
+                                  market: str = "spot",
+                                  max_workers: int = None,
+                                  tick_home=None,
+                                  overwrite: bool = False) -> _ArchiveIngestReport:
+    report = _ArchiveIngestReport()
+    jobs = []
+    for instrument in universe:
+        if isinstance(instrument, Instrument):
+            symbol = instrument_to_binance_feedcode(instrument)
+        else:
+            symbol = instrument
+        archives, missing = find_kline_archives(archive_dir, symbol, interval,
+                                                date_from, date_upto, market)
+        for date in missing:
+            logging.warning(f"no kline archive found for {symbol} @ {date}")
+        report.days_missing += len(missing)
+        jobs.extend([(path, symbol, interval, dates, tick_home, overwrite)
+                     for path, dates in archives])
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_ingest_archive, *job) for job in jobs]
+        for future in futures:
+            item = future.result()
+            report.archives_read += item.archives_read
+            report.files_written += item.files_written
+            report.files_already_existed += item.files_already_existed
+
+    logging.info(f"archives read: {report.archives_read}")
+    logging.info(f"days without archive: {report.days_missing}")
+    logging.info(f"files written: {report.files_written}")
+    logging.info(f"files already existed: {report.files_already_existed}")
+    return report
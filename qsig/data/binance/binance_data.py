@@ -1,9 +1,13 @@
 import datetime
 import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 from typing import Union, List
 
-from qsig.data.tickfiles import TickFileURI
+from qsig.data.tickfiles import TickFileURI, read_tick_files
 from qsig.model.instrument import Instrument
 from qsig.model.marketdata import BarInterval
 from qsig.util.time import date_range
@@ -18,7 +22,8 @@ def instrument_to_binance_feedcode(inst: Instrument):
 
 def build_tick_file_uri(instrument: Union[Instrument, str],
                         date: datetime.date,
-                        interval: BarInterval):
+                        interval: BarInterval,
+                        tick_home=None):
     assert isinstance(date, datetime.date)
 
     if isinstance(instrument, Instrument):
@@ -34,92 +39,144 @@ def build_tick_file_uri(instrument: Union[Instrument, str],
                       dataset=dataset,
                       date=date,
                       symbol=feedcode)
+    if tick_home is not None:
+        uri = TickFileURI(filename=uri.filename, collection=uri.collection,
+                          venue=uri.venue, dataset=uri.dataset, date=uri.date,
+                          symbol=uri.symbol, tick_home=tick_home)
     return uri
 
 
+TRADE_FEATURES = ['open', 'high', 'low', 'close', 'return', 'volume',
+                  'taker_buy_volume', 'taker_sell_volume']
+
+# columns of the Binance raw bars that are used to build the trade features
+_BAR_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume',
+                'taker_buy_base_asset_volume']
+
+
+# Read every daily bar file for one instrument, and return a dataframe with a
+# column per trade feature, over the full date range.
+def _read_instrument_trade_features(inst: Instrument,
+                                    dates: List[datetime.date],
+                                    bar_interval: BarInterval,
+                                    skip_missing_files: bool,
+                                    tick_home=None):
+    logging.info(f"building features for {inst}")
+    # build the locations of the Binance raw market data files, and load them
+    uris = [build_tick_file_uri(inst, date, bar_interval, tick_home=tick_home)
+            for date in dates]
+    logging.info(f"reading {len(uris)} binance market-data bar files for {inst}")
+    frames = []
+    for uri, frame in zip(uris, read_tick_files(uris, columns=_BAR_COLUMNS)):
+        # check for presence of raw market data
+        if frame is None:
+            if skip_missing_files:
+                logging.warning(f"missing binance file '{uri.path}'")
+                continue
+            else:
+                raise FileNotFoundError(f"missing binance file '{uri.path}'")
+        frames.append(frame)
+
+    if not frames:
+        return None
+    df = pd.concat(frames)
+    del frames
+
+    # convert the binance bar to  qsig bar on-the-fly
+    # qsig bar convention is to label bins with the bar close time
+    df["time"] = df["open_time"] + bar_interval.to_pandas_timedelta()
+    df = df.set_index("time", verify_integrity=True)
+
+    return pd.DataFrame({
+        "open": df["open"],
+        "high": df["high"],
+        "low": df["low"],
+        "close": df["close"],
+        "return": df["close"].pct_change(periods=1, fill_method=None),
+        "volume": df["volume"],
+        "taker_buy_volume": df["taker_buy_base_asset_volume"],
+        "taker_sell_volume": df["volume"] - df["taker_buy_base_asset_volume"],
+    })
+
+
+# Build the per-feature dataframes (such as "close", "open" etc.) for a
+# universe, where each dataframe has a column per instrument over the full
+# history, and write them to `lib`.
+#
+# Each daily bar file is read once, with instruments read in parallel, and the
+# feature dataframes are assembled directly in memory.  If `memory_budget` (in
+# bytes) is given and the instrument data held in memory exceeds it, the held
+# data is spilled to temporary '_part.*' items in `lib`, which are read back
+# one feature at a time.
 def build_binance_trade_features_dataset(universe: List[Instrument],
                                          date_from,
                                          date_upto,
                                          bar_interval,
                                          lib,
-                                         skip_missing_files=False):
-    features = ['open', 'high', 'low', 'close', 'return', 'volume',
-                'taker_buy_volume', 'taker_sell_volume']
-
-    # To build the aggregated features dataframe, we initially build each
-    # feature for a single name, over its full history.  So below the outer loop
-    # is the instrument list, and the inner loop is the date list.
-    for inst in universe:
-        feature_map = {x: [] for x in features}
-        logging.info(f"building features for {inst}")
-        for date in date_range(date_from, date_upto):
-
-            # build the location of the Binance raw market data file
-            uri = build_tick_file_uri(inst, date, bar_interval)
-
-            # check for presence of raw market data, and if found, load
-            try:
-                logging.info(f"reading binance market-data bars '{uri.path}'")
-                df = pd.read_parquet(uri.path)
-            except FileNotFoundError as e:
-                if skip_missing_files:
-                    logging.warning(f"missing binance file '{uri.path}'")
-                    continue
-                else:
-                    raise e
-
-            # convert the binance bar to  qsig bar on-the-fly
-            # qsig bar convention is to label bins with the bar close time
-
-            df["time"] = df["open_time"] + bar_interval.to_pandas_timedelta()
-            df = df.set_index("time", verify_integrity=True)
-
+                                         skip_missing_files=False,
+                                         max_workers: int = None,
+                                         memory_budget: int = None,
+                                         tick_home=None):
+    features = TRADE_FEATURES
+    dates = list(date_range(date_from, date_upto))
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+    held = dict()  # instrument ticker -> features dataframe
+    held_bytes = 0
+    spilled = []
+
+    def _spill():
+        nonlocal held, held_bytes
+        for ticker, df in held.items():
             for feature_name in features:
-                if feature_name == "return":
-                    continue  # generated later
-                elif feature_name == "taker_buy_volume":
-                    feature_map[feature_name].append(df['taker_buy_base_asset_volume'])
-                elif feature_name == "taker_sell_volume":
-                    feature_map[feature_name].append(df['volume'] - df['taker_buy_base_asset_volume'])
-                else:
-                    feature_map[feature_name].append(df[feature_name])
-            del feature_name, df, uri
-
-        # now that we have features for each date in the date-range, we combine
-        # the to get the full history
-        for feature_name in features:
-            full_hist = pd.Series()
-            if feature_name == "return":
-                if len(feature_map["close"]) > 0:
-                    full_hist = pd.concat(feature_map["close"]).pct_change(periods=1, fill_method=None)
-            else:
-                if len(feature_map[feature_name]) > 0:
-                    full_hist = pd.concat(feature_map[feature_name])
-            full_hist.name = inst.ticker()
-            part_name = f"_part.{feature_name}.{inst.ticker()}"
-            logging.info(f"writing item part: {part_name}")
-            lib.write(part_name, full_hist.to_frame())
-            del full_hist
-        del feature_map
-
-    # Build the final features dataframes - that is, have a dataframe for
-    # "close", "open" etc.  This is done by concatenating the full history of
+                part_name = f"_part.{feature_name}.{ticker}"
+                logging.info(f"writing item part: {part_name}")
+                lib.write(part_name, df[feature_name].to_frame())
+            spilled.append(ticker)
+        held = dict()
+        held_bytes = 0
+
+    def _collect(inst, future):
+        nonlocal held_bytes
+        df = future.result()
+        if df is None:
+            return
+        held[inst.ticker()] = df
+        held_bytes += int(df.memory_usage(deep=False).sum())
+        if memory_budget is not None and held_bytes > memory_budget:
+            logging.info(f"memory budget exceeded ({held_bytes} bytes), "
+                         f"spilling to item parts")
+            _spill()
+
+    # Read the instruments on a thread pool, keeping at most `max_workers`
+    # reads in flight, so that memory use can be checked as results arrive.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for inst in universe:
+            pending.append((inst, executor.submit(_read_instrument_trade_features,
+                                                  inst, dates, bar_interval,
+                                                  skip_missing_files, tick_home)))
+            if len(pending) >= max_workers:
+                _collect(*pending.popleft())
+        while pending:
+            _collect(*pending.popleft())
+
+    # Build the final features dataframes, by combining the full history of
     # each feature for all names into a single per-feature dataframe.
+    expected_cols = [inst.ticker() for inst in universe]
     for feature_name in features:
-        dfs = []
-        for inst in universe:
-            part_name = f"_part.{feature_name}.{inst.ticker()}"
-            df = lib.read(part_name)
-            if not df.empty:
-                dfs.append(df)
-                lib.delete(part_name)
+        columns = {ticker: df[feature_name] for ticker, df in held.items()}
+        for ticker in spilled:
+            part_name = f"_part.{feature_name}.{ticker}"
+            columns[ticker] = lib.read(part_name).iloc[:, 0]
+            lib.delete(part_name)
 
-        final = pd.concat(dfs, axis=1)
+        final = pd.concat(columns, axis=1) if columns else pd.DataFrame()
 
         # in case some symbols are entirely missing, put them back in with NaN
         # data
-        expected_cols = [inst.ticker() for inst in universe]
         final = final.reindex(columns=expected_cols)
 
         logging.info(f"writing final item '{feature_name}'")
         lib.write(feature_name, final)
+        del final, columns
@@ -1,15 +1,17 @@
+import json
 import logging
+import os
 import datetime as dt
 from typing import Optional
 import requests
-import json
 import numpy as np
 import pandas as pd
-import os
 from zoneinfo import ZoneInfo
 from dataclasses import dataclass
 
 from qsig.data.binance.binance_data import instrument_to_binance_feedcode, build_tick_file_uri
+from qsig.data.tickfiles import (TickFileURI, tick_file_exists, read_tick_file, write_tick_file,
+                                 write_tick_files)
 from qsig.model.instrument import Instrument
 from qsig.model.marketdata import BarInterval, TimeUnit
 from qsig.util.time import date_range
@@ -69,22 +71,28 @@ def call_http_fetch_klines(symbol, start_time: int, end_time: int, interval: Bar
 
 BINANCE_CLOSE_TIME_COL_INDEX = 6
 
+KLINE_COLUMNS = [
+    "open_time",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "close_time",
+    "quote_asset_volume",
+    "number_of_trades",
+    "taker_buy_base_asset_volume",
+    "taker_buy_quote_asset_volume",
+    "ignore",
+]
+
+# characters deleted from a klines JSON reply to leave just the comma
+# separated numbers
+_KLINE_JSON_DELETE = str.maketrans("", "", '[]"')
+
 
 def _normalise_klines(df):
-    columns = [
-        "open_time",
-        "open",
-        "high",
-        "low",
-        "close",
-        "volume",
-        "close_time",
-        "quote_asset_volume",
-        "number_of_trades",
-        "taker_buy_base_asset_volume",
-        "taker_buy_quote_asset_volume",
-        "ignore",
-    ]
+    columns = KLINE_COLUMNS
 
     if df is None or df.empty:
         return pd.DataFrame(columns=columns)
@@ -110,14 +118,48 @@ def _normalise_klines(df):
     return df
 
 
-def _fetch_klines_for_date(symbol: str, bar_date: dt.date, interval: BarInterval):
+# Decode a klines JSON reply into a 2-D float64 array with one row per kline.
+# Rather than build Python lists of strings via json.loads, the brackets and
+# quotes are stripped and the remaining numbers are parsed in a single numpy
+# call.  The millisecond times and trade counts are well inside the range of
+# integers that float64 represents exactly.
+def _decode_klines(raw_json: str) -> np.ndarray:
+    text = raw_json.translate(_KLINE_JSON_DELETE).strip()
+    if not text:
+        return np.empty((0, len(KLINE_COLUMNS)))
+    values = np.fromstring(text, sep=",")
+    if values.size % len(KLINE_COLUMNS) != 0:
+        raise ValueError(f"cannot decode klines reply, {values.size} values found")
+    return values.reshape(-1, len(KLINE_COLUMNS))
+
+
+# Build the final klines dataframe from decoded kline rows, with int64
+# millisecond times converted to datetimes and int64 trade counts.
+def _klines_to_frame(klines: np.ndarray) -> pd.DataFrame:
+    data = dict()
+    for i, col in enumerate(KLINE_COLUMNS):
+        if col == "ignore":
+            continue
+        values = klines[:, i]
+        if col in ("open_time", "close_time"):
+            values = pd.to_datetime(values.astype(np.int64), unit="ms")
+        elif col == "number_of_trades":
+            values = values.astype(np.int64)
+        else:
+            values = np.ascontiguousarray(values)
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def _fetch_klines_for_date(symbol: str, bar_date: dt.date, interval: BarInterval,
+                           fetch_klines=call_http_fetch_klines):
     logging.info("fetching binance trade-bars for date {}".format(bar_date))
 
     # t0 and t1 and the start and end times of the date range in UTC
     t0 = _date_to_datetime(bar_date)
     t1 = _date_to_datetime(bar_date + dt.timedelta(days=1))
 
-    all_dfs = []
+    all_blocks = []
 
     lower = int(t0.timestamp())*1000  # convert to milli-sec
     upper = int(t1.timestamp())*1000  # convert to milli-sec
@@ -127,60 +169,57 @@ def _fetch_klines_for_date(symbol: str, bar_date: dt.date, interval: BarInterval
         # make the request
         req_lower = lower
         req_upper = upper
-        raw_json = call_http_fetch_klines(symbol, req_lower, req_upper, interval)
+        raw_json = fetch_klines(symbol, req_lower, req_upper, interval)
 
         if raw_json == "":
             logging.warning(f"no JSON data retrieved for {symbol} @ {bar_date}")
             break
 
-        df = pd.DataFrame(json.loads(raw_json))
-        reply_row_count = df.shape[0]  # normally we have 1000 rows
+        block = _decode_klines(raw_json)
+        reply_row_count = block.shape[0]  # normally we have 1000 rows
         logging.debug(f"request returned {reply_row_count} rows")
 
-        if df.empty:
+        if reply_row_count == 0:
             logging.warning(f"empty dataframe encountered for {symbol} @ {bar_date}")
             break
 
-        # trim the returned dataframe to be within our request range, just in
-        # case exchange has returned additional rows
-
-        df = df.loc[(df[0] >= req_lower) & (df[0] < req_upper)]
-        if df.shape[0] != reply_row_count:
+        # trim the returned rows to be within our request range, just in case
+        # exchange has returned additional rows
+        block = block[(block[:, 0] >= req_lower) & (block[:, 0] < req_upper)]
+        if block.shape[0] != reply_row_count:
             logging.debug(
                 "retained {} rows of {} within actual request range".format(
-                    df.shape[0], reply_row_count
+                    block.shape[0], reply_row_count
                 )
             )
 
-        if df.empty:
+        if block.shape[0] == 0:
             break
 
-        all_dfs.append(df)
+        all_blocks.append(block)
 
-        lower = df.iloc[-1, BINANCE_CLOSE_TIME_COL_INDEX]
-        del df, req_lower, req_upper, raw_json, reply_row_count
+        lower = int(block[-1, BINANCE_CLOSE_TIME_COL_INDEX])
+        del block, req_lower, req_upper, raw_json, reply_row_count
     del lower, upper
 
-
-    df = pd.concat(all_dfs).reset_index(drop=True)
-    del all_dfs
-    df = _normalise_klines(df)
-    if df.empty:
+    if not all_blocks:
         logging.warning(f"no data retrieved for {symbol} @ {bar_date}")
-        return df
+        return _klines_to_frame(_decode_klines(""))
 
-    df = df.sort_values(by="open_time")
+    klines = np.concatenate(all_blocks)
+    del all_blocks
+    klines = klines[np.argsort(klines[:, 0], kind="stable")]
 
     # retain only rows within user requested period
-    sel = (df["open_time"] >= np.datetime64(int(t0.timestamp()), 's')) & \
-        (df["close_time"] < np.datetime64(int(t1.timestamp()), 's'))
-    df = df[sel]
+    sel = (klines[:, 0] >= int(t0.timestamp()) * 1000) & \
+        (klines[:, BINANCE_CLOSE_TIME_COL_INDEX] < int(t1.timestamp()) * 1000)
 
-    return df
+    return _klines_to_frame(klines[sel])
 
 
-def fetch_bars_for_date(symbol: str, date: dt.date, interval: BarInterval):
-    return _fetch_klines_for_date(symbol, date, interval)
+def fetch_bars_for_date(symbol: str, date: dt.date, interval: BarInterval,
+                        fetch_klines=call_http_fetch_klines):
+    return _fetch_klines_for_date(symbol, date, interval, fetch_klines)
 
 
 @dataclass
@@ -188,9 +227,13 @@ class _BinanceBarCollectorReport:
     files_requested: int = 0
     files_already_existed: int = 0
     new_files_downloaded: int = 0
+    files_updated: int = 0
+    files_failed: int = 0
+    http_requests: int = 0
 
 
-def fetch_binance_single_bar(instrument, date, interval: BarInterval, report=None):
+def fetch_binance_single_bar(instrument, date, interval: BarInterval, report=None,
+                             fetch_klines=call_http_fetch_klines, tick_home=None):
     assert isinstance(date, dt.date)
 
     if isinstance(instrument, Instrument):
@@ -201,28 +244,239 @@ def fetch_binance_single_bar(instrument, date, interval: BarInterval, report=Non
     if report:
         report.files_requested += 1
 
-    uri = build_tick_file_uri(instrument, date, interval)
+    uri = build_tick_file_uri(instrument, date, interval, tick_home=tick_home)
 
-    local_fn = uri.path
-    if os.path.isfile(local_fn):
+    if tick_file_exists(uri):
         if report:
             report.files_already_existed += 1
     else:
-        os.makedirs(uri.folder, exist_ok=True)
-        data = fetch_bars_for_date(feedcode, date, interval)
+        data = fetch_bars_for_date(feedcode, date, interval, fetch_klines)
         logging.info(f"writing binance market-data bars to '{uri.path}'")
-        data.to_parquet(uri.path)
+        write_tick_file(uri, data)
         if report:
             report.new_files_downloaded += 1
 
 
+DAY_MS = 86_400_000
+
+
+def _interval_ms(interval: BarInterval) -> int:
+    return int(interval.to_pandas_timedelta().total_seconds()) * 1000
+
+
+def _ms_to_date(time_ms: int) -> dt.date:
+    return dt.datetime.fromtimestamp(time_ms // 1000, tz=ZoneInfo("UTC")).date()
+
+
+def _open_times_ms(df: pd.DataFrame) -> np.ndarray:
+    return df["open_time"].values.astype("datetime64[ms]").astype(np.int64)
+
+
+# Return the open times (in ms) of the bars missing from a day's bar file,
+# which is all of the day's bars if there is no file.  Bars that have not yet
+# closed at time `now_ms` are not counted as missing.
+def _missing_bars_for_date(existing: Optional[pd.DataFrame],
+                           date: dt.date,
+                           interval_ms: int,
+                           now_ms: int) -> np.ndarray:
+    day_start = int(_date_to_datetime(date).timestamp()) * 1000
+    day_end = min(day_start + DAY_MS, now_ms - interval_ms + 1)
+    expected = np.arange(day_start, day_end, interval_ms, dtype=np.int64)
+    if existing is None or existing.empty:
+        return expected
+    return np.setdiff1d(expected, _open_times_ms(existing), assume_unique=True)
+
+
+# Group sorted bar open times into contiguous [start, end) ranges.
+def _coalesce_ranges(open_times: np.ndarray, interval_ms: int):
+    if open_times.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(open_times) != interval_ms) + 1
+    return [(int(chunk[0]), int(chunk[-1]) + interval_ms)
+            for chunk in np.split(open_times, breaks)]
+
+
+# Fetch all klines with open time in [start_ms, end_ms), paging through the
+# range in requests of up to 1000 bars, regardless of day boundaries.
+def _fetch_klines_for_range(symbol: str, start_ms: int, end_ms: int,
+                            interval: BarInterval, fetch_klines, report=None):
+    interval_ms = _interval_ms(interval)
+    blocks = []
+    lower = start_ms
+    while lower < end_ms:
+        raw_json = fetch_klines(symbol, lower, end_ms - 1, interval)
+        if report:
+            report.http_requests += 1
+        block = _decode_klines(raw_json) if raw_json else _decode_klines("")
+        block = block[(block[:, 0] >= lower) & (block[:, 0] < end_ms)]
+        if block.shape[0] == 0:
+            break
+        blocks.append(block)
+        lower = int(block[-1, 0]) + interval_ms
+    if not blocks:
+        return _decode_klines("")
+    return np.concatenate(blocks)
+
+
+# Bars that were requested but that Binance does not have, such as those
+# before a symbol was listed, or during an exchange outage, are recorded as
+# empty ranges, so that they are not requested again.  The ranges of each month
+# are kept in a JSON file next to the month's tick files, as a list of
+# [start, end) open times in ms.  Only bars before the first bar returned, or
+# closed for at least EMPTY_RANGE_MARGIN_MS, are recorded, so that recent bars
+# missing because of clock skew or publication lag are requested again.
+EMPTY_RANGE_MARGIN_MS = 2 * DAY_MS
+
+
+# Open times of the `absent` bars, of a range fetched at time `now_ms`, that
+# are safe to record as empty
+def _settled_absent_bars(absent: np.ndarray, klines: np.ndarray,
+                         interval_ms: int, now_ms: int) -> np.ndarray:
+    settled = absent + interval_ms <= now_ms - EMPTY_RANGE_MARGIN_MS
+    if klines.shape[0]:
+        settled |= absent < int(klines[0, 0])
+    return absent[settled]
+def _empty_ranges_path(uri: TickFileURI):
+    return uri.monthly_path.with_suffix(uri.monthly_path.suffix + ".empty.json")
+
+
+def _read_empty_ranges(uri: TickFileURI) -> list:
+    path = _empty_ranges_path(uri)
+    if not os.path.isfile(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _add_empty_ranges(uri: TickFileURI, ranges: list):
+    path = _empty_ranges_path(uri)
+    ranges = sorted({tuple(x) for x in _read_empty_ranges(uri) + ranges})
+    os.makedirs(path.parent, exist_ok=True)
+    temp_path = path.with_suffix(".temp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump([list(x) for x in ranges], f)
+    os.replace(temp_path, path)
+
+
+def _drop_empty_ranges(open_times: np.ndarray, ranges: list) -> np.ndarray:
+    keep = np.ones(open_times.size, dtype=bool)
+    for start, end in ranges:
+        keep &= (open_times < start) | (open_times >= end)
+    return open_times[keep]
+
+
+# Fetch bars for one instrument over a date range, storing them in the usual
+# daily files.  Unlike `fetch_binance_single_bar`, which always requests a
+# whole UTC day, here existing files are checked for missing bars, the missing
+# bars across all days are coalesced into contiguous ranges, and each range is
+# fetched in as few 1000-bar requests as possible.  For coarse intervals, such
+# as 1h, a single request can cover several weeks.  Each range is written to
+# the daily files as it is fetched, so memory is bounded by the largest range,
+# and only the open times of the existing files are read to find the gaps.
+# Bars recorded as empty are skipped, unless `refetch_empty`.
+def fetch_binance_bars_range(instrument,
+                             date_from: dt.date,
+                             date_upto: dt.date,
+                             interval: BarInterval,
+                             report=None,
+                             fetch_klines=call_http_fetch_klines,
+                             tick_home=None,
+                             now: dt.datetime = None,
+                             refetch_empty: bool = False):
+    if isinstance(instrument, Instrument):
+        feedcode = instrument_to_binance_feedcode(instrument)
+    else:
+        feedcode = instrument
+
+    interval_ms = _interval_ms(interval)
+    now = now or dt.datetime.now(ZoneInfo("UTC"))
+    now_ms = int(now.timestamp() * 1000)
+
+    # find the bars missing on each date, excluding the known empty ranges
+    uris = dict()
+    exists = dict()
+    missing = dict()
+    empty_ranges = dict()
+    for date in date_range(date_from, date_upto):
+        if report:
+            report.files_requested += 1
+        uri = build_tick_file_uri(instrument, date, interval, tick_home=tick_home)
+        if uri.monthly_path not in empty_ranges:
+            empty_ranges[uri.monthly_path] = [] if refetch_empty else _read_empty_ranges(uri)
+        uris[date] = uri
+        exists[date] = tick_file_exists(uri)
+        open_times = read_tick_file(uri, columns=["open_time"]) if exists[date] else None
+        missing[date] = _drop_empty_ranges(
+            _missing_bars_for_date(open_times, date, interval_ms, now_ms),
+            empty_ranges[uri.monthly_path])
+        if exists[date] and missing[date].size == 0:
+            if report:
+                report.files_already_existed += 1
+
+    # fetch the missing bars, as few contiguous ranges as possible, and write
+    # each range to the daily files
+    gaps = np.concatenate(list(missing.values())) if missing else np.empty(0, np.int64)
+    written = set()
+    for start, end in _coalesce_ranges(gaps, interval_ms):
+        klines = _fetch_klines_for_range(feedcode, start, end, interval, fetch_klines, report)
+        bar_days = klines[:, 0].astype(np.int64) // DAY_MS
+
+        # record the requested bars that were not returned
+        requested = gaps[(gaps >= start) & (gaps < end)]
+        absent = np.setdiff1d(requested, klines[:, 0].astype(np.int64), assume_unique=True)
+        absent = _settled_absent_bars(absent, klines, interval_ms, now_ms)
+        absent_days = absent // DAY_MS
+        dates = list(date_range(_ms_to_date(start),
+                                _ms_to_date(end - 1) + dt.timedelta(days=1)))
+        months = dict()
+        for date in dates:
+            day = int(_date_to_datetime(date).timestamp()) * 1000 // DAY_MS
+            months.setdefault(uris[date].monthly_path, (uris[date], []))[1].extend(
+                _coalesce_ranges(absent[absent_days == day], interval_ms))
+        for uri, ranges in months.values():
+            if ranges:
+                _add_empty_ranges(uri, [list(x) for x in ranges])
+
+        # split the fetched bars into the daily files
+        written_uris, frames = [], []
+        for date in dates:
+            if missing[date].size == 0:
+                continue
+            uri = uris[date]
+            day = int(_date_to_datetime(date).timestamp()) * 1000 // DAY_MS
+            data = _klines_to_frame(klines[bar_days == day])
+            if exists[date]:
+                if data.empty:
+                    logging.info(f"no new bars for '{uri.path}'")
+                    continue
+                data = pd.concat([read_tick_file(uri), data])
+                data = data.drop_duplicates(subset="open_time").sort_values(by="open_time")
+                data = data.reset_index(drop=True)
+                if report and date not in written:
+                    report.files_updated += 1
+            elif report:
+                report.new_files_downloaded += 1
+            exists[date] = True  # a day with several gaps is updated by each range
+            written.add(date)
+            logging.info(f"writing binance market-data bars to '{uri.path}'")
+            written_uris.append(uri)
+            frames.append(data)
+        write_tick_files(written_uris, frames)
+
+
 def fetch_binance_bars(universe,
                        date_from: dt.date,
                        date_upto: dt.date,
-                       bar_interval: BarInterval):
+                       bar_interval: BarInterval,
+                       coalesce: bool = False,
+                       refetch_empty: bool = False):
     report = _BinanceBarCollectorReport()
 
     for instrument in universe:
+        if coalesce:
+            fetch_binance_bars_range(instrument, date_from, date_upto,
+                                     bar_interval, report, refetch_empty=refetch_empty)
+            continue
         for date in date_range(date_from, date_upto):
             fetch_binance_single_bar(instrument, date, bar_interval, report)
 
@@ -233,3 +487,6 @@ def fetch_binance_bars(universe,
     logging.info(f"files requested: {report.files_requested}")
     logging.info(f"files already existed: {report.files_already_existed}")
     logging.info(f"files newly downloaded: {report.new_files_downloaded}")
+    if coalesce:
+        logging.info(f"files with gaps filled: {report.files_updated}")
+        logging.info(f"http requests made: {report.http_requests}")
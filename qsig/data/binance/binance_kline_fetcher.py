@@ -0,0 +1,224 @@
+import datetime as dt
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import requests
+
+from qsig.data.binance.binance_fetch_bars import (
+    api, fetch_binance_single_bar, fetch_binance_bars_range,
+    _BinanceBarCollectorReport, _to_binance_interval)
+from qsig.model.marketdata import BarInterval
+from qsig.util.time import date_range
+
+
+# Tracks the Binance request-weight budget that is shared by all the worker
+# threads of a fetcher.  Binance counts the weight used per IP over fixed one
+# minute windows, and reports its own count back in the X-MBX-USED-WEIGHT-1M
+# reply header; the local count is replaced by the server's whenever the
+# server's is higher.  A 429/418 reply pauses all workers.
+class _RequestWeightBudget:
+
+    WINDOW_SEC = 60
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._used = 0
+        self._window = None
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def _roll_window(self, now: float):
+        window = int(now // self.WINDOW_SEC)
+        if window != self._window:
+            self._window = window
+            self._used = 0
+
+    def acquire(self, weight: int):
+        """Block until `weight` can be spent without exceeding the budget"""
+        with self._cond:
+            while True:
+                now = time.time()
+                if now < self._paused_until:
+                    self._cond.wait(self._paused_until - now)
+                    continue
+                self._roll_window(now)
+                if self._used + weight <= self._limit:
+                    self._used += weight
+                    return
+                window_end = (self._window + 1) * self.WINDOW_SEC
+                logging.info(f"request weight budget used ({self._used}/{self._limit}), "
+                             f"waiting {window_end - now:.1f}s")
+                self._cond.wait(window_end - now)
+
+    def update_used(self, used: int):
+        with self._cond:
+            self._roll_window(time.time())
+            self._used = max(self._used, used)
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+            self._cond.notify_all()
+
+    @property
+    def used(self):
+        return self._used
+
+
+# Fetches Binance klines for many symbols in parallel.  All worker threads
+# share one pooled keep-alive session and one request-weight budget, so the
+# fetcher can run as fast as Binance allows without being banned.  Requests
+# that time out, or fail to connect, are retried with backoff as 5xx replies.
+class BinanceKlineFetcher:
+
+    # Binance spot API allows 6000 request weight per minute, per IP; by
+    # default we leave some headroom for other processes on the same host.
+    WEIGHT_LIMIT = 6000
+    KLINES_WEIGHT = 2
+    RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+    def __init__(self,
+                 api_url: str = api,
+                 weight_limit: int = int(WEIGHT_LIMIT * 0.8),
+                 max_workers: int = 8,
+                 max_retries: int = 5,
+                 backoff_sec: float = 1.0,
+                 timeout_sec: float = 30.0,
+                 tick_home=None):
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
+        self.timeout_sec = timeout_sec
+        self.tick_home = tick_home
+        self.budget = _RequestWeightBudget(weight_limit)
+        self.requests_made = 0
+        self.requests_throttled = 0
+        self._stats_lock = threading.Lock()
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers,
+                                                pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    # Same signature and return value as `call_http_fetch_klines`, so it can
+    # be passed in its place to the bar fetching functions.
+    def fetch_klines(self, symbol, start_time: int, end_time: int, interval: BarInterval):
+        url = f"{self.api_url}/api/v3/klines"
+        options = {
+            "symbol": symbol,
+            "limit": 1000,
+            "interval": _to_binance_interval(interval),
+            "startTime": start_time,
+            "endTime": end_time,
+        }
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.budget.acquire(self.KLINES_WEIGHT)
+            logging.info("making URL request: {}, options: {}".format(url, options))
+            try:
+                reply = self._session.get(url, params=options, timeout=self.timeout_sec)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt > self.max_retries:
+                    raise e
+                delay = self.backoff_sec * (2 ** (attempt - 1))
+                logging.warning(f"binance request failed, retry in {delay}s: {e}")
+                time.sleep(delay)
+                continue
+            with self._stats_lock:
+                self.requests_made += 1
+
+            used = reply.headers.get("X-MBX-USED-WEIGHT-1M",
+                                     reply.headers.get("X-MBX-USED-WEIGHT"))
+            if used is not None:
+                self.budget.update_used(int(used))
+
+            if reply.status_code in (429, 418) and attempt <= self.max_retries:
+                # rate limited (429) or IP banned (418); Binance says how long
+                # to back off for in the Retry-After header
+                with self._stats_lock:
+                    self.requests_throttled += 1
+                retry_after = float(reply.headers.get("Retry-After", 60))
+                logging.warning(f"binance http {reply.status_code}, pausing all "
+                                f"requests for {retry_after}s")
+                self.budget.pause(retry_after)
+                continue
+            if reply.status_code in self.RETRY_STATUS_CODES and attempt <= self.max_retries:
+                delay = self.backoff_sec * (2 ** (attempt - 1))
+                logging.warning(f"binance http {reply.status_code}, retry in {delay}s")
+                time.sleep(delay)
+                continue
+
+            if reply.status_code != 200:
+                raise Exception(
+                    "http request failed, error-code {}, msg: {}".format(
+                        reply.status_code, reply.text
+                    )
+                )
+            return reply.text
+
+    def fetch_bars(self,
+                   universe: List,
+                   date_from: dt.date,
+                   date_upto: dt.date,
+                   bar_interval: BarInterval,
+                   coalesce: bool = False,
+                   refetch_empty: bool = False) -> _BinanceBarCollectorReport:
+        """Parallel version of `fetch_binance_bars`"""
+        if coalesce:
+            # one job per instrument, which fetches only the missing bars over
+            # the whole date range
+            jobs = [(instrument, None) for instrument in universe]
+        else:
+            jobs = [(instrument, date)
+                    for instrument in universe
+                    for date in date_range(date_from, date_upto)]
+
+        def _worker(job):
+            instrument, date = job
+            report = _BinanceBarCollectorReport()
+            try:
+                if date is None:
+                    fetch_binance_bars_range(instrument, date_from, date_upto,
+                                             bar_interval, report,
+                                             fetch_klines=self.fetch_klines,
+                                             tick_home=self.tick_home,
+                                             refetch_empty=refetch_empty)
+                else:
+                    fetch_binance_single_bar(instrument, date, bar_interval, report,
+                                             fetch_klines=self.fetch_klines,
+                                             tick_home=self.tick_home)
+            except Exception as e:
+                logging.error(f"failed to fetch bars for {instrument} @ {date}: {e}")
+                report.files_failed += 1
+            return report
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            reports = list(executor.map(_worker, jobs))
+
+        report = _BinanceBarCollectorReport()
+        for item in reports:
+            report.files_requested += item.files_requested
+            report.files_already_existed += item.files_already_existed
+            report.new_files_downloaded += item.new_files_downloaded
+            report.files_updated += item.files_updated
+            report.files_failed += item.files_failed
+
+        logging.info(f"bar interval: {bar_interval}")
+        logging.info(f"names requested: {len(universe)}")
+        logging.info(f"dates requested: {(date_upto - date_from).days}")
+
+        logging.info(f"files requested: {report.files_requested}")
+        logging.info(f"files already existed: {report.files_already_existed}")
+        logging.info(f"files newly downloaded: {report.new_files_downloaded}")
+        logging.info(f"files with gaps filled: {report.files_updated}")
+        logging.info(f"files failed: {report.files_failed}")
+        logging.info(f"http requests made: {self.requests_made}")
+        logging.info(f"http requests throttled: {self.requests_throttled}")
+        return report
@@ -1,19 +1,20 @@
 import datetime as dt
 import pandas as pd
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union
-import os
 
 from qsig import BarInterval
 from qsig.model.instrument import Instrument, Exchange_Map
 from qsig.util.time import date_range
-from qsig.data.tickfiles import TickFileURI
+from qsig.data.tickfiles import TickFileURI, tick_file_exists, read_tick_files, write_tick_file
 
 
 # Build the locator for binned trades files
 def build_trade_bin_uri(instrument: Instrument,
                         date: dt.date,
-                        bin_rule: Union[str, BarInterval]):
+                        bin_rule: Union[str, BarInterval],
+                        tick_home=None):
     # place the trade-bins into the 'tardis' location, because these files are
     # essentially directly derived from the raw trade file - they are just a
     # different view of the raw data
@@ -28,6 +29,10 @@ def build_trade_bin_uri(instrument: Instrument,
         dataset=dataset,
         date=date,
         symbol=symbol)
+    if tick_home is not None:
+        uri = TickFileURI(filename=uri.filename, collection=uri.collection,
+                          venue=uri.venue, dataset=uri.dataset, date=uri.date,
+                          symbol=uri.symbol, tick_home=tick_home)
     return uri
 
 
@@ -106,7 +111,7 @@ def calc_trade_bins(date: dt.date, trades: pd.DataFrame, rule: Union[str,BarInte
 def _create_trade_bins_file(trades_uri: TickFileURI,
                             bins_uri: TickFileURI,
                             bin_rule: str):
-    if os.path.isfile(bins_uri.path):
+    if tick_file_exists(bins_uri):
         logging.info(f"trades bin already exists, {bins_uri.path}")
         return
 
@@ -117,9 +122,8 @@ def _create_trade_bins_file(trades_uri: TickFileURI,
     bins = calc_trade_bins(date=bins_uri.date, trades=trades, rule=bin_rule)
 
     # write the data
-    os.makedirs(bins_uri.folder, exist_ok=True)
     logging.info(f"writing trade bins file '{bins_uri.path}'")
-    bins.to_parquet(bins_uri.path)
+    write_tick_file(bins_uri, bins)
 
 
 def create_trade_bins(instruments: List[Instrument],
@@ -149,3 +153,53 @@ def create_trade_bins(instruments: List[Instrument],
             _create_trade_bins_file(input_uri, output_uri, bin_rule)
             files.append(output_uri.path)
     return files
+
+
+def _read_trade_bins(inst: Instrument,
+                     dates: List[dt.date],
+                     bin_rule: Union[str, BarInterval],
+                     features: List[str],
+                     tick_home=None):
+    # Read each trade-bins file for an instrument exactly once, loading only the
+    # requested feature columns.
+    uris = [build_trade_bin_uri(inst, date, bin_rule, tick_home=tick_home) for date in dates]
+    logging.info(f"reading {len(uris)} trade bins files for {inst}")
+    frames = read_tick_files(uris, columns=features)
+    for uri, frame in zip(uris, frames):
+        if frame is None:
+            raise FileNotFoundError(f"trade bins file not found: '{uri.path}'")
+    if not frames:
+        return pd.DataFrame(columns=features)
+    return pd.concat(frames)
+
+
+# Build per-feature wide dataframes (columns are instrument tickers, rows are
+# bin times) from previously created trade-bin files, and write each to `lib`.
+# Each bins file is read once, with files for different instruments read in
+# parallel.
+def assemble_feature_panels(universe: List[Instrument],
+                            date_from: dt.date,
+                            date_upto: dt.date,
+                            bin_rule: Union[str, BarInterval],
+                            features: List[str],
+                            lib,
+                            max_workers: int = None,
+                            tick_home=None):
+    dates = list(date_range(date_from, date_upto))
+    features = list(features)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(
+            lambda inst: _read_trade_bins(inst, dates, bin_rule, features, tick_home),
+            universe))
+
+    # scatter the columns of each instrument frame into the feature panels
+    tickers = [inst.ticker() for inst in universe]
+    for feature in features:
+        columns = [frame[feature] for frame in frames]
+        df = pd.concat(columns, axis=1, keys=tickers)
+        df.name = feature
+        logging.info(f"writing feature '{feature}' in library '{lib.name}'")
+        lib.write(feature, df)
+        del df, columns
+    return features
@@ -1,66 +1,230 @@
 import datetime as dt
+import gzip
 import os
 import requests
 import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
 
 from qsig.data.tickfiles import TickFileURI
+from qsig.util.time import date_range
 import qsig
 
+
+# Outcome of a single file download, as returned by the bulk download API.
+@dataclass
+class TardisFetchResult:
+    exchange: str
+    dataset: str
+    symbol: str
+    date: dt.date
+    path: str
+    status: str  # one of: "downloaded", "exists", "failed"
+    attempts: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
 # Download Tardis CSV datasets and save them locally into tickdata home.
 class TardisDownloader:
 
     BASE_URL = "https://datasets.tardis.dev/v1"
 
+    # HTTP status codes that are worth retrying
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    # bytes read per chunk when streaming downloads to disk
+    CHUNK_SIZE = 1024 * 1024
+
     def __init__(self,
                  *,
                  api_key: str,
                  base_tick_data_dir = None,
-                 base_url: str = None):
+                 base_url: str = None,
+                 max_retries: int = 5,
+                 backoff_sec: float = 1.0,
+                 pool_size: int = 16):
         if base_tick_data_dir is None:
             base_tick_data_dir = qsig.settings.tick_data_home()
         self.base_tick_data_dir = base_tick_data_dir
         self.api_key = api_key
         self.base_url = base_url or TardisDownloader.BASE_URL
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
 
+        # shared keep-alive session, with enough pooled connections for the
+        # bulk download workers
+        self._session = requests.Session()
+        self._session.headers["Authorization"] = f"Bearer {self.api_key}"
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
 
-    def fetch_csv_file(self,
-                       *,
-                       year: int,
-                       month: int,
-                       day: int,
-                       dataset: str,
-                       exchange: str,
-                       symbol: str):
-        url = f"{self.base_url}/{exchange}/{dataset}/{year:04d}/{month:02d}/{day:02d}/{symbol}.csv.gz"
+    def _retry_delay(self, attempt: int, response=None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return self.backoff_sec * (2 ** attempt)
+
+    # Make a GET request on the shared session, retrying with exponential
+    # backoff on connection errors and on 429/5xx replies.  Returns the final
+    # response and the number of attempts made.
+    def _get(self, url: str, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._session.get(url, **kwargs)
+            except requests.ConnectionError as e:
+                if attempt > self.max_retries:
+                    raise e
+                delay = self._retry_delay(attempt - 1)
+                logging.warning(f"connection error for {url}, retry in {delay}s: {e}")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in TardisDownloader.RETRY_STATUS_CODES \
+                    and attempt <= self.max_retries:
+                delay = self._retry_delay(attempt - 1, response)
+                logging.warning(f"http {response.status_code} for {url}, retry in {delay}s")
+                response.close()
+                time.sleep(delay)
+                continue
+            return response, attempt
 
-        local_uri = TickFileURI(
+    def _build_url(self, exchange, dataset, date: dt.date, symbol):
+        return (f"{self.base_url}/{exchange}/{dataset}/"
+                f"{date.year:04d}/{date.month:02d}/{date.day:02d}/{symbol}.csv.gz")
+
+    def local_uri(self, exchange, dataset, date: dt.date, symbol) -> TickFileURI:
+        """Location in tickdata home of the file of a dataset, for one symbol
+        and date"""
+        return TickFileURI(
             filename=f"{symbol}.csv.gz",
             collection="tardis",
             venue=exchange,
             dataset=dataset,
-            date=dt.date(year, month, day),
+            date=date,
             symbol=symbol,
             tick_home=self.base_tick_data_dir)
 
-        if os.path.isfile(local_uri.path):
-            logging.info(f"already exists: {local_uri.path}")
-        else:
-            os.makedirs(local_uri.folder, exist_ok=True)
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            logging.info(f"fetching: {url}")
-            response = requests.get(url, headers=headers)
+    # Check that a downloaded file is a complete gzip stream.  The file is
+    # decompressed in chunks, so the CRC and length trailer are verified
+    # without holding the file in memory.
+    @staticmethod
+    def _verify_gzip(path) -> bool:
+        try:
+            with gzip.open(path, "rb") as f:
+                while f.read(TardisDownloader.CHUNK_SIZE):
+                    pass
+            return True
+        except (OSError, EOFError, zlib.error):
+            return False
 
-            if response.status_code != 200:
+    # Stream a URL into `part_path`, resuming from any bytes already present
+    # by making a Range request.  Returns the number of request attempts made.
+    def _stream_to_file(self, url: str, part_path: str) -> int:
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        if offset:
+            logging.info(f"resuming download at byte {offset}: {url}")
+
+        response, attempts = self._get(url, headers=headers, stream=True)
+        with response:
+            if response.status_code == 416:
+                # the partial file is not consistent with the remote file, so
+                # discard it and let the caller start over
+                os.unlink(part_path)
+                raise IOError(f"invalid range request at byte {offset} for {url}")
+            if response.status_code not in (200, 206):
                 logging.error("error: {}".format(response.text))
             response.raise_for_status()
-            logging.info(f"writing: {local_uri.path}")
 
-            with open(local_uri.path, "wb") as f:
-                f.write(response.content)
-        return url
+            if response.status_code == 206:
+                mode = "ab"
+                content_range = response.headers.get("Content-Range", "")
+                expected = int(content_range.split("/")[-1]) \
+                    if content_range.split("/")[-1].isdigit() else None
+            else:
+                # server ignored the range, so the full file is being resent
+                mode = "wb"
+                length = response.headers.get("Content-Length")
+                expected = int(length) if length is not None else None
 
+            with open(part_path, mode) as f:
+                for chunk in response.raw.stream(TardisDownloader.CHUNK_SIZE,
+                                                 decode_content=False):
+                    f.write(chunk)
 
+        actual = os.path.getsize(part_path)
+        if expected is not None and actual != expected:
+            raise IOError(f"incomplete download, {actual} of {expected} bytes: {url}")
+        return attempts
 
+    def fetch(self, exchange, dataset, date: dt.date, symbol) -> TardisFetchResult:
+        """Download the file of a dataset, for one symbol and date, unless it
+        already exists locally"""
+        url = self._build_url(exchange, dataset, date, symbol)
+        local_uri = self.local_uri(exchange, dataset, date, symbol)
+        result = TardisFetchResult(exchange=exchange, dataset=dataset,
+                                   symbol=symbol, date=date,
+                                   path=local_uri.path.as_posix(),
+                                   status="exists")
+
+        if os.path.isfile(local_uri.path):
+            logging.info(f"already exists: {local_uri.path}")
+            return result
+
+        # Data is streamed into a temporary '.part' file, which is only renamed
+        # to the final path once complete and verified, so that an interrupted
+        # download never looks like a valid file.  A '.part' file left by an
+        # earlier interrupted download is resumed.
+        t0 = time.monotonic()
+        os.makedirs(local_uri.folder, exist_ok=True)
+        part_path = result.path + ".part"
+        logging.info(f"fetching: {url}")
+        while True:
+            try:
+                result.attempts += self._stream_to_file(url, part_path)
+                break
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    IOError) as e:
+                if isinstance(e, requests.HTTPError) or result.attempts >= self.max_retries:
+                    raise e
+                result.attempts += 1
+                delay = self._retry_delay(result.attempts - 1)
+                logging.warning(f"download interrupted for {url}, retry in {delay}s: {e}")
+                time.sleep(delay)
+
+        if not self._verify_gzip(part_path):
+            os.unlink(part_path)
+            raise IOError(f"downloaded file failed gzip verification: {url}")
+
+        logging.info(f"writing: {local_uri.path}")
+        os.replace(part_path, local_uri.path)
+        result.status = "downloaded"
+        result.elapsed = time.monotonic() - t0
+        return result
+
+    def fetch_csv_file(self,
+                       *,
+                       year: int,
+                       month: int,
+                       day: int,
+                       dataset: str,
+                       exchange: str,
+                       symbol: str):
+        date = dt.date(year, month, day)
+        self.fetch(exchange, dataset, date, symbol)
+        return self._build_url(exchange, dataset, date, symbol)
 
     def fetch_csv_files_for_dates(self,
                                   *,
@@ -75,3 +239,46 @@ class TardisDownloader:
             self.fetch_csv_file(year=date.year, month=date.month,
                                 day=date.day, dataset=dataset,
                                 exchange=exchange, symbol=symbol)
+
+    # Download files for many symbols over a date range, using a bounded pool
+    # of worker threads that share the keep-alive session.  A failure to fetch
+    # one file does not stop the others; instead each file gets an entry in
+    # the returned list of results.
+    def fetch_csv_files(self,
+                        *,
+                        exchange: str,
+                        dataset: str,
+                        symbols: List[str],
+                        date_from: dt.date,
+                        date_upto: dt.date,
+                        max_workers: int = 8) -> List[TardisFetchResult]:
+        assert date_upto > date_from
+        jobs = [(symbol, date)
+                for date in date_range(date_from, date_upto)
+                for symbol in symbols]
+
+        def _worker(job):
+            symbol, date = job
+            t0 = time.monotonic()
+            try:
+                return self.fetch(exchange, dataset, date, symbol)
+            except Exception as e:
+                logging.error(f"failed to fetch {symbol} @ {date}: {e}")
+                local_uri = self.local_uri(exchange, dataset, date, symbol)
+                return TardisFetchResult(exchange=exchange, dataset=dataset,
+                                         symbol=symbol, date=date,
+                                         path=local_uri.path.as_posix(),
+                                         status="failed",
+                                         elapsed=time.monotonic() - t0,
+                                         error=str(e))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_worker, jobs))
+
+        counts = {}
+        for result in results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        logging.info(f"files requested: {len(results)}")
+        for status in ["exists", "downloaded", "failed"]:
+            logging.info(f"files {status}: {counts.get(status, 0)}")
+        return results
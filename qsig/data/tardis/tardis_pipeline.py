@@ -0,0 +1,180 @@
+import datetime as dt
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Union
+
+from qsig import BarInterval
+from qsig.model.instrument import Instrument, Exchange_Map
+from qsig.util.time import date_range
+from qsig.data.tardis.tardis_downloader import TardisDownloader
+from qsig.data.tardis.tardis_binner import build_trade_bin_uri, _create_trade_bins_file
+from qsig.data.tickfiles import tick_file_exists
+
+
+# Throughput counters for one stage of the pipeline.  `bytes` counts the raw
+# trade-file bytes handled by the stage, and `busy_sec` is the total time spent
+# by all the stage workers on actual work, excluding time spent waiting on the
+# queues.
+@dataclass
+class PipelineStageStats:
+    name: str
+    workers: int
+    files: int = 0
+    failed: int = 0
+    bytes: int = 0
+    busy_sec: float = 0.0
+
+    def throughput(self, wall_sec: float) -> float:
+        """Files processed per second of pipeline wall time"""
+        return self.files / wall_sec if wall_sec > 0 else 0.0
+
+    def utilisation(self, wall_sec: float) -> float:
+        """Fraction of available worker time that was spent busy"""
+        available = wall_sec * self.workers
+        return self.busy_sec / available if available > 0 else 0.0
+
+
+@dataclass
+class TardisPipelineReport:
+    download: PipelineStageStats
+    binning: PipelineStageStats
+    wall_sec: float = 0.0
+    skipped: int = 0
+    bin_files: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    def log(self):
+        logging.info(f"pipeline wall time: {self.wall_sec:.1f}s")
+        logging.info(f"files skipped, trade bins already exist: {self.skipped}")
+        for stage in [self.download, self.binning]:
+            logging.info(f"stage '{stage.name}': files {stage.files}, "
+                         f"failed {stage.failed}, "
+                         f"{stage.throughput(self.wall_sec):.2f} files/s, "
+                         f"{stage.bytes / max(self.wall_sec, 1e-9) / 1e6:.2f} MB/s, "
+                         f"busy {stage.busy_sec:.1f}s, "
+                         f"utilisation {stage.utilisation(self.wall_sec):.0%}")
+
+
+# Download raw Tardis trade files and bin them, with both stages running at the
+# same time.  Download workers place each file onto a bounded queue as soon as
+# it lands, and binning workers take files from that queue.  When the binning
+# stage falls behind the queue fills, and the downloaders block until space is
+# available, so the number of raw files waiting on disk is bounded by
+# `queue_size`.  Binning runs in a process pool, since it is CPU bound.
+def run_trade_bins_pipeline(instruments: List[Instrument],
+                            date_from: dt.date,
+                            date_upto: dt.date,
+                            bin_rule: Union[str, BarInterval],
+                            downloader: TardisDownloader,
+                            download_workers: int = 8,
+                            bin_workers: int = None,
+                            queue_size: int = None,
+                            delete_raw: bool = False,
+                            use_processes: bool = True) -> TardisPipelineReport:
+    bin_workers = bin_workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * bin_workers
+
+    report = TardisPipelineReport(
+        download=PipelineStageStats("download", download_workers),
+        binning=PipelineStageStats("binning", bin_workers))
+    lock = threading.Lock()
+
+    jobs = queue.Queue()
+    for date in date_range(date_from, date_upto):
+        for inst in instruments:
+            jobs.put((inst, date))
+    landed = queue.Queue(maxsize=queue_size)
+
+    def _download_worker():
+        while True:
+            try:
+                inst, date = jobs.get_nowait()
+            except queue.Empty:
+                return
+            exchange = Exchange_Map[inst.exch].slug
+            symbol = f"{inst.base}{inst.quote}"
+            bins_uri = build_trade_bin_uri(inst, date, bin_rule,
+                                           tick_home=downloader.base_tick_data_dir)
+            if tick_file_exists(bins_uri):
+                logging.info(f"trades bin already exists, {bins_uri.path}")
+                with lock:
+                    report.skipped += 1
+                continue
+            t0 = time.monotonic()
+            try:
+                result = downloader.fetch(exchange, "trades", date, symbol)
+            except Exception as e:
+                logging.error(f"failed to fetch {inst} @ {date}: {e}")
+                with lock:
+                    report.download.failed += 1
+                    report.download.busy_sec += time.monotonic() - t0
+                    report.errors.append(f"download {inst} @ {date}: {e}")
+                continue
+            with lock:
+                report.download.files += 1
+                report.download.busy_sec += time.monotonic() - t0
+                if result.status == "downloaded":
+                    report.download.bytes += os.path.getsize(result.path)
+            landed.put((inst, date))  # blocks when binning falls behind
+
+    executor = ProcessPoolExecutor(max_workers=bin_workers) if use_processes else None
+
+    def _bin_worker():
+        while True:
+            item = landed.get()
+            if item is None:
+                return
+            inst, date = item
+            trades_uri = downloader.local_uri(
+                Exchange_Map[inst.exch].slug, "trades", date, f"{inst.base}{inst.quote}")
+            bins_uri = build_trade_bin_uri(inst, date, bin_rule,
+                                           tick_home=downloader.base_tick_data_dir)
+            t0 = time.monotonic()
+            try:
+                size = os.path.getsize(trades_uri.path)
+                if executor is not None:
+                    executor.submit(_create_trade_bins_file, trades_uri,
+                                    bins_uri, bin_rule).result()
+                else:
+                    _create_trade_bins_file(trades_uri, bins_uri, bin_rule)
+                if delete_raw:
+                    os.unlink(trades_uri.path)
+            except Exception as e:
+                logging.error(f"failed to bin {inst} @ {date}: {e}")
+                with lock:
+                    report.binning.failed += 1
+                    report.binning.busy_sec += time.monotonic() - t0
+                    report.errors.append(f"binning {inst} @ {date}: {e}")
+                continue
+            with lock:
+                report.binning.files += 1
+                report.binning.busy_sec += time.monotonic() - t0
+                report.binning.bytes += size
+                report.bin_files.append(bins_uri.path.as_posix())
+
+    t_start = time.monotonic()
+    try:
+        downloaders = [threading.Thread(target=_download_worker, daemon=True)
+                       for _ in range(download_workers)]
+        binners = [threading.Thread(target=_bin_worker, daemon=True)
+                   for _ in range(bin_workers)]
+        for thread in downloaders + binners:
+            thread.start()
+        for thread in downloaders:
+            thread.join()
+        for _ in binners:
+            landed.put(None)  # signal end of input to each binning worker
+        for thread in binners:
+            thread.join()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    report.wall_sec = time.monotonic() - t_start
+
+    report.log()
+    return report
@@ -1,11 +1,42 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, List, Optional
 import datetime as dt
+import json
 import os
 import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 import qsig
 
+# Tick files can be stored in one of two layouts.  In the daily layout there is
+# one file per symbol per day, at '.../yyyy/mm/dd/<filename>'.  In the monthly
+# layout, which is only available for parquet files, the days of a month are
+# coalesced into a single file at '.../yyyy/mm/<filename>', with one row group
+# per day.  The read functions below hide the difference between the two;
+# where a day is in both layouts, such as after a migration that kept the daily
+# files, the monthly file is used, as that is where the day is written to.
+DAILY = "daily"
+MONTHLY = "monthly"
+
+# key of the parquet file metadata that maps days to row groups
+_ROW_GROUPS_META_KEY = b"qsig.row_groups"
+
+# locks of the monthly files being written by threads of this process
+_month_locks = dict()
+_month_locks_guard = threading.Lock()
+
 
 @dataclass(frozen=True)
 class TickFileURI:
@@ -40,6 +71,21 @@ class TickFileURI:
                  self.filename]
         return Path("/".join(parts))
 
+    @property
+    def month_folder(self) -> Path:
+        parts = [self.tick_home.as_posix(),
+                 self.collection,
+                 self.venue,
+                 self.dataset,
+                 f"{self.date.year:04d}",
+                 f"{self.date.month:02d}"]
+        return Path("/".join(parts))
+
+    @property
+    def monthly_path(self) -> Path:
+        """Location of the file in the monthly layout"""
+        return self.month_folder / self.filename
+
     def replace(self, dataset=None, filename=None, collection=None):
         return TickFileURI(
             filename=filename or self.filename,
@@ -55,11 +101,18 @@ def _path_is_tickdata_compliant(path: Path) -> bool:
     """Determine if a directory path conforms to a valid tick data path. A value
     tick data path should end with three subdirectories like: yyyy/mm/dd
     """
-    if len(path.parts) < 4:
+    if len(path.parts) < 6:
         return False
     return True
 
 
+def _path_is_monthly_tickdata(path: Path) -> bool:
+    """Determine if a directory path is that of a monthly layout tick file,
+    ending with two subdirectories like: yyyy/mm
+    """
+    return len(path.parts) == 5 and path.parts[3].isdigit() and path.parts[4].isdigit()
+
+
 def _build_tick_file_uri(base_dir, pair):
     path = Path(pair[0].removeprefix(f"{base_dir}/"))
     if not _path_is_tickdata_compliant(path):
@@ -83,16 +136,18 @@ def _build_tick_file_uri(base_dir, pair):
     return uri
 
 
-def scan_tick_files():
-    tick_home = qsig.settings.tick_data_home()
+def scan_tick_files(tick_home=None):
+    tick_home = Path(tick_home or qsig.settings.tick_data_home())
     tick_file_registry = dict()
     for root, dirs, files in os.walk(tick_home):
-        if root == tick_home:
+        if Path(root) == tick_home:
             continue  # no tick files in base directory
         for fn in files:
             try:
                 uri = _build_tick_file_uri(tick_home, (root, fn))
                 if uri is None:
+                    if _path_is_monthly_tickdata(Path(root.removeprefix(f"{tick_home}/"))):
+                        continue  # monthly layout files are not daily tick files
                     logging.warning(f"skipping {root}/{fn}")
                 else:
                     tick_file_registry[uri.path] = uri
@@ -100,3 +155,200 @@ def scan_tick_files():
                 logging.warning(f"skipping {root}/{fn} : {e}")
 
     return list(tick_file_registry.values())
+
+
+def _read_row_group_map(parquet_file: pq.ParquetFile) -> Dict[str, Optional[int]]:
+    meta = parquet_file.schema_arrow.metadata or {}
+    if _ROW_GROUPS_META_KEY not in meta:
+        raise ValueError(f"not a monthly tick file, '{parquet_file}'")
+    return json.loads(meta[_ROW_GROUPS_META_KEY])
+
+
+def _to_table(data: pd.DataFrame) -> pa.Table:
+    # a RangeIndex carries no information, and is not stored, so that the row
+    # groups of the different days share the same schema
+    preserve_index = not isinstance(data.index, pd.RangeIndex)
+    return pa.Table.from_pandas(data, preserve_index=preserve_index)
+
+
+def _read_monthly_days(path: Path, dates: List[dt.date], columns=None) -> Dict[dt.date, pd.DataFrame]:
+    result = dict()
+    with pq.ParquetFile(path) as parquet_file:
+        row_groups = _read_row_group_map(parquet_file)
+        for date in dates:
+            key = date.isoformat()
+            if key not in row_groups:
+                continue
+            index = row_groups[key]
+            if index is None:
+                data = parquet_file.schema_arrow.empty_table().to_pandas()
+                result[date] = data[columns] if columns is not None else data
+            else:
+                table = parquet_file.read_row_group(index, columns=columns,
+                                                    use_pandas_metadata=True)
+                result[date] = table.to_pandas()
+    return result
+
+
+def tick_file_exists(uri: TickFileURI) -> bool:
+    """Check if the data for a tick file exists, in either layout"""
+    if os.path.isfile(uri.monthly_path):
+        with pq.ParquetFile(uri.monthly_path) as parquet_file:
+            if uri.date.isoformat() in _read_row_group_map(parquet_file):
+                return True
+    return os.path.isfile(uri.path)
+
+
+def read_tick_file(uri: TickFileURI, columns: List[str] = None) -> pd.DataFrame:
+    """Read the data for a tick file, in either layout"""
+    if os.path.isfile(uri.monthly_path):
+        days = _read_monthly_days(uri.monthly_path, [uri.date], columns)
+        if uri.date in days:
+            return days[uri.date]
+    if os.path.isfile(uri.path):
+        return pd.read_parquet(uri.path, columns=columns)
+    raise FileNotFoundError(f"tick file not found: '{uri.path}'")
+
+
+def read_tick_files(uris: List[TickFileURI], columns: List[str] = None) -> List[Optional[pd.DataFrame]]:
+    """Read many tick files, returning None for any that are missing.  Monthly
+    layout files are opened once for all the days requested from them."""
+    result = [None] * len(uris)
+    monthly = dict()
+    for i, uri in enumerate(uris):
+        if os.path.isfile(uri.monthly_path):
+            monthly.setdefault(uri.monthly_path, []).append(i)
+    for path, indices in monthly.items():
+        days = _read_monthly_days(path, [uris[i].date for i in indices], columns)
+        for i in indices:
+            result[i] = days.get(uris[i].date)
+    for i, uri in enumerate(uris):
+        if result[i] is None and os.path.isfile(uri.path):
+            result[i] = pd.read_parquet(uri.path, columns=columns)
+    return result
+
+
+# Hold the lock of a monthly tick file, for the read, update and rewrite of
+# the file.  Threads of this process are serialised by a lock per path, and
+# processes by an exclusive lock on a '.lock' file next to it, where file locks
+# are available.
+@contextmanager
+def _monthly_file_lock(path: Path):
+    with _month_locks_guard:
+        lock = _month_locks.setdefault(str(path), threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(path.parent, exist_ok=True)
+        with open(path.with_suffix(path.suffix + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_monthly_tick_file(path: Path, days: Dict[dt.date, pd.DataFrame]):
+    """Write (or update) a monthly layout tick file, with the data for each
+    day stored as its own row group.  Days already present in the file are
+    kept, unless replaced by an entry in `days`.  Concurrent writers of the
+    same file, in threads or processes, are serialised."""
+    with _monthly_file_lock(path):
+        _write_monthly_tick_file(path, days)
+
+
+def _write_monthly_tick_file(path: Path, days: Dict[dt.date, pd.DataFrame]):
+    tables = dict()
+    if os.path.isfile(path):
+        with pq.ParquetFile(path) as parquet_file:
+            for key, index in _read_row_group_map(parquet_file).items():
+                if index is None:
+                    tables[key] = parquet_file.schema_arrow.empty_table()
+                else:
+                    tables[key] = parquet_file.read_row_group(index)
+    for date, data in days.items():
+        tables[date.isoformat()] = _to_table(data)
+
+    keys = sorted(tables.keys())
+    schema = tables[keys[0]].schema
+    row_groups = dict()
+    next_index = 0
+    for key in keys:
+        if tables[key].num_rows == 0:
+            row_groups[key] = None
+        else:
+            row_groups[key] = next_index
+            next_index += 1
+
+    metadata = dict(schema.metadata or {})
+    metadata[_ROW_GROUPS_META_KEY] = json.dumps(row_groups).encode()
+    schema = schema.with_metadata(metadata)
+
+    # write to a temporary file, and then move into place
+    os.makedirs(path.parent, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".temp")
+    os.close(fd)
+    try:
+        with pq.ParquetWriter(temp_path, schema) as writer:
+            for key in keys:
+                table = tables[key]
+                if table.num_rows:
+                    writer.write_table(table.cast(schema), row_group_size=table.num_rows)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_tick_file(uri: TickFileURI, data: pd.DataFrame, layout: str = None):
+    """Write the data for a tick file.  If no layout is given, the monthly
+    layout is used if a monthly file already exists for the month."""
+    write_tick_files([uri], [data], layout)
+
+
+def write_tick_files(uris: List[TickFileURI], frames: List[pd.DataFrame], layout: str = None):
+    """Write the data for many tick files, as for `write_tick_file`.  Days of
+    the same monthly layout file are written to it together, with one rewrite
+    of the file."""
+    assert len(uris) == len(frames)
+    monthly = dict()
+    for uri, data in zip(uris, frames):
+        uri_layout = layout
+        if uri_layout is None:
+            uri_layout = MONTHLY if os.path.isfile(uri.monthly_path) else DAILY
+        if uri_layout == MONTHLY:
+            monthly.setdefault(uri.monthly_path, dict())[uri.date] = data
+        elif uri_layout == DAILY:
+            os.makedirs(uri.folder, exist_ok=True)
+            data.to_parquet(uri.path)
+        else:
+            raise ValueError(f"unknown tick file layout '{uri_layout}'")
+    for path, days in monthly.items():
+        logging.info(f"writing {len(days)} days to monthly tick file '{path}'")
+        write_monthly_tick_file(path, days)
+
+
+def migrate_tick_files_to_monthly(tick_home=None, remove_daily: bool = False):
+    """Coalesce the daily parquet tick files below `tick_home` into monthly
+    layout files.  Each monthly file is read back and checked against the daily
+    files before any daily file is removed."""
+    uris = [x for x in scan_tick_files(tick_home) if x.filename.endswith(".parquet")]
+    months = dict()
+    for uri in uris:
+        months.setdefault(uri.monthly_path, []).append(uri)
+
+    for path, month_uris in sorted(months.items()):
+        days = {uri.date: pd.read_parquet(uri.path) for uri in month_uris}
+        logging.info(f"writing monthly tick file '{path}' ({len(days)} days)")
+        write_monthly_tick_file(path, days)
+
+        coalesced = _read_monthly_days(path, list(days.keys()))
+        for date, data in days.items():
+            if date not in coalesced or not coalesced[date].equals(data):
+                raise Exception(f"monthly tick file '{path}' does not match the daily "
+                                f"tick file for {date}")
+        if remove_daily:
+            for uri in month_uris:
+                os.unlink(uri.path)
+    return sorted(months.keys())
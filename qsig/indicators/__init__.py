@@ -1,35 +1,59 @@
+import importlib
 
-from .base_indicators import BaseIndicator, UnaryIndicator
+# Indicator classes are loaded on first access, so that importing the package
+# does not import pandas, or any indicator backend.  Backends register their
+# indicators with the IndicatorFactory when it first looks up an indicator
+# type; see IndicatorFactory.BACKENDS.
+_LAZY = {
+    "IndicatorContainer": ".indicator_container",
+    "BaseIndicator": ".base_indicators",
+    "UnaryIndicator": ".base_indicators",
+    "RollingIndicator": ".base_indicators",
+    "IndicatorFactory": ".indicator_factory",
+    "ExpressionIndicator": ".expression",
+    "ItemIndicatorCache": ".indicator_cache",
+    "SMA": ".std_indicators",
+    "DEN": ".std_indicators",
+    "RET": ".std_indicators",
+    "FWD": ".std_indicators",
+    "EWMA": ".std_indicators",
+    "MIN": ".std_indicators",
+    "MAX": ".std_indicators",
+    "MEDIAN": ".std_indicators",
+    "RANK": ".std_indicators",
+    "QUANTILE": ".std_indicators",
+}
 
-from .indicator_cache import IndicatorContainer
 
-from .indicator_factory import IndicatorFactory
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
-from .indicator_cache import ItemIndicatorCache
 
-from .std_indicators import (
-    SMA,
-    DEN,
-    RET,
-    FWD,
-    EWMA
-)
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
 
-try:
-    import talib
-    from . import talib_indicators
-except ModuleNotFoundError as e:
-    print("TA-Lib cannot be imported, TA-Lib indicators will not be available")
 
 __all__ = [
     "IndicatorContainer",
     "BaseIndicator",
     "UnaryIndicator",
+    "RollingIndicator",
     "IndicatorFactory",
+    "ExpressionIndicator",
     "ItemIndicatorCache",
     "SMA",
     "DEN",
     "RET",
     "FWD",
-    "EWMA"
+    "EWMA",
+    "MIN",
+    "MAX",
+    "MEDIAN",
+    "RANK",
+    "QUANTILE"
 ]
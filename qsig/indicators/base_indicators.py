@@ -1,10 +1,103 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from enum import Enum, auto
+import threading
+import time
+import numpy as np
 import pandas as pd
 
+from qsig.util.precision import cast_floats
+from qsig.util.signal import data_interval
+
 from .indicator_container import IndicatorContainer
 
 
+# Placeholder for a result held in the container's ResultStore.  `columns` are
+# the item labels of a panel result, and None for a series result.
+class _StoredResult:
+    __slots__ = ["columns"]
+
+    def __init__(self, columns: list = None):
+        self.columns = columns
+
+
+# Result held outside the container's ResultStore, such as a non-float result,
+# once rows have been appended to it.  Values are kept in a buffer that grows
+# by doubling, of which the first `rows` are in use, so that appending rows
+# copies only the new rows, rather than the whole result.  Frames are only
+# buffered if all their columns have the same dtype.
+class _BufferedResult:
+    __slots__ = ["values", "rows", "index", "columns", "name"]
+
+    def __init__(self, data):
+        self.values = data.to_numpy().copy()
+        self.rows = len(data)
+        self.index = data.index
+        self.columns = data.columns if isinstance(data, pd.DataFrame) else None
+        self.name = data.name
+
+    @staticmethod
+    def accepts(data) -> bool:
+        if isinstance(data, pd.DataFrame):
+            return data.shape[1] > 0 and len(set(data.dtypes)) == 1
+        return isinstance(data, pd.Series)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows * self.values[:1].nbytes
+
+    def extend(self, data, replace=0):
+        """Append the rows of `data`, first dropping the last `replace` rows"""
+        values = data[self.columns].to_numpy() if self.columns is not None else data.to_numpy()
+        start = self.rows - replace
+        rows = start + len(values)
+        dtype = np.result_type(self.values.dtype, values.dtype)
+        if rows > len(self.values) or dtype != self.values.dtype:
+            buffer = np.empty((max(rows, 2 * len(self.values)),) + self.values.shape[1:], dtype)
+            buffer[:start] = self.values[:start]
+            self.values = buffer
+        self.values[start:rows] = values
+        self.index = self.index[:start].append(data.index)
+        self.rows = rows
+
+    def discard(self, rows: int):
+        """Drop the first `rows` rows"""
+        self.values = self.values[rows:self.rows].copy()
+        self.index = self.index[rows:]
+        self.rows = len(self.values)
+
+    def get(self):
+        """Read-only view onto the result, as for results in the ResultStore"""
+        values = self.values[:self.rows].view()
+        values.flags.writeable = False
+        if self.columns is None:
+            return pd.Series(values, index=self.index, name=self.name, copy=False)
+        frame = pd.DataFrame(values, index=self.index, columns=self.columns, copy=False)
+        frame.name = self.name
+        return frame
+
+
+# Running totals of the work done by an indicator, recorded on each compute
+# and update: the number of calls, the wall and CPU time (of the computing
+# thread) spent, and the number of result rows produced.  `result_bytes` is
+# the memory held by the current results.  Time spent computing members of an
+# IndicatorFamily is recorded against the member that triggered it.
+@dataclass
+class IndicatorProfile:
+    calls: int = 0
+    wall_sec: float = 0.0
+    cpu_sec: float = 0.0
+    rows: int = 0
+    result_bytes: int = 0
+
+    def record(self, wall_sec: float, cpu_sec: float, rows: int, result_bytes: int):
+        self.calls += 1
+        self.wall_sec += wall_sec
+        self.cpu_sec += cpu_sec
+        self.rows += rows
+        self.result_bytes = result_bytes
+
+
 class BaseIndicator(ABC):
     """Base class for all indicators. Each indicator will have a unique 'name',
        which will identify it within its parent IndicatorContainer."""
@@ -14,14 +107,28 @@ class BaseIndicator(ABC):
         COMPUTING = auto()
         COMPUTED = auto()
 
+    # Set to True by indicators whose computation works unchanged on a wide
+    # DataFrame (one column per item) as well as on a Series; these can be
+    # evaluated once for a whole universe in a panel RootIndicatorCache.
+    PANEL = False
+
+    # Set to True by indicators that take a single parameter and can be
+    # declared as a family over a sweep of that parameter, such as
+    # EWMA(1m..60m:1m)[close]; see IndicatorFamily.
+    FAMILY = False
+
     def __init__(self, code: str, owner: IndicatorContainer, indicator_name: str):
         assert code is not None
         assert '(' not in code
+        self._code = code
         self._owner = owner
         self._name = indicator_name
         self._results = dict()
+        self._appended = None
         self._is_evaluating = False
         self._compute_state = BaseIndicator._State.CLEAR
+        self._profiling_update = False
+        self.profile = IndicatorProfile()
 
     def compute(self):
         if self.is_computed():
@@ -29,13 +136,70 @@ class BaseIndicator(ABC):
         if self._compute_state == BaseIndicator._State.COMPUTING:
             raise Exception(f"circular dependency detected while computing '{self}'")
         self._compute_state = BaseIndicator._State.COMPUTING
+        wall, cpu = time.perf_counter(), time.thread_time()
         self._compute()
         self._compute_state = BaseIndicator._State.COMPUTED
+        if not self._profiling_update:  # recorded by profiled_update instead
+            self._record(wall, cpu, self.result_rows())
+
+    def profiled_update(self, rows: int):
+        """Call `update`, recording it in the profile, as a single call even
+        if the update recomputes the indicator"""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        self._profiling_update = True
+        try:
+            self.update(rows)
+        finally:
+            self._profiling_update = False
+        self._record(wall, cpu, rows)
+
+    def _record(self, wall: float, cpu: float, rows: int):
+        self.profile.record(time.perf_counter() - wall, time.thread_time() - cpu,
+                            rows, self.result_bytes())
+
+    def result_rows(self) -> int:
+        """Number of rows of the results"""
+        for data in self._results.values():
+            if isinstance(data, _StoredResult):
+                return self._owner.result_store().rows
+            if isinstance(data, _BufferedResult):
+                return data.rows
+            return len(data)
+        return 0
+
+    def result_bytes(self) -> int:
+        """Memory held by the results, excluding their index"""
+        total = 0
+        for slot, data in self._results.items():
+            if isinstance(data, _StoredResult):
+                store = self._owner.result_store()
+                total += store.rows * store.dtype.itemsize * len(data.columns or [None])
+            elif isinstance(data, _BufferedResult):
+                total += data.nbytes
+            elif isinstance(data, pd.DataFrame):
+                total += int(data.memory_usage(index=False).sum())
+            else:
+                total += data.memory_usage(index=False)
+        return total
 
     @abstractmethod
     def _compute(self):
         pass
 
+    def sources(self) -> list:
+        """Names of the data columns and indicators this indicator reads"""
+        return []
+
+    def canonical_params(self):
+        """Hashable, normalised form of the indicator parameters, such that two
+        indicators of the same type with equal canonical params and sources
+        compute the same result.  None if the indicator cannot be shared."""
+        return None
+
+    @property
+    def code(self):
+        return self._code
+
     @property
     def name(self):
         return self._name
@@ -48,25 +212,145 @@ class BaseIndicator(ABC):
 
     def clear(self):
         self._results = dict()
+        self._appended = None
         self._compute_state = BaseIndicator._State.CLEAR
+        self._clear_state()
+
+    def _clear_state(self):
+        pass
+
+    def set_results(self, results: dict):
+        """Set the results directly, for example when loaded from a cache,
+        rather than by computing them"""
+        self.clear()
+        for slot, data in results.items():
+            self._store_result(data, slot)
+        self._compute_state = BaseIndicator._State.COMPUTED
+
+    def update(self, rows: int):
+        """Update the results after `rows` rows have been appended to the
+        inputs.  By default the indicator is recomputed over its full input;
+        indicators that can update incrementally override this."""
+        self.clear()
+        self.compute()
+        self._appended = dict()
+        for slot in self._results:
+            data = self._get_result(slot)
+            self._appended[slot] = data.iloc[len(data) - rows:]
+
+    def lookback(self):
+        """Number of input rows, besides the current row, that the result at
+        a row depends on; None if not bounded, in which case `update`
+        recomputes the indicator over its full input"""
+        return None
+
+    def trim(self, rows: int):
+        """Drop all but the last `rows` rows of the results held outside the
+        container's ResultStore, which is trimmed by the container"""
+        for slot, data in self._results.items():
+            if isinstance(data, _BufferedResult):
+                data.discard(max(data.rows - rows, 0))
+            elif not isinstance(data, _StoredResult) and len(data) > rows:
+                self._results[slot] = data.iloc[len(data) - rows:]
+
+    def has_appended_result(self) -> bool:
+        """True if the last call to `update` appended result rows, rather than
+        revising earlier rows too, as a FORWARD_LOOKING indicator does"""
+        return self._appended is not None
+
+    def appended_result(self, slot=""):
+        """The result rows added by the last call to `update`"""
+        if self._appended is None:
+            raise Exception(f"indicator '{self}' has no appended result")
+        return self._appended[slot]
 
     def result(self, slot=""):
-        data = self._results.get(slot)
-        if data is None:
+        if slot not in self._results:
             self.compute()  # data not ready, so compute on demand
-            data = self._results.get(slot)
+        return self._get_result(slot)
+
+    def _result_name(self, slot=""):
+        return f"{self._name}.{slot}" if slot else f"{self._name}"
+
+    def _get_result(self, slot=""):
+        data = self._results.get(slot)
+        if isinstance(data, _StoredResult):
+            store = self._owner.result_store()
+            if data.columns is None:
+                return store.series((self, slot), self._result_name(slot))
+            frame = store.frame([(self, slot, x) for x in data.columns], data.columns)
+            frame.name = self._result_name(slot)
+            return frame
+        if isinstance(data, _BufferedResult):
+            return data.get()
         return data
 
+    def is_stored(self, slot="") -> bool:
+        """True if the result is held in the container's ResultStore"""
+        return isinstance(self._results.get(slot), _StoredResult)
+
     def _store_result(self, data: pd.Series, slot=""):
-        data.name = f"{self._name}.{slot}" if slot else f"{self._name}"
+        # results are written into the container's result store when it can
+        # hold them, otherwise they are kept as they are
+        store = self._owner.result_store()
+        if store is not None and store.accepts(data):
+            if isinstance(data, pd.DataFrame):
+                columns = list(data.columns)
+                store.write_frame([(self, slot, x) for x in columns], data.to_numpy())
+                self._results[slot] = _StoredResult(columns)
+            else:
+                store.write((self, slot), data.to_numpy())
+                self._results[slot] = _StoredResult()
+            return
+        data = cast_floats(data, self._owner.result_dtype())
+        data.name = self._result_name(slot)
         self._results[slot] = data
 
+    def _extend_result(self, data, slot="", replace=0):
+        # append result rows, first dropping the last `replace` rows, which the
+        # new rows revise
+        data = cast_floats(data, self._owner.result_dtype())
+        old = self._results[slot]
+        store = self._owner.result_store()
+        if (isinstance(old, _StoredResult) and store is not None
+                and store.index[-1] == data.index[-1]):
+            # the store already has the appended rows, so write in place
+            start = store.rows - len(data)
+            if old.columns is None:
+                store.write((self, slot), data.to_numpy(), start)
+            else:
+                store.write_frame([(self, slot, x) for x in old.columns],
+                                  data[old.columns].to_numpy(), start)
+        elif isinstance(old, _BufferedResult):
+            old.extend(data, replace)
+        else:
+            old = self._get_result(slot)
+            if _BufferedResult.accepts(old) and _BufferedResult.accepts(data):
+                buffer = _BufferedResult(old)
+                buffer.extend(data, replace)
+                self._results[slot] = buffer
+            else:
+                data = pd.concat([old.iloc[:len(old) - replace], data])
+                data.name = self._result_name(slot)
+                self._results[slot] = data
+        if self._appended is None:
+            self._appended = dict()
+        self._appended[slot] = data
+
     def to_frame(self):
-        frame = pd.concat([x for x in self._results.values()], axis=1)
+        frame = pd.concat(self.result_list(), axis=1)
         return frame
 
-    def result_list(self):
-        return [x for x in self._results.values()]
+    def result_slots(self) -> list:
+        return list(self._results.keys())
+
+    def result_list(self, name: str = None):
+        """Return the result series; if `name` is given, the series are
+        relabelled as if the indicator had that name"""
+        if name is None:
+            return [self._get_result(slot) for slot in self._results]
+        return [self._get_result(slot).rename(f"{name}.{slot}" if slot else name)
+                for slot in self._results]
 
     def is_computed(self):
         return self._compute_state == BaseIndicator._State.COMPUTED
@@ -108,6 +392,9 @@ class UnaryIndicator(BaseIndicator, ABC):
     def __repr__(self):
         return self._repr
 
+    def sources(self) -> list:
+        return [self.source]
+
     @staticmethod
     def _single_source(sources):
         if sources:
@@ -115,3 +402,125 @@ class UnaryIndicator(BaseIndicator, ABC):
             return sources[0]
         else:
             return None
+
+
+class RollingIndicator(UnaryIndicator, ABC):
+    """A unary indicator whose result at each row depends only on a bounded
+    window of input rows, given by `lookback`.  These can be updated in time
+    proportional to the number of rows appended to the input, by keeping the
+    last `lookback` input rows from one update to the next."""
+
+    # True if the result at each row depends on following, rather than
+    # preceding, input rows; appending rows then revises the last results.
+    FORWARD_LOOKING = False
+
+    def __init__(self, code: str, owner: IndicatorContainer, params: list,
+                 source: str, name: str = None):
+        super().__init__(code, owner, params, source, name=name)
+        self._interval = None
+        self._history = None
+        self._family = None
+
+    @abstractmethod
+    def _calc(self, data):
+        """Calculate the result for a block of input rows"""
+        pass
+
+    @classmethod
+    def _calc_family(cls, data, members: list) -> list:
+        """Calculate the results of several indicators of this class, which
+        differ only in their parameter, for the same block of input rows.
+        Classes with a kernel vectorized over the parameter override this."""
+        return [x._calc(data) for x in members]
+
+    def lookback(self) -> int:
+        return 0
+
+    def _window_rows(self, seconds: int) -> int:
+        periods = int(seconds / self._interval)
+        assert (periods * self._interval) == seconds
+        return periods
+
+    def _compute(self):
+        if self._family is not None:
+            self._family.compute()
+            return
+        data = self._owner.find(self.source)
+        self._interval = data_interval(data)
+        result = self._calc(data)
+        self._store_result(result)
+        self._save_state(data, result)
+
+    def _save_state(self, data, result):
+        self._history = data.iloc[max(len(data) - self.lookback(), 0):]
+
+    def _clear_state(self):
+        self._interval = None
+        self._history = None
+
+    def _has_state(self):
+        # results set by `set_results` come without the incremental state
+        return self.is_computed() and self._interval is not None
+
+    def update(self, rows: int):
+        if not self._has_state():
+            return super().update(rows)
+        new = self._owner.find_appended(self.source)
+        if new is None:
+            return super().update(rows)
+        history = self._history
+        data = pd.concat([history, new]) if len(history) else new
+        result = self._calc(data)
+        if self.FORWARD_LOOKING:
+            self._extend_result(result, replace=len(history))
+            self._appended = None  # revised results cannot be used as input
+        else:
+            result = result.iloc[len(history):]
+            self._extend_result(result)
+        self._save_state(data, result)
+
+
+# Indicators of one RollingIndicator class, reading the same source, that
+# differ only in their parameter, such as the members of EWMA(1m..60m:1m).
+# Each member is an ordinary indicator of its container, but the first member
+# to be computed computes all members not yet computed, from a single read of
+# the input, with the class's family kernel (see `_calc_family`).  Members are
+# computed in batches of at most BATCH_SIZE result values, to bound the memory
+# of kernels that broadcast the input against the parameter axis.
+class IndicatorFamily:
+
+    BATCH_SIZE = 1 << 24
+
+    def __init__(self, members: list):
+        self._lock = threading.Lock()
+        self.members = []
+        self.retain(members)
+
+    def retain(self, members: list):
+        """Keep only `members`, for example those not found to duplicate an
+        indicator already in the container"""
+        for x in self.members:
+            x._family = None
+        self.members = list(members)
+        if len(self.members) > 1:
+            for x in self.members:
+                x._family = self
+
+    def compute(self):
+        with self._lock:
+            pending = [x for x in self.members if not x.is_computed()]
+            if not pending:
+                return
+            first = pending[0]
+            data = first._owner.find(first.source)
+            interval = data_interval(data)
+            batch = max(1, self.BATCH_SIZE // max(data.size, 1))
+            for i in range(0, len(pending), batch):
+                members = pending[i:i + batch]
+                for x in members:
+                    x._interval = interval
+                results = type(first)._calc_family(data, members)
+                for x, result in zip(members, results):
+                    x._store_result(result)
+                    x._save_state(data, result)
+                    x._compute_state = BaseIndicator._State.COMPUTED
@@ -0,0 +1,92 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from qsig.util.datarepo import Library
+
+# Out-of-core evaluation of an ItemIndicatorCache, over a DataRepo item too
+# large to hold in memory.  The item is read in chunks of rows, in time order;
+# the first chunk is computed as usual, and each following chunk is appended,
+# so that indicators update incrementally from the input history or state they
+# keep, which for a RollingIndicator is the last `lookback` input rows, and for
+# EWMA its last value.  Results of each chunk are appended to the target item,
+# and the cache is then trimmed, so memory is bounded by the chunk size.
+#
+# The results of a FORWARD_LOOKING indicator are revised by the rows of the
+# next chunk, so the last rows of each chunk, as many as the largest
+# forward-looking lookback, are held back and written with the next chunk.
+# Indicators with no bounded lookback, and those reading a forward-looking
+# indicator, cannot be updated from a trimmed cache, and are rejected.  The
+# results written are those of computing the whole item in memory.
+
+
+@dataclass
+class ChunkedReport:
+    chunks: int = 0
+    rows: int = 0
+    wall_sec: float = 0.0
+
+
+# Raise if an indicator of `cache` cannot be updated chunk by chunk
+def _check_indicators(cache):
+    for indicator in cache.indicators():
+        if indicator.lookback() is None:
+            raise Exception(f"indicator '{indicator}' has no bounded lookback, "
+                            f"so cannot be computed in chunks")
+        for source in indicator.sources():
+            upstream = cache.find_indicator(source)
+            if upstream is not None and getattr(upstream, "FORWARD_LOOKING", False):
+                raise Exception(f"indicator '{indicator}' reads forward-looking indicator "
+                                f"'{upstream}', so cannot be computed in chunks")
+
+
+# Number of trailing result rows that the next chunk can revise
+def _holdback(cache) -> int:
+    return max([x.lookback() for x in cache.indicators()
+                if getattr(x, "FORWARD_LOOKING", False)], default=0)
+
+
+def compute_chunked(cache, source: Library, key: str, target: Library, target_key: str,
+                    chunk_rows: int, include_data: bool = False) -> ChunkedReport:
+    """Compute the indicators of `cache`, which must have no data and no
+    parent, over item `key` of `source` read in chunks of `chunk_rows` rows,
+    at least 2, and write the results, with the data if `include_data`, to
+    item `target_key` of `target`.  The cache is left holding the last rows."""
+    if cache._data is not None or cache._parent is not None:  # noqa
+        raise Exception(f"{cache} must have no data or parent to compute in chunks")
+    if chunk_rows < 2:
+        raise Exception("chunk_rows must be at least 2, to find the data interval")
+
+    t_start = time.perf_counter()
+    report = ChunkedReport()
+    holdback = 0
+    pending = 0  # computed rows not yet written
+    with target.writer(target_key) as writer:
+        for chunk in source.read_chunks(key, chunk_rows):
+            if report.chunks == 0:
+                if len(chunk) < 2:
+                    raise Exception(f"item '{key}' has fewer than 2 rows to compute in chunks")
+                cache.add_data(chunk)
+                cache.compute()
+                _check_indicators(cache)
+                holdback = _holdback(cache)
+            else:
+                cache.append_data(chunk)
+            report.chunks += 1
+            report.rows += len(chunk)
+            pending += len(chunk)
+
+            results = cache.to_frame(include_data=include_data)
+            ready = pending - min(pending, holdback)
+            if ready:
+                writer.append(results.iloc[len(results) - pending:len(results) - pending + ready])
+                pending -= ready
+            cache.trim(max(holdback, 1))
+            logging.debug(f"computed chunk {report.chunks} of '{key}', {report.rows} rows")
+
+        if pending:
+            results = cache.to_frame(include_data=include_data)
+            writer.append(results.iloc[len(results) - pending:])
+
+    report.wall_sec = time.perf_counter() - t_start
+    return report
@@ -0,0 +1,428 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .base_indicators import BaseIndicator
+from .indicator_container import IndicatorContainer
+
+# Arithmetic expressions over data and indicators, such as
+# 'SMA(5m)-SMA(30m)', 'RET(1m)/DEN(5m)[volume]' or 'SMA(10m)[abs(close-open)]'.
+#
+# An expression is parsed into a tree, in which identical subexpressions are
+# the same node.  Indicator calls are compiled into indicators of the
+# container, named by their expression text, so that they are shared with any
+# other expression or indicator that uses them; a call source may itself be
+# an expression.  The elementwise arithmetic above the indicator calls becomes
+# a single ExpressionIndicator, which evaluates it as a program of numpy ufuncs
+# over chunks of rows: each chunk runs every operation in turn, in a few
+# preallocated buffers reused through `out=`, so that intermediate results stay
+# in cache and no temporary arrays are allocated.
+#
+# Grammar, in increasing precedence:
+#
+#   expr  := term (('+' | '-') term)*
+#   term  := unary (('*' | '/') unary)*
+#   unary := '-' unary | power
+#   power := atom ('**' unary)?
+#   atom  := number | name | '(' expr ')' | func '(' expr (',' expr)* ')'
+#          | CODE '(' params ')' ('[' expr (',' expr)* ']')?
+#
+# where `func` is one of the elementwise FUNCTIONS, and CODE a registered
+# indicator type, whose params are passed to it as text.
+
+FUNCTIONS = {
+    "abs": (np.absolute, 1),
+    "log": (np.log, 1),
+    "exp": (np.exp, 1),
+    "sqrt": (np.sqrt, 1),
+    "sign": (np.sign, 1),
+    "min": (np.minimum, 2),
+    "max": (np.maximum, 2),
+}
+
+OPERATORS = {
+    "+": np.add,
+    "-": np.subtract,
+    "*": np.multiply,
+    "/": np.divide,
+    "**": np.power,
+    "neg": np.negative,
+}
+
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2, "neg": 3, "**": 4}
+
+RE_NUMBER = re.compile(r'\d+(\.\d*)?([eE][-+]?\d+)?(?![\w.])')
+RE_NAME = re.compile(r'[A-Za-z_][\w.]*')
+
+# Tree nodes are tuples, so that equal subexpressions compare and hash equal:
+#   ("num", value)
+#   ("name", name)
+#   ("call", code, params, sources)   for an indicator
+#   ("op", operator, args)            for an operator or function
+
+
+class _Parser:
+
+    def __init__(self, text: str):
+        self._text = text
+        self._pos = 0
+
+    def parse(self):
+        node = self._expr()
+        self._skip()
+        if self._pos != len(self._text):
+            self._fail("unexpected text")
+        return node
+
+    def _fail(self, message):
+        raise Exception(f"not valid indicator expression: {self._text} "
+                        f"({message} at position {self._pos})")
+
+    def _skip(self):
+        while self._pos < len(self._text) and self._text[self._pos].isspace():
+            self._pos += 1
+
+    def _peek(self, token: str) -> bool:
+        self._skip()
+        return self._text.startswith(token, self._pos)
+
+    def _take(self, token: str) -> bool:
+        if self._peek(token):
+            self._pos += len(token)
+            return True
+        return False
+
+    def _expect(self, token: str):
+        if not self._take(token):
+            self._fail(f"expected '{token}'")
+
+    def _expr(self):
+        node = self._term()
+        while True:
+            if self._take("+"):
+                node = ("op", "+", (node, self._term()))
+            elif self._take("-"):
+                node = ("op", "-", (node, self._term()))
+            else:
+                return node
+
+    def _term(self):
+        node = self._unary()
+        while True:
+            if self._peek("**"):
+                return node
+            if self._take("*"):
+                node = ("op", "*", (node, self._unary()))
+            elif self._take("/"):
+                node = ("op", "/", (node, self._unary()))
+            else:
+                return node
+
+    def _unary(self):
+        if self._take("-"):
+            return ("op", "neg", (self._unary(),))
+        return self._power()
+
+    def _power(self):
+        node = self._atom()
+        if self._take("**"):
+            node = ("op", "**", (node, self._unary()))
+        return node
+
+    def _list(self, close: str) -> tuple:
+        items = [self._expr()]
+        while self._take(","):
+            items.append(self._expr())
+        self._expect(close)
+        return tuple(items)
+
+    def _raw_params(self) -> tuple:
+        # indicator params are passed through as text, up to the closing ')'
+        end = self._text.find(")", self._pos)
+        if end < 0:
+            self._fail("expected ')'")
+        params = self._text[self._pos:end]
+        self._pos = end + 1
+        if not params.strip():
+            return ()
+        return tuple(x.strip() for x in params.split(","))
+
+    def _atom(self):
+        self._skip()
+        if self._take("("):
+            node = self._expr()
+            self._expect(")")
+            return node
+        matched = RE_NUMBER.match(self._text, self._pos)
+        if matched:
+            self._pos = matched.end()
+            return ("num", float(matched[0]))
+        matched = RE_NAME.match(self._text, self._pos)
+        if not matched:
+            self._fail("expected a number, name or '('")
+        self._pos = matched.end()
+        name = matched[0]
+        if not self._take("("):
+            return ("name", name)
+        if name in FUNCTIONS:
+            args = self._list(")")
+            if len(args) != FUNCTIONS[name][1]:
+                self._fail(f"function '{name}' takes {FUNCTIONS[name][1]} arguments")
+            return ("op", name, args)
+        params = self._raw_params()
+        sources = self._list("]") if self._take("[") else ()
+        return ("call", name, params, sources)
+
+
+def parse_expression(text: str):
+    """Parse an expression into its tree of nodes"""
+    return _Parser(text).parse()
+
+
+def format_expression(node, parent: int = 0) -> str:
+    """Canonical text of an expression tree, which is also the name given to
+    the indicators compiled from it"""
+    kind = node[0]
+    if kind == "num":
+        return repr(node[1]) if node[1] != int(node[1]) else str(int(node[1]))
+    if kind == "name":
+        return node[1]
+    if kind == "call":
+        text = f"{node[1]}({','.join(node[2])})"
+        if node[3]:
+            text += "[" + ",".join(format_expression(x) for x in node[3]) + "]"
+        return text
+    op, args = node[1], node[2]
+    if op in FUNCTIONS:
+        return f"{op}({','.join(format_expression(x) for x in args)})"
+    precedence = _PRECEDENCE[op]
+    if op == "neg":
+        text = "-" + format_expression(args[0], precedence)
+    elif op == "**":
+        # right associative
+        text = (format_expression(args[0], precedence + 1) + "**" +
+                format_expression(args[1], precedence))
+    else:
+        # left associative
+        text = (format_expression(args[0], precedence) + op +
+                format_expression(args[1], precedence + 1))
+    return f"({text})" if precedence < parent else text
+
+
+# An elementwise program over the inputs of an ExpressionIndicator.  Each
+# operation reads inputs, constants and the results of earlier operations,
+# and writes its result into a register, a buffer of CHUNK_SIZE values;
+# registers are reused as soon as the value they hold is no longer read.
+class _Program:
+
+    CHUNK_SIZE = 1 << 14
+
+    def __init__(self, node, sources: list):
+        self.operations = []  # (ufunc, args, register), args as (kind, index)
+        self.registers = 0
+        self._result = self._compile(node, sources)
+
+    def _compile(self, node, sources: list):
+        # operations in dependency order, each distinct node once
+        order = []
+        seen = set()
+
+        def visit(x):
+            if x[0] != "op" or x in seen:
+                return
+            for arg in x[2]:
+                visit(arg)
+            seen.add(x)
+            order.append(x)
+        visit(node)
+
+        def operand(x, registers):
+            if x[0] == "num":
+                return "const", x[1]
+            if x[0] == "op":
+                return "reg", registers[x]
+            return "input", sources.index(format_expression(x))
+
+        last_use = dict()
+        for i, x in enumerate(order):
+            for arg in x[2]:
+                last_use[arg] = i
+
+        registers = dict()
+        free = []
+        for i, x in enumerate(order):
+            args = tuple(operand(arg, registers) for arg in x[2])
+            # registers of values read for the last time can take the result
+            for arg in set(x[2]):
+                if arg[0] == "op" and last_use[arg] == i:
+                    free.append(registers[arg])
+            if free:
+                register = free.pop()
+            else:
+                register = self.registers
+                self.registers += 1
+            registers[x] = register
+            ufunc = OPERATORS[x[1]] if x[1] in OPERATORS else FUNCTIONS[x[1]][0]
+            self.operations.append((ufunc, args, register))
+        return operand(node, registers)
+
+    def run(self, inputs: list, columns: int) -> np.ndarray:
+        """Evaluate over `inputs`, arrays of (rows x columns) or (rows x 1)"""
+        rows = len(inputs[0])
+        result = np.empty((rows, columns), dtype=np.float64)
+        if not self.operations:
+            result[:] = inputs[self._result[1]]
+            return result
+        chunk = max(1, self.CHUNK_SIZE // columns)
+        buffers = [np.empty((chunk, columns), dtype=np.float64) for _ in range(self.registers)]
+        last = len(self.operations) - 1
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for start in range(0, rows, chunk):
+                stop = min(start + chunk, rows)
+                size = stop - start
+                for i, (ufunc, args, register) in enumerate(self.operations):
+                    values = []
+                    for kind, index in args:
+                        if kind == "input":
+                            values.append(inputs[index][start:stop])
+                        elif kind == "reg":
+                            values.append(buffers[index][:size])
+                        else:
+                            values.append(index)
+                    out = result[start:stop] if i == last else buffers[register][:size]
+                    ufunc(*values, out=out)
+        return result
+
+
+class ExpressionIndicator(BaseIndicator):
+    """Elementwise arithmetic over data and indicator results, compiled from
+    an expression such as 'SMA(5m)-SMA(30m)'"""
+
+    CODE = "EXPR"
+    PANEL = True
+
+    def __init__(self, owner: IndicatorContainer, node, name: str = None):
+        super().__init__(self.CODE, owner, name or format_expression(node))
+        self._sources = []
+        self._collect_sources(node)
+        self._node = node
+        self._program = _Program(node, self._sources)
+        self._repr = f"{self.CODE}({format_expression(node)})"
+
+    def _collect_sources(self, node):
+        if node[0] == "op":
+            for arg in node[2]:
+                self._collect_sources(arg)
+        elif node[0] != "num":
+            name = format_expression(node)
+            if name not in self._sources:
+                self._sources.append(name)
+
+    def __repr__(self):
+        return self._repr
+
+    def sources(self) -> list:
+        return list(self._sources)
+
+    def canonical_params(self):
+        # the expression with its sources as placeholders, so that the same
+        # arithmetic over the same (resolved) sources is shared
+        def placeholders(node):
+            if node[0] == "op":
+                return ("op", node[1], tuple(placeholders(x) for x in node[2]))
+            if node[0] == "num":
+                return node
+            return ("name", f"${self._sources.index(format_expression(node))}")
+        return format_expression(placeholders(self._node))
+
+    def _compute(self):
+        if not self._sources:
+            raise Exception(f"expression '{self}' does not read any data or indicator")
+        self._store_result(self._evaluate([self._owner.find(x) for x in self._sources]))
+
+    def lookback(self) -> int:
+        return 0
+
+    def update(self, rows: int):
+        # elementwise, so only the appended rows of the inputs are evaluated,
+        # when all of them are available
+        if self.is_computed():
+            data = [self._owner.find_appended(x) for x in self._sources]
+            if all(x is not None for x in data):
+                self._extend_result(self._evaluate(data))
+                return
+        super().update(rows)
+
+    def _evaluate(self, data: list):
+        frame = next((x for x in data if isinstance(x, pd.DataFrame)), None)
+        columns = 1 if frame is None else frame.shape[1]
+        inputs = [x.to_numpy().reshape(len(x), -1) for x in data]
+        for x in data[1:]:
+            if len(x) != len(data[0]):
+                raise Exception(f"expression '{self}' inputs have different lengths")
+        values = self._program.run(inputs, columns)
+        if frame is not None:
+            return pd.DataFrame(values, index=frame.index, columns=frame.columns, copy=False)
+        return pd.Series(values[:, 0], index=data[0].index, copy=False)
+
+
+# The indicators compiled from an expression, in dependency order, the last
+# being the indicator of the whole expression.  Inner indicators are named by
+# their expression text, and are only added to the container if it does not
+# already have them.
+class CompiledExpression:
+
+    def __init__(self, indicators: list):
+        self.indicators = indicators
+
+    @property
+    def root(self):
+        return self.indicators[-1]
+
+    @property
+    def inner(self):
+        return self.indicators[:-1]
+
+
+def compile_expression(text: str, container: IndicatorContainer, factory,
+                       name: str = None) -> CompiledExpression:
+    """Compile an expression into the indicators that compute it, using
+    `factory` to create indicator calls"""
+    root = parse_expression(text)
+    indicators = dict()  # name -> indicator, in dependency order
+
+    def call_indicator(node, name=None):
+        sources = [source_name(x) for x in node[3]]
+        indicator = factory.create_call(node[1], list(node[2]) or None, sources or None,
+                                        container, name)
+        indicators[indicator.name] = indicator
+        return indicator
+
+    def source_name(node) -> str:
+        # the name of the data or indicator of a node, compiling it if needed
+        text = format_expression(node)
+        if node[0] == "name" or text in indicators or container.has_source(text):
+            return text
+        if node[0] == "call":
+            return call_indicator(node).name
+        indicator = ExpressionIndicator(container, lower(node))
+        indicators[indicator.name] = indicator
+        return indicator.name
+
+    def lower(node):
+        # the arithmetic of a node, with its indicator calls as names
+        if node[0] == "op":
+            return "op", node[1], tuple(lower(x) for x in node[2])
+        if node[0] == "call":
+            return "name", source_name(node)
+        return node
+
+    if root[0] == "call":
+        indicator = call_indicator(root, name)
+    elif root[0] == "op":
+        indicator = ExpressionIndicator(container, lower(root), name)
+    else:
+        raise Exception(f"not valid indicator expression: {text}")
+    indicators.pop(indicator.name, None)
+    return CompiledExpression(list(indicators.values()) + [indicator])
@@ -1,3 +1,5 @@
+import dataclasses
+
 from .indicator_container import IndicatorContainer
 from .base_indicators import BaseIndicator
 
@@ -8,6 +10,23 @@ from .base_indicators import BaseIndicator
 # combine that details class with a GenericIndicator instance.
 
 
+# Hashable form of a parameter value, built from its contents so that it is the
+# same from one run to the next.  Raises ValueError for a value with no such
+# form, such as an object with only the default repr, which has its address.
+def _stable_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        items = [(f.name, getattr(value, f.name)) for f in dataclasses.fields(value)]
+    elif isinstance(value, dict):
+        items = sorted(value.items())
+    elif isinstance(value, (list, tuple)):
+        items = list(enumerate(value))
+    else:
+        raise ValueError(f"no stable form for parameter value of type {type(value)}")
+    return type(value).__name__, tuple((k, _stable_value(v)) for k, v in items)
+
+
 class GenericIndicator(BaseIndicator):
 
     @staticmethod
@@ -74,6 +93,21 @@ class GenericIndicator(BaseIndicator):
     def __repr__(self):
         return self._repr
 
+    def canonical_params(self):
+        # the roles of the inputs are part of the key, and the sources are
+        # listed in the same, sorted, role order
+        try:
+            params = _stable_value(self._params)
+        except ValueError:
+            return None  # cannot be shared
+        roles = tuple(sorted(self._inputs)) if isinstance(self._inputs, dict) else None
+        return params, roles
+
+    def sources(self) -> list:
+        if isinstance(self._inputs, dict):
+            return [self._inputs[role] for role in sorted(self._inputs)]
+        return [self._inputs]
+
 
     def _compute(self):
         if hasattr(self._details, "Inputs"):
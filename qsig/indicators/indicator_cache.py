@@ -1,23 +1,173 @@
 import pandas as pd
 import logging
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 
 from qsig.model.instrument import Instrument
+from qsig.util.precision import cast_floats, resolve_dtype
+from .base_indicators import IndicatorFamily
+from .expression import CompiledExpression
 from .indicator_factory import IndicatorFactory
 from .indicator_container import IndicatorContainer
+from .indicator_graph import ComputeReport, evaluate_graph, topological_sort
+from .result_cache import IndicatorResultCache, fingerprint, indicator_digest
+from .result_store import ResultStore
 from typing import Union
 
 
+# Names of the columns that differ between two versions of a data frame
+def _changed_columns(old: pd.DataFrame, new: pd.DataFrame) -> set:
+    if not old.index.equals(new.index):
+        return set(old.columns) | set(new.columns)
+    changed = set(old.columns) ^ set(new.columns)
+    for col in set(old.columns) & set(new.columns):
+        if not old[col].equals(new[col]):
+            changed.add(col)
+    return changed
+
+
+# Build a frame of indicator results from `entries` of (indicator, slot,
+# column, label), where column is the item of a panel result, or None.  If all
+# the results are held in `store` the frame is a view onto the store.
+def _results_frame(store: ResultStore, entries: list) -> pd.DataFrame:
+    for indicator, slot, _, _ in entries:
+        if not indicator.is_computed():
+            indicator.compute()
+    if store is not None and all(x[0].is_stored(x[1]) for x in entries):
+        keys = [(ind, slot) if column is None else (ind, slot, column)
+                for ind, slot, column, _ in entries]
+        return store.frame(keys, [x[3] for x in entries])
+    columns = []
+    for indicator, slot, column, label in entries:
+        data = indicator.result(slot)
+        columns.append((data if column is None else data[column]).rename(label))
+    return pd.concat(columns, axis=1) if columns else pd.DataFrame()
+
+
+# Frame of indicator profiles, from a map of key to indicator, hottest first
+def _profile_frame(indicators: dict, names: list) -> pd.DataFrame:
+    records = [dict(code=x.code, **asdict(x.profile)) for x in indicators.values()]
+    columns = ["code", "calls", "wall_sec", "cpu_sec", "rows", "result_bytes"]
+    index = pd.MultiIndex.from_tuples(indicators.keys(), names=names) if len(names) > 1 \
+        else pd.Index(indicators.keys(), name=names[0])
+    frame = pd.DataFrame(records, index=index, columns=columns)
+    return frame.sort_values("wall_sec", ascending=False, kind="stable")
+
+
+# Indicators held by a container, with common subexpression elimination.  Each
+# indicator added is reduced to a structural key, made of its type, canonical
+# params and resolved sources; an indicator whose key is already present is not
+# kept, and its name instead becomes an alias of the existing indicator.
+class _IndicatorSet:
+
+    def __init__(self, owner: str):
+        self._owner = owner
+        self.indicators = dict()  # canonical name -> indicator
+        self.names = dict()  # any name, canonical or alias -> canonical name
+        self._keys = dict()  # structural key -> canonical name
+        self._key_of = dict()  # canonical name -> structural key
+
+    def __contains__(self, name: str):
+        return name in self.names
+
+    def resolve(self, name: str):
+        return self.names.get(name, name)
+
+    def get(self, name: str):
+        canonical = self.names.get(name)
+        return None if canonical is None else self.indicators[canonical]
+
+    def aliases(self) -> dict:
+        return {name: canonical for name, canonical in self.names.items() if name != canonical}
+
+    def key(self, name: str):
+        canonical = self.resolve(name)
+        return self._key_of.get(canonical, canonical)
+
+    def invalidate(self, sources: set, digests: dict) -> set:
+        """Clear the indicators that read any of `sources`, which may be data
+        or indicator names, either directly or through other indicators.
+        Returns the names of the indicators cleared."""
+        graph = {name: [self.resolve(x) for x in indicator.sources()]
+                 for name, indicator in self.indicators.items()}
+        changed = set(self.resolve(x) for x in sources)
+        cleared = set()
+        for name in topological_sort(graph):
+            if name in changed or any(x in changed for x in graph[name]):
+                self.indicators[name].clear()
+                changed.add(name)
+                cleared.add(name)
+        for name in changed:
+            digests.pop(name, None)
+        return cleared
+
+    def structural_key(self, name: str):
+        """Structural key of an indicator, None if it cannot be shared"""
+        return self._key_of.get(self.resolve(name))
+
+    def digest(self, name: str, digests: dict, find):
+        """Digest of an indicator's canonical expression and inputs, for the
+        persistent result cache; None if the indicator has no canonical form.
+        `digests` holds the digests of indicators already evaluated, and of
+        data inputs already fingerprinted, and `find` looks up data inputs."""
+        key = self.structural_key(name)
+        if key is None:
+            return None
+        source_digests = []
+        for source in self.get(name).sources():
+            canonical = self.resolve(source)
+            if canonical not in digests:
+                if canonical in self.indicators:
+                    # an indicator without canonical form, use its values
+                    digests[canonical] = fingerprint(self.indicators[canonical].result())
+                else:
+                    digests[canonical] = fingerprint(find(source))
+            source_digests.append(digests[canonical])
+        return indicator_digest(repr(key), source_digests)
+
+    def add(self, indicator):
+        """Add an indicator, returning either it or the existing indicator it
+        is an alias of"""
+        name = indicator.name
+        if name in self.names:
+            raise Exception("{} cannot add duplicate indicator '{}'".format(self._owner, name))
+
+        params = indicator.canonical_params()
+        if params is not None:
+            key = (indicator.code, params, tuple(self.key(x) for x in indicator.sources()))
+            existing = self._keys.get(key)
+            if existing is not None:
+                self.names[name] = existing
+                logging.debug(f"indicator '{name}' is an alias of '{existing}'")
+                return self.indicators[existing]
+            self._keys[key] = name
+            self._key_of[name] = key
+
+        self.indicators[name] = indicator
+        self.names[name] = name
+        return indicator
+
+
 class ItemIndicatorCache(IndicatorContainer):
     """Container for indicators related to a single tradable item, such as an
-    asset or index."""
+    asset or index.  Data and results are held in `dtype` (see
+    qsig.util.precision), by default that of the parent, if any."""
     def __init__(self,
                  instrument: Union[Instrument, None, str],
-                 parent: IndicatorContainer = None):
-        self._indicators = dict()
+                 parent: IndicatorContainer = None,
+                 result_cache: IndicatorResultCache = None,
+                 dtype=None):
+        self._indicators = _IndicatorSet(self.__class__.__name__)
+        self._result_cache = result_cache
+        if dtype is None and parent is not None:
+            dtype = parent.result_dtype()
+        self._dtype = resolve_dtype(dtype)
+        self._digests = dict()
         self._inst = instrument
         self._data = None
+        self._appended = None
         self._parent = parent
+        self._store = None
+        self.compute_report = None
 
     def __repr__(self):
 
@@ -38,7 +188,7 @@ class ItemIndicatorCache(IndicatorContainer):
 
         # determine if the expression is an indicator class or an inline
         # indicator expression
-        if "(" in cls:
+        if not cls.isidentifier():
             indicator = IndicatorFactory.instance().create_from_expr(cls, self)
         else:
             if config is None:
@@ -48,29 +198,165 @@ class ItemIndicatorCache(IndicatorContainer):
 
             indicator = IndicatorFactory.instance().create(cls, config, self)
 
-        name = indicator.name
-        if name in self._indicators:
-            raise Exception("{} cannot add duplicate indicator '{}'".format(
-                self.__class__.__name__, name))
-
-        self._indicators[name] = indicator
+        if isinstance(indicator, IndicatorFamily):
+            # a family expression adds its members, which are computed together
+            members = [self._add(x) for x in indicator.members]
+            indicator.retain([x for x in members if x in indicator.members])
+            return members
+        if isinstance(indicator, CompiledExpression):
+            # an arithmetic expression adds the indicators it is built from
+            for inner in indicator.inner:
+                if inner.name not in self._indicators:
+                    self._add(inner)
+            return self._add(indicator.root)
+        return self._add(indicator)
+
+    def _add(self, indicator):
+        # returns the existing indicator if the new one is a duplicate
+        indicator = self._indicators.add(indicator)
+        store = self.result_store()
+        if store is not None:
+            store.allocate((indicator, ""))
         logging.debug(f"added indicator '{indicator}' = {repr(indicator)} on {self.symbol()}")
         return indicator
 
     def add_data(self, data: pd.DataFrame):
+        """Set the data; replacing existing data marks the indicators reading
+        the changed columns, and those downstream of them, for recompute.
+        Float columns are cast to the float dtype of the cache."""
+        data = cast_floats(data, self._dtype)
+        old = self._data
         self._data = data
+        if old is not None:
+            self.invalidate(*_changed_columns(old, data))
+        if self._parent is None:
+            if self._store is None:
+                self._store = ResultStore(data.index, self._dtype)
+                for indicator in self.indicators():
+                    self._store.allocate((indicator, ""))
+            elif not self._store.index.equals(data.index):
+                self._store.set_index(data.index)
+
+    def has_source(self, name: str) -> bool:
+        if name in self._indicators:
+            return True
+        if self._data is not None and name in self._data.columns:
+            return True
+        return self._parent is not None and self._parent.has_source(name)
+
+    def result_store(self):
+        if self._parent is not None:
+            return self._parent.result_store()
+        return self._store
+
+    def result_dtype(self):
+        return self._dtype
+
+    def invalidate(self, *names: str) -> set:
+        """Mark the indicators reading the named data columns or indicators,
+        and all indicators downstream of them, for recompute.  Named indicators
+        are themselves marked."""
+        return self._indicators.invalidate(set(names), self._digests)
+
+    def append_data(self, data: pd.DataFrame):
+        """Append rows to the data, after those already present, and update the
+        computed indicators.  Indicators that support it are updated
+        incrementally, from state kept since the last update, rather than
+        recomputed over the full history."""
+        if self._data is None:
+            self.add_data(data)
+            return self.compute()
+        if len(data) == 0:
+            return
+        if data.index[0] <= self._data.index[-1]:
+            raise Exception(f"{self} appended data must start after the existing data")
+        if list(data.columns) != list(self._data.columns):
+            raise Exception(f"{self} appended data must have the same columns")
+
+        data = cast_floats(data, self._dtype)
+        self._data = pd.concat([self._data, data])
+        self._appended = data
+        self._digests = dict()
+        if self._store is not None:
+            self._store.extend_index(data.index)
+        try:
+            graph = self.dependency_graph()
+            for name in topological_sort(graph):
+                indicator = self._indicators.get(name)
+                if all(self._indicators.get(x).has_appended_result() for x in graph[name]):
+                    indicator.profiled_update(len(data))
+                else:
+                    # an input revised earlier rows, as a forward-looking
+                    # indicator does, so recompute over the full history
+                    indicator.clear()
+                    indicator.compute()
+        finally:
+            self._appended = None
+
+    def trim(self, rows: int):
+        """Drop all but the last `rows` rows of the data and results, to bound
+        the memory of a cache that data is appended to indefinitely.
+        Indicators keep the input history and state they need for later
+        updates, so appending data afterwards gives the same results."""
+        if self._parent is not None:
+            raise Exception(f"{self} cannot trim a cache that has a parent")
+        if self._data is None or len(self._data) <= rows:
+            return
+        drop = len(self._data) - rows
+        self._data = self._data.iloc[drop:].copy()
+        self._store.discard(drop)
+        for indicator in self.indicators():
+            indicator.trim(rows)
+
+    def compute_chunked(self, source, key: str, target, target_key: str, chunk_rows: int,
+                        include_data: bool = False):
+        """Compute the indicators over the data of DataRepo item `key` of
+        library `source`, read in chunks of `chunk_rows` rows, writing the
+        results to item `target_key` of library `target`; see
+        qsig.indicators.chunked"""
+        from .chunked import compute_chunked
+        return compute_chunked(self, source, key, target, target_key, chunk_rows, include_data)
+
+    def find_appended(self, source: str):
+        """Rows of an input added by the current `append_data` call, or None
+        for an indicator with no appended rows, as its results were revised"""
+        indicator = self._indicators.get(source)
+        if indicator is not None:
+            if not indicator.has_appended_result():
+                return None
+            return indicator.appended_result(slot="")
+        if self._appended is not None and source in self._appended.columns:
+            return self._appended[source]
+        raise Exception(f"{self} has no appended data or indicator named '{source}'")
 
     def list(self):
-        return [x for x in self._indicators.values()]
+        return [x for x in self._indicators.indicators.values()]
 
     def indicator_names(self) -> list:
-        return sorted([x.name for x in self._indicators.values()])
+        """Names of all indicators, including aliases"""
+        return sorted(self._indicators.names.keys())
+
+    def aliases(self) -> dict:
+        """Map of alias name to the name of the indicator it shares"""
+        return self._indicators.aliases()
 
     def has_indicator(self, name: str):
-        return name in self.indicator_names()
+        return name in self._indicators
 
     def indicators(self):
-        return [x for x in self._indicators.values()]
+        """Distinct indicators, excluding aliases"""
+        return [x for x in self._indicators.indicators.values()]
+
+    def find_indicator(self, name: str):
+        return self._indicators.get(name)
+
+    def result(self, name: str) -> pd.Series:
+        """Result of an indicator, labelled with `name` even if an alias"""
+        indicator = self._indicators.get(name)
+        if indicator is None:
+            raise Exception(f"{self} does not contain indicator named '{name}'")
+        result = indicator.result()
+        return result if indicator.name == name else result.rename(name)
 
     def find(self, source: str, asset: str = None):
         indicator = self._indicators.get(source)
@@ -84,29 +370,76 @@ class ItemIndicatorCache(IndicatorContainer):
             return self._parent.find(source, self.symbol())
         raise Exception(f"{self} does not contain data or indicator named '{source}'")
 
-    def compute(self):
-        """Compute all indicators"""
-
-        for indicator in self._indicators.values():
-            indicator.clear()
-
-        for indicator in self._indicators.values():
+    def dependency_graph(self) -> dict:
+        """Map each indicator name to the names of the indicators of this cache
+        that it reads"""
+        graph = dict()
+        for name, indicator in self._indicators.indicators.items():
+            deps = [self._indicators.resolve(x) for x in indicator.sources()]
+            graph[name] = [x for x in deps if x in self._indicators.indicators]
+        return graph
+
+    def compute(self, max_workers: int = None, force: bool = False) -> ComputeReport:
+        """Compute the indicators not yet computed, which are those added, or
+        invalidated by a change of data, since the last compute; with `force`,
+        compute all indicators.  Indicators are evaluated in dependency order,
+        and independent indicators are computed concurrently on up to
+        `max_workers` threads."""
+
+        if force:
+            for indicator in self.indicators():
+                indicator.clear()
+            self._digests = dict()
+
+        graph = {name: deps for name, deps in self.dependency_graph().items()
+                 if not self._indicators.get(name).is_computed()}
+        self.compute_report = evaluate_graph(
+            graph,
+            lambda name: self._evaluate(name, self._digests),
+            max_workers)
+        return self.compute_report
+
+    def _evaluate(self, name: str, digests: dict):
+        # compute a single indicator, or load it from the result cache
+        indicator = self._indicators.get(name)
+        digest = None
+        if self._result_cache is not None:
+            digest = self._indicators.digest(name, digests, self.find)
+        if digest is None:
             indicator.compute()
-
-    def to_frame(self, skip_non_computed=False):
-        results = [self._data]
-        for indicator in self._indicators.values():
+            return
+        digests[name] = digest
+        self._result_cache.compute(indicator, self.symbol(),
+                                   repr(self._indicators.structural_key(name)), digest)
+
+    def profile(self) -> pd.DataFrame:
+        """Work done by each distinct indicator, over all its computes and
+        updates, hottest first: calls, wall and CPU time, rows produced and
+        the memory held by the results"""
+        return _profile_frame(dict(self._indicators.indicators), ["indicator"])
+
+    def to_frame(self, skip_non_computed=False, include_data=True):
+        """Frame of the data and indicator results, with columns in name
+        order.  Without the data, the frame has the indicator results in the
+        order added, and is a zero-copy view of the result store."""
+        entries = []
+        for name, canonical in self._indicators.names.items():
+            indicator = self._indicators.indicators[canonical]
             if indicator.is_computed():
-                results.extend(indicator.result_list())
+                for slot in indicator.result_slots():
+                    entries.append((indicator, slot, None, f"{name}.{slot}" if slot else name))
             elif not skip_non_computed:
                 raise Exception(f"indicator not yet computed, for '{indicator}'")
-        df = pd.concat(results, axis=1)
+        results = _results_frame(self.result_store(), entries)
+        if not include_data:
+            return results
+        df = pd.concat([self._data, results], axis=1)
         df.sort_index(axis=1, inplace=True)
         return df
 
 
 
-@dataclass
+@dataclass(frozen=True)
 class IndicatorPath:
     symbol: str
     name: str
@@ -118,12 +451,32 @@ class IndicatorPath:
 # Root level indicator cache.  This will contain individual ItemIndicatorCache
 # instances per asset or tradable item.  It can also contain common data sets
 # that arranged on a per-feature basis.
+#
+# In panel mode, indicators that support it (see BaseIndicator.PANEL) and that
+# only read root data or other panel indicators are evaluated once on the wide
+# feature frames, with one column per item, instead of once per item.  Other
+# indicators are still evaluated per item, and can read panel indicators.
+#
+# Data and results of the root and its items are held in `dtype`, the default
+# float dtype if not given (see qsig.util.precision).
 class RootIndicatorCache(IndicatorContainer):
 
-    def __init__(self):
+    # symbol used in IndicatorPath for panel indicators
+    PANEL_SYMBOL = "*"
+
+    def __init__(self, panel: bool = False, result_cache: IndicatorResultCache = None,
+                 dtype=None):
+        self._result_cache = result_cache
+        self._dtype = resolve_dtype(dtype)
         self._data = dict()
         self._item_indicators = None
+        self._panel_indicators = _IndicatorSet(self.__class__.__name__)
+        self._panel = panel
+        self._digests = dict()
         self._universe = []
+        self._store = ResultStore(dtype=self._dtype)
+        self._expressions = []
+        self.compute_report = None
 
     def universe(self) -> list[str]:
         return self._universe
@@ -133,7 +486,19 @@ class RootIndicatorCache(IndicatorContainer):
             ids = [ ids]
         self._universe = [x for x in ids]
 
+    def _find_panel(self, input_: str):
+        if input_ in self._panel_indicators:
+            return self._panel_indicators.get(input_).result()
+        df = self._data[input_]
+        if list(df.columns) != self._universe:
+            df = df[self._universe]
+        return df
+
     def find(self, input_: str, asset: str = None):
+        if asset is None and (input_ in self._data or input_ in self._panel_indicators):
+            return self._find_panel(input_)
+        if input_ in self._panel_indicators:
+            return self._panel_indicators.get(input_).result()[asset]
         if input_ in self._data:
             df = self._data[input_]
             if asset in df.columns:
@@ -144,7 +509,47 @@ class RootIndicatorCache(IndicatorContainer):
     def add_data(self, data: pd.DataFrame, name: str = None):
         label = name or data.name
         assert label, "data added to indicator must have a name"
+        data = cast_floats(data, self._dtype)
+        old = self._data.get(label)
         self._data[label] = data
+        if self._store.index is None or not self._store.index.equals(data.index):
+            # results are stored against the index of the latest data set;
+            # those held against another index are discarded
+            if self._store.index is not None:
+                self._clear()
+            self._store.set_index(data.index)
+        elif old is not None:
+            self._invalidate_data(label, _changed_columns(old, data))
+
+    def has_source(self, name: str) -> bool:
+        return name in self._data or name in self._panel_indicators
+
+    def result_store(self):
+        return self._store
+
+    def result_dtype(self):
+        return self._dtype
+
+    def _clear(self):
+        for indicator in self._panel_indicators.indicators.values():
+            indicator.clear()
+        for _, cache in self._item_caches():
+            for indicator in cache.indicators():
+                indicator.clear()
+            cache._digests = dict()  # noqa
+        self._digests = dict()
+
+    def _invalidate_data(self, label: str, symbols: set):
+        # mark for recompute the indicators that read the changed symbols of a
+        # data set, and everything downstream of them
+        digests = self._digests.setdefault(self.PANEL_SYMBOL, dict())
+        changed_panels = self._panel_indicators.invalidate({label}, digests)
+        for symbol, cache in self._item_caches():
+            sources = set(changed_panels)
+            if symbol in symbols:
+                sources.add(label)
+            if sources:
+                cache.invalidate(*sources)
 
     def _generate_auto_universe(self):
         logging.info("auto generating universe for indicator cache")
@@ -157,23 +562,144 @@ class RootIndicatorCache(IndicatorContainer):
 
         self._universe = list(universe)
 
+    def _add_panel_indicator(self, cls: str):
+        # Returns None if the indicator cannot be evaluated as a panel
+        if not cls.isidentifier():
+            indicator = IndicatorFactory.instance().create_from_expr(cls, self)
+        else:
+            indicator = IndicatorFactory.instance().create(cls, dict(), self)
+        family = indicator if isinstance(indicator, IndicatorFamily) else None
+        if family:
+            candidates = family.members
+        elif isinstance(indicator, CompiledExpression):
+            candidates = [x for x in indicator.inner if x.name not in self._panel_indicators]
+            candidates.append(indicator.root)
+        else:
+            candidates = [indicator]
+        if not all(x.PANEL for x in candidates):
+            return None
+        names = set(x.name for x in candidates)
+        if not all(x in self._data or x in self._panel_indicators or x in names
+                   for candidate in candidates for x in candidate.sources()):
+            return None
+        added = []
+        for indicator in candidates:
+            indicator = self._panel_indicators.add(indicator)
+            for symbol in self._universe:
+                self._store.allocate((indicator, "", symbol))
+            logging.debug(f"added panel indicator '{indicator}' = {repr(indicator)}")
+            added.append(indicator)
+        if family:
+            family.retain([x for x in added if x in family.members])
+            return added
+        return added[-1]
+
     def add_indicator(self, cls: str):
         if not self._universe:
             self._generate_auto_universe()
+        self._expressions.append(cls)
+        if self._panel and self._add_panel_indicator(cls) is not None:
+            return
         if self._item_indicators is None:
-            self._item_indicators = {x: ItemIndicatorCache(x, self) for x in self._universe}
+            self._item_indicators = {x: ItemIndicatorCache(x, self, self._result_cache)
+                                     for x in self._universe}
         for indicator in self._item_indicators.values():
             indicator.add_indicator(cls)
 
-    def compute(self):
-        for indicator in self._item_indicators.values():
-            indicator.compute()
+    def _item_caches(self):
+        return self._item_indicators.items() if self._item_indicators else []
+
+    def compute(self, max_workers: int = None, force: bool = False, processes: int = None):
+        """Compute the indicators of all items not yet computed (or all, with
+        `force`), as a single dependency graph, so that independent indicators
+        of different items can be computed concurrently on up to `max_workers`
+        threads.  With `processes` greater than one, the universe is split
+        into that many shards, computed in separate processes, each on up to
+        `max_workers` threads (see qsig.indicators.sharding)."""
+        if force:
+            self._clear()
+
+        graph = self._compute_graph()
+        if processes is not None and processes > 1 and len(self._universe) > 1 and graph:
+            from .sharding import compute_sharded
+            self.compute_report = compute_sharded(self, graph, processes, max_workers)
+        else:
+            self.compute_report = evaluate_graph(graph, self._evaluate_path, max_workers)
         return self
 
+    def _compute_graph(self) -> dict:
+        # dependency graph of the indicators not yet computed, by IndicatorPath
+        graph = dict()
+        for name, indicator in self._panel_indicators.indicators.items():
+            if indicator.is_computed():
+                continue
+            graph[IndicatorPath(self.PANEL_SYMBOL, name)] = [
+                IndicatorPath(self.PANEL_SYMBOL, self._panel_indicators.resolve(x))
+                for x in indicator.sources()]
+        for symbol, cache in self._item_caches():
+            for name, deps in cache.dependency_graph().items():
+                if cache.find_indicator(name).is_computed():
+                    continue
+                graph[IndicatorPath(symbol, name)] = [IndicatorPath(symbol, x) for x in deps]
+                graph[IndicatorPath(symbol, name)] += [
+                    IndicatorPath(self.PANEL_SYMBOL, self._panel_indicators.resolve(x))
+                    for x in cache.find_indicator(name).sources()
+                    if x in self._panel_indicators]
+        return graph
+
+    def _evaluate_path(self, path: IndicatorPath):
+        if path.symbol == self.PANEL_SYMBOL:
+            self._evaluate_panel(path.name, self._digests.setdefault(self.PANEL_SYMBOL, dict()))
+        else:
+            cache = self._item_indicators[path.symbol]
+            cache._evaluate(path.name, cache._digests)  # noqa
+
+    def _indicator_at(self, path: IndicatorPath):
+        if path.symbol == self.PANEL_SYMBOL:
+            return self._panel_indicators.get(path.name)
+        return self._item_indicators[path.symbol].find_indicator(path.name)
+
+    def _evaluate_panel(self, name: str, digests: dict):
+        indicator = self._panel_indicators.get(name)
+        digest = None
+        if self._result_cache is not None:
+            digest = self._panel_indicators.digest(name, digests, self._find_panel)
+        if digest is None:
+            indicator.compute()
+            return
+        digests[name] = digest
+        self._result_cache.compute(indicator, self.PANEL_SYMBOL,
+                                   repr(self._panel_indicators.structural_key(name)),
+                                   digest, panel=True)
+
+    def profile(self, by_symbol: bool = False) -> pd.DataFrame:
+        """Work done by the indicators (see ItemIndicatorCache.profile), rolled
+        up across symbols by indicator name, with the number of items each
+        is computed for; or, with `by_symbol`, per symbol and indicator,
+        where panel indicators have the symbol PANEL_SYMBOL."""
+        indicators = {(self.PANEL_SYMBOL, name): indicator
+                      for name, indicator in self._panel_indicators.indicators.items()}
+        for symbol, cache in self._item_caches():
+            for name, indicator in cache._indicators.indicators.items():  # noqa
+                indicators[(symbol, name)] = indicator
+        frame = _profile_frame(indicators, ["symbol", "indicator"])
+        if by_symbol:
+            return frame
+        items = frame.groupby(level="indicator", sort=False).size()
+        frame = frame.groupby(level="indicator", sort=False).agg(
+            {"code": "first", "calls": "sum", "wall_sec": "sum", "cpu_sec": "sum",
+             "rows": "sum", "result_bytes": "sum"})
+        frame.insert(1, "items", items)
+        frame.loc[[(self.PANEL_SYMBOL, x) in indicators for x in frame.index], "items"] = \
+            len(self._universe)
+        return frame.sort_values("wall_sec", ascending=False, kind="stable")
 
     def list_indicators(self):
         names = []
-        for symbol, cache in self._item_indicators.items():
+        for name in self._panel_indicators.names:
+            for symbol in self._universe:
+                names.append(IndicatorPath(symbol, name))
+        for symbol, cache in self._item_caches():
             for ind_name in cache.indicator_names():
                 names.append(IndicatorPath(symbol, ind_name))
         return names
@@ -198,15 +724,36 @@ class RootIndicatorCache(IndicatorContainer):
             if not indicator_name and symbol:
                 column_namer = _column_name_indicator
 
-        dataframes = []
-        for symbol_, cache in self._item_indicators.items():
+        # a panel indicator requested for all symbols is returned as is
+        if indicator_name in self._panel_indicators and not symbol and not uniform_labels:
+            final = self._panel_indicators.get(indicator_name).result()
+            final.name = indicator_name
+            return final
+
+        # result columns, as (indicator, slot, panel column, label)
+        entries = []
+        for name in self._panel_indicators.names:
+            if indicator_name is None or indicator_name == name:
+                indicator = self._panel_indicators.get(name)
+                for symbol_ in self._universe:
+                    if symbol is None or symbol_ == symbol:
+                        entries.append((indicator, "", symbol_, column_namer(name, symbol_)))
+        for symbol_, cache in self._item_caches():
             if symbol is None or symbol_ == symbol:
-                for indicator in cache.indicators():
-                    if indicator_name is None or indicator_name == indicator.name:
-                        result = indicator.result().copy()
-                        result.name = column_namer(indicator.name, cache.symbol())
-                        dataframes.append(result)
-        final = pd.concat(dataframes, axis=1) if dataframes else pd.DataFrame()
+                for name in cache._indicators.names:  # noqa
+                    if indicator_name is None or indicator_name == name:
+                        entries.append((cache.find_indicator(name), "", None,
+                                        column_namer(name, cache.symbol())))
+
+        if indicator_name and symbol and len(entries) == 1:
+            # for a fully specified result, we will return as a Series
+            indicator, slot, column, _ = entries[0]
+            final = indicator.result(slot)
+            final = final if column is None else final[column]
+            return final.rename(f"{symbol}:{indicator_name}")
+
+        # results are views onto the result store, where possible
+        final = _results_frame(self._store, entries)
 
         # add a name to the dataframe
         if indicator_name and not symbol:
@@ -214,9 +761,6 @@ class RootIndicatorCache(IndicatorContainer):
         elif not indicator_name and symbol:
             final.name = symbol
         else:
-            # for a fully specified result, we will return as a Series
-            if len(dataframes) == 1:
-                final = dataframes[0]
             final.name = f"{symbol}:{indicator_name}"
 
         return final
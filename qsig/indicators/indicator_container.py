@@ -1,8 +1,23 @@
 from abc import ABC, abstractmethod
 
+from qsig.util.precision import default_dtype
+
 
 class IndicatorContainer(ABC):
 
     @abstractmethod
     def find(self, input_: str, asset: str = None):
         pass
+
+    def has_source(self, name: str) -> bool:
+        """True if the container has data or an indicator named `name`"""
+        return False
+
+    def result_store(self):
+        """The ResultStore that indicators of this container write their
+        results into, None if results are held as separate series"""
+        return None
+
+    def result_dtype(self):
+        """Float dtype that indicator results are held in"""
+        return default_dtype()
@@ -1,22 +1,41 @@
+import importlib
+import logging
 import re
 
-from .base_indicators import BaseIndicator
+from qsig.util.time import format_time_period, parse_time_period
+from .base_indicators import BaseIndicator, IndicatorFamily
+from .expression import FUNCTIONS, compile_expression
 from .indicator_container import IndicatorContainer
 from .generic_indicator import GenericIndicator
 
-RE_PREFIX = re.compile(r'^([\w\s]*=\s*)(\w.*)$')
+RE_PREFIX = re.compile(r'^([\w\s]*=\s*)(\S.*)$')
 RE_FUNC1 = re.compile(r'^(\w+)\((.*)\)\[(.*?)\]$')
 RE_FUNC2 = re.compile(r'^(\w+)\((.*)\)$')
+RE_RANGE = re.compile(r'^(\w+)\.\.(\w+):(\w+)$')
+RE_SOURCE = re.compile(r'^[\w.]+$')
 
 
-def _parse_indicator_expression(expr: str):
+def _split_name(expr: str):
     expr = expr.strip()
-    name = None
-
     prefix_match = RE_PREFIX.match(expr)
     if prefix_match:
-        name = prefix_match[1].strip("= ")
-        expr = prefix_match[2]
+        return prefix_match[1].strip("= "), prefix_match[2]
+    return None, expr
+
+
+# True if an expression is a single indicator call, with data or indicator
+# names as sources, rather than an arithmetic expression (see expression.py)
+def _is_single_call(expr: str) -> bool:
+    _, expr = _split_name(expr)
+    matched = RE_FUNC1.match(expr) or RE_FUNC2.match(expr)
+    if matched is None or matched[1] in FUNCTIONS or any(x in matched[2] for x in "()[]"):
+        return False
+    sources = matched[3].split(",") if len(matched.groups()) == 3 else []
+    return all(RE_SOURCE.match(x.strip()) or not x.strip() for x in sources)
+
+
+def _parse_indicator_expression(expr: str):
+    name, expr = _split_name(expr)
 
     matched = RE_FUNC1.match(expr)
     if matched:
@@ -34,6 +53,26 @@ def _parse_indicator_expression(expr: str):
     raise Exception(f"not valid indicator expression: {expr}")
 
 
+# Expand the params of a family expression, such as EWMA(1m..60m:1m) or
+# SMA(5m,10m,30m), into the param of each member; None if the params are not
+# a family.  A range 'start..stop:step' includes stop, and its members are
+# written in the finest time unit of the range.
+def _expand_family_params(params: list):
+    if not params:
+        return None
+    params = [x.strip() for x in params]
+    if len(params) == 1:
+        matched = RE_RANGE.match(params[0])
+        if not matched:
+            return None
+        start, stop, step = [parse_time_period(x) for x in matched.groups()]
+        if step <= 0 or stop < start:
+            raise Exception(f"not valid indicator parameter range: {params[0]}")
+        unit = min(matched.groups(), key=lambda x: parse_time_period(f"1{x[-1]}"))[-1]
+        return [format_time_period(x, unit) for x in range(start, stop + 1, step)]
+    return params
+
+
 def _test_indicator_expressions():
 
     def _test(expr: str):
@@ -60,12 +99,20 @@ def _test_indicator_expressions():
 class IndicatorFactory:
     """Singleton factory that can create registered indicators"""
 
+    # Modules that register indicators when imported.  These are imported on
+    # the first lookup of an indicator type that is not yet registered, so
+    # that importing qsig.indicators stays cheap; optional backends whose
+    # dependencies are not installed are skipped.
+    BACKENDS = ["qsig.indicators.std_indicators"]
+    OPTIONAL_BACKENDS = {"qsig.indicators.talib_indicators": "talib"}
+
     _instance = None
     _initialised = False
 
     def __init__(self):
         if not self.__class__._initialised:
             self._ind_type_map = dict()
+            self._backends_loaded = False
             self.__class__._initialised = True
 
     def __new__(cls):
@@ -87,6 +134,28 @@ class IndicatorFactory:
         except ModuleNotFoundError:
             return False
 
+    def _load_backends(self):
+        self._backends_loaded = True
+        for module in self.BACKENDS:
+            importlib.import_module(module)
+        for module, dependency in self.OPTIONAL_BACKENDS.items():
+            try:
+                importlib.import_module(module)
+            except ModuleNotFoundError as e:
+                if e.name != dependency:
+                    raise
+                logging.debug(f"'{dependency}' cannot be imported, indicators of "
+                              f"'{module}' will not be available")
+
+    def _lookup(self, ind_type: str):
+        ind_class = self._ind_type_map.get(ind_type)
+        if ind_class is None and not self._backends_loaded:
+            self._load_backends()
+            ind_class = self._ind_type_map.get(ind_type)
+        if ind_class is None:
+            raise Exception(f"IndicatorFactory doesn't support indicator type '{ind_type}'")
+        return ind_class
+
     def register(self,
                  indicator_class: type,
                  indicator_details=None):
@@ -103,9 +172,7 @@ class IndicatorFactory:
     def create(self, cls: str, config: dict, container: IndicatorContainer):
         ind_type = cls or config["type"]
         assert isinstance(ind_type, str)
-        ind_class = self._ind_type_map.get(ind_type)
-        if ind_class is None:
-            raise Exception(f"IndicatorFactory doesn't support indicator type '{ind_type}'")
+        ind_class = self._lookup(ind_type)
 
         if issubclass(ind_class, BaseIndicator):
             ind_instance = ind_class.create(config, container)
@@ -116,16 +183,34 @@ class IndicatorFactory:
             return ind
 
 
+    def create_call(self, ind_type: str, params: list, sources: list,
+                    container: IndicatorContainer, name: str = None):
+        """Create an indicator from the parts of a single indicator call"""
+        ind_class = self._lookup(ind_type)
+        if issubclass(ind_class, BaseIndicator):
+            return ind_class.create(None, container, name, params, sources)
+        return GenericIndicator.create_from_inline(
+            container, name, ind_type, params, sources, ind_class)
+
     def create_from_expr(self, expr: str, container: IndicatorContainer):
-        """Create an indicator from an expression string, eg 'SMA(1m)'"""
+        """Create an indicator from an expression string, eg 'SMA(1m)'.  A
+        family expression, eg 'SMA(1m,5m)' or 'EWMA(1m..60m:1m)', creates an
+        IndicatorFamily of member indicators, named 'SMA(1m)', 'SMA(5m)' etc,
+        or 'NAME(1m)' etc if the expression is named.  An arithmetic
+        expression, eg 'SMA(5m)-SMA(30m)', creates a CompiledExpression."""
+        if not _is_single_call(expr):
+            name, expr = _split_name(expr)
+            return compile_expression(expr, container, self, name)
         name, ind_type, params, ind_src = _parse_indicator_expression(expr)
         assert isinstance(ind_type, str)
-        ind_class = self._ind_type_map.get(ind_type, None)
-        if ind_class is None:
-            raise Exception(f"IndicatorFactory doesn't support indicator type '{ind_type}'")
+        ind_class = self._lookup(ind_type)
         if issubclass(ind_class, BaseIndicator):
-            if ind_class is None:
-                raise Exception(f"IndicatorFactory doesn't support indicator type '{ind_type}'")
+            members = _expand_family_params(params) if ind_class.FAMILY else None
+            if members is not None:
+                return IndicatorFamily([
+                    ind_class.create(None, container, f"{name}({x})" if name else None,
+                                     [x], ind_src)
+                    for x in members])
             ind_instance = ind_class.create(None, container, name, params, ind_src)
             return ind_instance
         else:
@@ -137,4 +222,6 @@ class IndicatorFactory:
 
     def list(self):
         """Return list of available indicators"""
+        if not self._backends_loaded:
+            self._load_backends()
         return sorted(self._ind_type_map.keys())
@@ -0,0 +1,118 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List
+
+
+# Timings of one evaluation of an indicator dependency graph.  `busy_sec` is
+# the sum of the time spent computing each indicator, and `critical_path_sec`
+# the time of the longest chain of dependent indicators, which is the lower
+# bound of `wall_sec` for any number of workers.
+@dataclass
+class ComputeReport:
+    indicators: int = 0
+    workers: int = 0
+    wall_sec: float = 0.0
+    busy_sec: float = 0.0
+    critical_path_sec: float = 0.0
+    critical_path: List[Hashable] = field(default_factory=list)
+    durations: Dict[Hashable, float] = field(default_factory=dict)
+
+    def log(self):
+        logging.info(f"indicators computed: {self.indicators}, workers: {self.workers}")
+        logging.info(f"wall time: {self.wall_sec:.3f}s, busy time: {self.busy_sec:.3f}s")
+        logging.info(f"critical path: {self.critical_path_sec:.3f}s, "
+                     f"{' -> '.join(str(x) for x in self.critical_path)}")
+
+
+# Return the nodes of `graph` in dependency order, where `graph` maps each node
+# to the list of nodes it depends on.  Dependencies that are not nodes of the
+# graph are ignored.
+def topological_sort(graph: Dict[Hashable, List[Hashable]]) -> List[Hashable]:
+    pending = {node: set(x for x in deps if x in graph) for node, deps in graph.items()}
+    dependents = {node: [] for node in graph}
+    for node, deps in pending.items():
+        for dep in deps:
+            dependents[dep].append(node)
+
+    ready = [node for node, deps in pending.items() if not deps]
+    order = []
+    while ready:
+        node = ready.pop()
+        order.append(node)
+        for child in dependents[node]:
+            pending[child].discard(node)
+            if not pending[child]:
+                ready.append(child)
+
+    if len(order) != len(graph):
+        cycle = sorted(str(node) for node, deps in pending.items() if deps)
+        raise Exception(f"circular dependency detected between indicators {cycle}")
+    return order
+
+
+# Run `evaluate(node)` for every node of the dependency graph, starting each
+# node as soon as all of its dependencies have completed.  With more than one
+# worker, independent nodes are evaluated concurrently on a thread pool; this
+# gives a real speedup because the numpy/pandas kernels used by the indicators
+# release the GIL.
+def evaluate_graph(graph: Dict[Hashable, List[Hashable]],
+                   evaluate: Callable[[Hashable], None],
+                   max_workers: int = None) -> ComputeReport:
+    order = topological_sort(graph)
+    deps = {node: [x for x in graph[node] if x in graph] for node in order}
+    report = ComputeReport(indicators=len(order))
+
+    def _timed(node):
+        t0 = time.perf_counter()
+        evaluate(node)
+        return time.perf_counter() - t0
+
+    t_start = time.perf_counter()
+    if max_workers == 1 or len(order) <= 1:
+        report.workers = 1
+        for node in order:
+            report.durations[node] = _timed(node)
+    else:
+        remaining = {node: len(deps[node]) for node in order}
+        dependents = {node: [] for node in order}
+        for node in order:
+            for dep in deps[node]:
+                dependents[dep].append(node)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            report.workers = executor._max_workers  # noqa
+            running = {executor.submit(_timed, node): node
+                       for node in order if remaining[node] == 0}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    report.durations[node] = future.result()
+                    for child in dependents[node]:
+                        remaining[child] -= 1
+                        if remaining[child] == 0:
+                            running[executor.submit(_timed, child)] = child
+    report.wall_sec = time.perf_counter() - t_start
+    report.busy_sec = sum(report.durations.values())
+    set_critical_path(report, graph)
+    return report
+
+
+# Set the critical path of `report`, the longest chain of dependent nodes of
+# `graph` weighted by the node durations of the report
+def set_critical_path(report: ComputeReport, graph: Dict[Hashable, List[Hashable]]):
+    path_sec, previous = dict(), dict()
+    for node in topological_sort(graph):
+        longest = max((x for x in graph[node] if x in graph),
+                      key=lambda x: path_sec[x], default=None)
+        previous[node] = longest
+        path_sec[node] = report.durations[node] + (path_sec[longest] if longest is not None else 0.0)
+    report.critical_path = []
+    if path_sec:
+        node = max(path_sec, key=path_sec.get)
+        report.critical_path_sec = path_sec[node]
+        while node is not None:
+            report.critical_path.insert(0, node)
+            node = previous[node]
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+import qsig
+from qsig.util.datarepo import DataRepoError, Library
+from .base_indicators import BaseIndicator
+
+# Disk memoization of indicator results, in a DataRepo library.
+#
+# Each indicator result is stored under a key made from the item symbol and a
+# hash of the indicator's canonical expression, so there is a single stored
+# result per indicator per item.  The stored result is labelled with a digest
+# of the canonical expression, the qsig version and the digests of all the
+# indicator inputs, where the digest of a data input is a fingerprint of its
+# values and index.  A stored result is only used if its digest matches; when
+# an input or the qsig version changes, the result is recomputed and replaces
+# the stale one.
+
+
+def _hash(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, (bytes, memoryview)) else str(part).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def _array_bytes(values) -> memoryview:
+    values = np.asarray(values)
+    if values.dtype.kind not in "biufcmM":
+        values = pd.util.hash_array(values.ravel())
+    return memoryview(np.ascontiguousarray(values)).cast("B")
+
+
+def fingerprint(data) -> str:
+    """Fingerprint of the values and index of a Series or DataFrame"""
+    index = data.index
+    index_values = index.asi8 if isinstance(index, pd.DatetimeIndex) else index.to_numpy()
+    parts = [type(data).__name__, str(data.shape), _array_bytes(index_values)]
+    if isinstance(data, pd.DataFrame):
+        parts.append(",".join(str(x) for x in data.columns))
+    parts.append(_array_bytes(data.to_numpy()))
+    return _hash(*parts)
+
+
+def indicator_digest(canonical_expr: str, source_digests: list) -> str:
+    return _hash(qsig.__version__, canonical_expr, *source_digests)
+
+
+class IndicatorResultCache:
+    """Loads indicator results stored in a DataRepo library, computing and
+    storing those that are missing or stale"""
+
+    def __init__(self, library: Library):
+        self._library = library
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def library(self):
+        return self._library
+
+    @staticmethod
+    def slot_key(symbol: str, canonical_expr: str) -> str:
+        return f"{symbol}:{_hash(canonical_expr)}"
+
+    def _load(self, key: str, digest: str):
+        try:
+            meta = self._library.read_meta(key)
+        except DataRepoError:
+            return None
+        if meta.get("data_name") != digest:
+            logging.debug(f"stale indicator result '{key}'")
+            return None
+        return self._library.read(key)
+
+    def compute(self, indicator: BaseIndicator, symbol: str, canonical_expr: str,
+                digest: str, panel: bool = False):
+        """Set the results of `indicator` from the library if present under
+        `digest`, otherwise compute them and write them to the library.  Panel
+        indicators have a single DataFrame result, stored as is."""
+        key = self.slot_key(symbol, canonical_expr)
+        frame = self._load(key, digest)
+        if frame is not None:
+            if panel:
+                results = {"": frame}
+            else:
+                # columns are the result slots, prefixed with '.'
+                results = {col[1:]: frame[col] for col in frame.columns}
+            indicator.set_results(results)
+            with self._lock:
+                self.hits += 1
+            return
+
+        indicator.compute()
+        if panel:
+            frame = indicator.result().copy(deep=False)
+        else:
+            frame = pd.DataFrame({f".{slot}": indicator.result(slot)
+                                  for slot in indicator.result_slots()})
+        frame.name = digest
+        self._library.write(key, frame)
+        with self._lock:
+            self.misses += 1
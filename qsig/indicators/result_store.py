@@ -0,0 +1,164 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# Preallocated storage for indicator results.  Results are held in a single
+# 2-D float block, with one column per result (indicator, slot and, for panel
+# results, item) and one row per time in the store index, which indicators
+# write into directly.  Result series and frames are then built as views onto
+# the block, without copying, so that building the result frame of thousands
+# of indicator columns costs nothing.  Frames over columns that are evenly
+# spaced in the block, such as one indicator over all items, or all
+# indicators for one item, are zero-copy.
+#
+# Columns are contiguous in memory, which is the layout pandas uses itself
+# for 2-D blocks.  The block grows by doubling, both in columns as results are
+# allocated, and in rows as data is appended; series and frames returned
+# before a growth, or a discard of the first rows, remain valid, but no longer
+# see later writes.  Series and frames are read-only views, so that writing to
+# a result returned by a cache cannot change the stored result; copy them to
+# modify.
+class ResultStore:
+
+    MIN_CAPACITY = 16
+
+    def __init__(self, index: pd.Index = None, dtype=np.float64):
+        self._lock = threading.RLock()
+        self._dtype = np.dtype(dtype)
+        self._columns = dict()  # key -> column number
+        self._index = None
+        self._rows = 0
+        self._block = np.empty((0, 0), dtype=self._dtype)  # columns x rows
+        if index is not None:
+            self.set_index(index)
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def set_index(self, index: pd.Index):
+        """Set the time index of the store, discarding all stored values"""
+        with self._lock:
+            self._index = index
+            self._rows = len(index)
+            self._block = np.full((self._block.shape[0], self._rows), np.nan, dtype=self._dtype)
+            self._reserve(len(self._columns), self._rows)
+
+    def extend_index(self, index: pd.Index):
+        """Append rows to the store, for times after the current index"""
+        with self._lock:
+            self._reserve(len(self._columns), self._rows + len(index))
+            self._index = self._index.append(index)
+            self._rows += len(index)
+
+    def discard(self, rows: int):
+        """Drop the first `rows` rows of the store, for example to bound the
+        memory of a store that rows are appended to indefinitely"""
+        with self._lock:
+            rows = min(rows, self._rows)
+            block = np.full(self._block.shape, np.nan, dtype=self._dtype)
+            block[:, :self._rows - rows] = self._block[:, rows:self._rows]
+            self._block = block
+            self._index = self._index[rows:]
+            self._rows -= rows
+
+    def _reserve(self, columns: int, rows: int):
+        capacity_columns, capacity_rows = self._block.shape
+        if columns <= capacity_columns and rows <= capacity_rows:
+            return
+        if columns > capacity_columns:
+            capacity_columns = max(self.MIN_CAPACITY, columns, 2 * capacity_columns)
+        if rows > capacity_rows:
+            capacity_rows = max(rows, 2 * capacity_rows if capacity_rows else 0)
+        block = np.full((capacity_columns, capacity_rows), np.nan, dtype=self._dtype)
+        old_columns, old_rows = self._block.shape
+        block[:old_columns, :old_rows] = self._block
+        self._block = block
+
+    def allocate(self, key) -> int:
+        """Return the column of `key`, allocating a new one if required"""
+        with self._lock:
+            column = self._columns.get(key)
+            if column is None:
+                column = len(self._columns)
+                self._reserve(column + 1, self._rows)
+                self._columns[key] = column
+            return column
+
+    def accepts(self, data) -> bool:
+        """True if `data` can be held in the store"""
+        if self._index is None or not isinstance(data, (pd.Series, pd.DataFrame)):
+            return False
+        if isinstance(data, pd.DataFrame):
+            if not all(x.kind == "f" for x in data.dtypes):
+                return False
+        elif data.dtype.kind != "f":
+            return False
+        return len(data) == self._rows and (data.index is self._index or
+                                            data.index.equals(self._index))
+
+    def write(self, key, values, start: int = 0):
+        """Write the values of a result column, from row `start`"""
+        values = np.asarray(values)
+        with self._lock:
+            column = self.allocate(key)
+            self._block[column, start:start + len(values)] = values
+
+    def write_frame(self, keys: list, values, start: int = 0):
+        """Write the 2-D (rows x keys) values of several result columns"""
+        values = np.asarray(values)
+        with self._lock:
+            columns = [self.allocate(key) for key in keys]
+            selection = self._selection(columns)
+            if isinstance(selection, slice):
+                self._block[selection, start:start + len(values)] = values.T
+            else:
+                for i, column in enumerate(columns):
+                    self._block[column, start:start + len(values)] = values[:, i]
+
+    def column(self, key) -> np.ndarray:
+        """Writable view onto the stored values of a result column"""
+        return self._block[self._columns[key], :self._rows]
+
+    @staticmethod
+    def _read_only(values: np.ndarray) -> np.ndarray:
+        values = values.view()
+        values.flags.writeable = False
+        return values
+
+    def series(self, key, name=None) -> pd.Series:
+        """Read-only series view onto a result column"""
+        return pd.Series(self._read_only(self.column(key)), index=self._index, name=name,
+                         copy=False)
+
+    @staticmethod
+    def _selection(columns: list):
+        # a slice, if the columns are evenly spaced, otherwise the list
+        if len(columns) == 1:
+            return slice(columns[0], columns[0] + 1)
+        step = columns[1] - columns[0]
+        if step > 0 and all(b - a == step for a, b in zip(columns, columns[1:])):
+            return slice(columns[0], columns[-1] + 1, step)
+        return columns
+
+    def frame(self, keys: list, labels: list) -> pd.DataFrame:
+        """Read-only DataFrame of result columns, zero-copy if the columns are
+        evenly spaced in the block"""
+        if not keys:
+            return pd.DataFrame(index=self._index, columns=labels, dtype=self._dtype)
+        selection = self._selection([self._columns[key] for key in keys])
+        values = self._read_only(self._block[selection, :self._rows].T)
+        return pd.DataFrame(values, index=self._index, columns=labels, copy=False)
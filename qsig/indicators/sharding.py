@@ -0,0 +1,262 @@
+import gc
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .indicator_graph import ComputeReport, evaluate_graph, set_critical_path, topological_sort
+
+# Sharded, multi-process evaluation of a RootIndicatorCache.
+#
+# The pure-Python parts of indicator evaluation hold the GIL, so threads only
+# overlap the numpy and pandas kernels.  In sharded mode the universe is split
+# into contiguous shards of items, and each shard is computed by a worker
+# process that rebuilds the root cache for its items, from the same data and
+# indicator expressions.  The data sets are placed in shared memory, as one
+# (items x rows) block each, onto which the workers build their data frames
+# without copying.  Workers write results into a shared output block, with a
+# column per indicator and item, from which the parent sets the results of its
+# own indicators; results the result store would not hold, such as non-float
+# results, are returned pickled instead.  Panel indicators are computed by
+# every worker, for the items of its shard.  Results are the same as those
+# computed in a single process.
+#
+# Workers create indicators from the IndicatorFactory.  With the 'fork' start
+# method, the default on Linux, they inherit all the indicator types of the
+# parent; with 'spawn', only those registered by the indicator backends.  The
+# result cache is not used in sharded mode.
+
+
+# A 2-D array in shared memory, which processes attach to by name
+@dataclass
+class _SharedArray:
+    name: str
+    shape: tuple
+    dtype: str
+
+    @classmethod
+    def create(cls, shape: tuple, dtype, memory: list):
+        """Create a shared array, adding its shared memory to `memory`"""
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        memory.append(shm)
+        return cls(shm.name, tuple(shape), dtype.str)
+
+    def attach(self, memory: list) -> np.ndarray:
+        """The shared array, adding its shared memory to `memory`, which must
+        not be closed while the array is in use"""
+        shm = shared_memory.SharedMemory(name=self.name)
+        memory.append(shm)
+        return np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+
+
+# A data set of the root cache, for one shard: rows [start, stop) of the
+# shared block, which are the data columns of the shard's items
+@dataclass
+class _ShardData:
+    label: str
+    block: _SharedArray
+    start: int
+    stop: int
+    columns: list
+    index: pd.Index
+
+
+@dataclass
+class _ShardTask:
+    panel: bool
+    dtype: str
+    expressions: list
+    symbols: list
+    data: list
+    output: _SharedArray
+    # output column of each (IndicatorPath, item) computed by the shard, where
+    # the item is None for the result of an item indicator
+    columns: dict
+    paths: list
+    max_workers: int
+
+
+@dataclass
+class _ShardResult:
+    # map of IndicatorPath to its result slots, each None if written to the
+    # output block, otherwise the result itself
+    results: dict = field(default_factory=dict)
+    durations: dict = field(default_factory=dict)
+    profiles: dict = field(default_factory=dict)
+
+
+def _compute_shard(task: _ShardTask) -> _ShardResult:
+    memory = []
+    try:
+        return _run_shard(task, memory)
+    finally:
+        gc.collect()  # drop the frames built onto shared memory, before closing
+        for shm in memory:
+            shm.close()
+
+
+def _run_shard(task: _ShardTask, memory: list) -> _ShardResult:
+    from .indicator_cache import RootIndicatorCache
+
+    root = RootIndicatorCache(panel=task.panel, dtype=task.dtype)
+    for data in task.data:
+        block = data.block.attach(memory)
+        block.flags.writeable = False
+        frame = pd.DataFrame(block[data.start:data.stop].T, index=data.index,
+                             columns=data.columns, copy=False)
+        root.add_data(frame, data.label)
+    root.set_universe(task.symbols)
+    for expr in task.expressions:
+        root.add_indicator(expr)
+
+    requested = set(task.paths)
+    graph = {path: deps for path, deps in root._compute_graph().items()  # noqa
+             if path in requested}
+    report = evaluate_graph(graph, root._evaluate_path, task.max_workers)  # noqa
+
+    output = task.output.attach(memory)
+    store = root.result_store()
+    shard = _ShardResult(durations=report.durations)
+    for path in task.paths:
+        indicator = root._indicator_at(path)  # noqa
+        slots = dict()
+        for slot in indicator.result_slots():
+            result = indicator.result(slot)
+            if slot == "" and store.accepts(result):
+                if path.symbol == root.PANEL_SYMBOL:
+                    for symbol in task.symbols:
+                        output[task.columns[(path, symbol)]] = result[symbol].to_numpy()
+                else:
+                    output[task.columns[(path, None)]] = result.to_numpy()
+                slots[slot] = None
+            else:
+                slots[slot] = result.copy()
+        shard.results[path] = slots
+        shard.profiles[path] = (indicator.profile.wall_sec, indicator.profile.cpu_sec)
+    return shard
+
+
+# Split `symbols` into at most `count` contiguous shards of similar size
+def _split(symbols: list, count: int) -> list:
+    bounds = np.linspace(0, len(symbols), min(count, len(symbols)) + 1).round().astype(int)
+    return [symbols[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+# Copy the data sets of the root into shared blocks, with their columns in
+# universe order; returns (label, block, columns, index) for each
+def _share_data(root, memory: list) -> list:
+    shared = []
+    for label, frame in root._data.items():  # noqa
+        columns = [x for x in root.universe() if x in frame.columns]
+        values = frame[columns]
+        if not all(x.kind in "biuf" for x in values.dtypes):
+            raise Exception(f"sharded compute needs numeric data, not so for '{label}'")
+        dtype = np.result_type(*values.dtypes) if columns else root.result_dtype()
+        block = _SharedArray.create((len(columns), len(frame)), dtype, memory)
+        array = block.attach(memory)
+        for i, column in enumerate(columns):
+            array[i] = values[column].to_numpy()
+        shared.append((label, block, columns, frame.index))
+    return shared
+
+
+# Set the results of the root's indicators at `order`, from the results of
+# the shards and the output block
+def _set_results(root, order: list, shards: list, results: list,
+                 output: np.ndarray, columns: dict, report: ComputeReport):
+    store = root.result_store()
+    for path in order:
+        indicator = root._indicator_at(path)  # noqa
+        shard_results = [x for x in results if path in x.results]
+        slots = dict()
+        for slot in shard_results[0].results[path]:
+            if path.symbol == root.PANEL_SYMBOL:
+                pieces = []
+                for symbols, shard in zip(shards, results):
+                    piece = shard.results[path][slot]
+                    if piece is None:
+                        first = columns[(path, symbols[0])]
+                        piece = pd.DataFrame(output[first:first + len(symbols)].T,
+                                             index=store.index, columns=symbols, copy=False)
+                    pieces.append(piece)
+                result = pd.concat(pieces, axis=1) if len(pieces) > 1 else pieces[0]
+            else:
+                result = shard_results[0].results[path][slot]
+                if result is None:
+                    result = pd.Series(output[columns[(path, None)]], index=store.index,
+                                       copy=False)
+            if not store.accepts(result):
+                result = result.copy()  # not copied into the store
+            slots[slot] = result
+        indicator.set_results(slots)
+        indicator.profile.record(sum(x.profiles[path][0] for x in shard_results),
+                                 sum(x.profiles[path][1] for x in shard_results),
+                                 indicator.result_rows(), indicator.result_bytes())
+        report.durations[path] = sum(x.durations.get(path, 0.0) for x in shard_results)
+
+
+def compute_sharded(root, graph: dict, processes: int, max_workers: int = None) -> ComputeReport:
+    """Compute the indicators of `graph`, the dependency graph of a
+    RootIndicatorCache's indicators not yet computed, over `processes` shards
+    of its universe, each on up to `max_workers` threads"""
+    t_start = time.perf_counter()
+    shards = _split(root.universe(), processes)
+    order = topological_sort(graph)
+    memory = []
+    try:
+        data = _share_data(root, memory)
+
+        # output columns, those of a panel indicator contiguous in universe order
+        keys = []
+        for path in order:
+            if path.symbol == root.PANEL_SYMBOL:
+                keys.extend((path, x) for x in root.universe())
+            else:
+                keys.append((path, None))
+        columns = {key: i for i, key in enumerate(keys)}
+        output = _SharedArray.create((len(keys), root.result_store().rows),
+                                     root.result_dtype(), memory)
+
+        tasks = []
+        shards = [x for x in shards if any(path.symbol == root.PANEL_SYMBOL or
+                                           path.symbol in x for path in order)]
+        for symbols in shards:
+            members = set(symbols)
+            paths = [x for x in order if x.symbol == root.PANEL_SYMBOL or x.symbol in members]
+            shard_data = []
+            for label, block, data_columns, index in data:
+                present = [x for x in data_columns if x in members]
+                start = data_columns.index(present[0]) if present else 0
+                shard_data.append(_ShardData(label, block, start, start + len(present),
+                                             present, index))
+            tasks.append(_ShardTask(
+                panel=root._panel, dtype=root.result_dtype().str,  # noqa
+                expressions=list(root._expressions), symbols=symbols,  # noqa
+                data=shard_data, output=output,
+                columns={key: columns[key] for key in keys
+                         if key[1] in members or key[0].symbol in members},
+                paths=paths, max_workers=max_workers))
+
+        with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+            results = list(executor.map(_compute_shard, tasks))
+
+        report = ComputeReport(indicators=len(order), workers=len(tasks))
+        _set_results(root, order, shards, results, output.attach(memory), columns, report)
+    finally:
+        gc.collect()
+        unlinked = set()
+        for shm in memory:
+            shm.close()
+            if shm.name not in unlinked:
+                unlinked.add(shm.name)
+                shm.unlink()
+
+    report.wall_sec = time.perf_counter() - t_start
+    report.busy_sec = sum(report.durations.values())
+    set_critical_path(report, graph)
+    return report
@@ -1,16 +1,44 @@
+import math
+from abc import abstractmethod
 from typing import Union
 
-from .base_indicators import UnaryIndicator
+import numpy as np
+import pandas as pd
+
+from .base_indicators import RollingIndicator
 from .indicator_factory import IndicatorContainer, IndicatorFactory
 import qsig
 from qsig.util.time import parse_time_period
-from qsig.util.signal import calc_density, calc_fwd_returns, data_interval
+from qsig.util.signal import (calc_density, calc_fwd_returns, change_family,
+                              rolling_extreme, rolling_median, rolling_quantile,
+                              rolling_rank, rolling_sum_family)
+
+
+# Input values of a family kernel, as a (rows x columns) array
+def _family_input(data) -> np.ndarray:
+    return data.to_numpy().reshape(len(data), -1)
+
+
+# Results of a family kernel, from its (members x rows x columns) values,
+# shaped as the input data
+def _family_results(data, values) -> list:
+    if isinstance(data, pd.DataFrame):
+        return [pd.DataFrame(x, index=data.index, columns=data.columns, copy=False)
+                for x in values]
+    return [pd.Series(x[:, 0], index=data.index, copy=False) for x in values]
+
 
+# Result of a kernel over (rows x columns) values, shaped as the input data
+def _kernel_result(data, kernel, *args):
+    return _family_results(data, [kernel(_family_input(data), *args)])[0]
 
-class SMA(UnaryIndicator):
+
+class SMA(RollingIndicator):
     """Simple moving average"""
 
     CODE = "SMA"
+    PANEL = True
+    FAMILY = True
 
     def __init__(self, owner, window: Union[int, str], input_col: str, name: str = None):
         params = [window]
@@ -18,13 +46,21 @@ class SMA(UnaryIndicator):
         self.window_sec = qsig.util.time.parse_time_period(window)
 
 
-    def _compute(self):
-        data = self._owner.find(self.source)
-        periods = int(self.window_sec / data_interval(data))
-        assert (periods * data_interval(data)) == self.window_sec
-        result = data.rolling(periods).mean()
-        self._store_result(result)
+    def lookback(self) -> int:
+        return self._window_rows(self.window_sec) - 1
+
+    def _calc(self, data):
+        return data.rolling(self._window_rows(self.window_sec)).mean()
+
+    @classmethod
+    def _calc_family(cls, data, members: list) -> list:
+        windows = np.array([x._window_rows(x.window_sec) for x in members])
+        sums = rolling_sum_family(_family_input(data), windows)
+        return _family_results(data, sums / windows[:, None, None])
+
 
+    def canonical_params(self):
+        return (self.window_sec,)
 
     @classmethod
     def create(cls, args: dict, owner: IndicatorContainer,
@@ -44,8 +80,10 @@ class SMA(UnaryIndicator):
 IndicatorFactory.instance().register(SMA)
 
 
-class DEN(UnaryIndicator):
+class DEN(RollingIndicator):
     CODE = "DEN"
+    PANEL = True
+    FAMILY = True
 
     def __init__(self, owner, window: Union[int, str], input_col: str, name: str = None):
         params = [window]
@@ -53,13 +91,24 @@ class DEN(UnaryIndicator):
         self.window_sec = qsig.util.time.parse_time_period(window)
 
 
-    def _compute(self):
-        data = self._owner.find(self.source)
-        result = calc_density(data=data,
-                              data_period_sec=data_interval(data),
-                              study_period_sec=self.window_sec)
-        self._store_result(result)
+    def lookback(self) -> int:
+        return self._window_rows(self.window_sec) - 1
 
+    def _calc(self, data):
+        return calc_density(data=data,
+                            data_period_sec=self._interval,
+                            study_period_sec=self.window_sec)
+
+    @classmethod
+    def _calc_family(cls, data, members: list) -> list:
+        windows = np.array([x._window_rows(x.window_sec) for x in members])
+        seconds = np.array([x.window_sec for x in members], dtype=np.float64)
+        sums = rolling_sum_family(_family_input(data), windows)
+        return _family_results(data, sums / seconds[:, None, None])
+
+
+    def canonical_params(self):
+        return (self.window_sec,)
 
     @classmethod
     def create(cls, args: dict, owner: IndicatorContainer,
@@ -78,22 +127,31 @@ class DEN(UnaryIndicator):
 IndicatorFactory.instance().register(DEN)
 
 
-class RET(UnaryIndicator):
+class RET(RollingIndicator):
     """Return"""
 
     CODE = "RET"
+    PANEL = True
+    FAMILY = True
 
     def __init__(self, owner, window: Union[int, str], input_col: str = None, name: str = None):
         params = [window]
         super().__init__(self.CODE, owner, params, input_col, name=name)
         self.window_sec = qsig.util.time.parse_time_period(window)
 
-    def _compute(self):
-        data = self._owner.find(self.source)
-        periods = int(self.window_sec / data_interval(data))
-        assert (periods * data_interval(data)) == self.window_sec
-        result = data.pct_change(periods=periods, fill_method=None)
-        self._store_result(result)
+    def lookback(self) -> int:
+        return self._window_rows(self.window_sec)
+
+    def _calc(self, data):
+        return data.pct_change(periods=self._window_rows(self.window_sec), fill_method=None)
+
+    @classmethod
+    def _calc_family(cls, data, members: list) -> list:
+        lags = [x._window_rows(x.window_sec) for x in members]
+        return _family_results(data, change_family(_family_input(data), lags))
+
+    def canonical_params(self):
+        return (self.window_sec,)
 
     @classmethod
     def create(cls, args: dict, owner: IndicatorContainer,
@@ -115,22 +173,32 @@ IndicatorFactory.instance().register(RET)
 
 # Note: use this only for plotting!  Don't include it in any signal formula
 # because it is obviously forward-looking.
-class FWD(UnaryIndicator):
+class FWD(RollingIndicator):
     """Forward-looking return"""
 
     CODE = "FWD"
+    PANEL = True
+    FAMILY = True
+    FORWARD_LOOKING = True
 
     def __init__(self, owner, window: Union[int, str], input_col: str = None, name=None):
         params = [window]
         super().__init__(self.CODE, owner, params, input_col, name=name)
         self.window_sec = qsig.util.time.parse_time_period(window)
 
-    def _compute(self):
-        data = self._owner.find(self.source)
-        result = calc_fwd_returns(data,
-                                  data_interval(data),
-                                  self.window_sec)
-        self._store_result(result)
+    def lookback(self) -> int:
+        return self._window_rows(self.window_sec)
+
+    def _calc(self, data):
+        return calc_fwd_returns(data, self._interval, self.window_sec)
+
+    @classmethod
+    def _calc_family(cls, data, members: list) -> list:
+        lags = [-x._window_rows(x.window_sec) for x in members]
+        return _family_results(data, change_family(_family_input(data), lags))
+
+    def canonical_params(self):
+        return (self.window_sec,)
 
     @classmethod
     def create(cls,
@@ -152,10 +220,12 @@ class FWD(UnaryIndicator):
 IndicatorFactory.instance().register(FWD)
 
 
-class EWMA(UnaryIndicator):
+class EWMA(RollingIndicator):
     """Exponentially weighted moving average"""
 
     CODE = "EWMA"
+    PANEL = True
+    FAMILY = True
 
     def __init__(self, owner, halflife: Union[int, float, str], input_col: str = None,
                  name: str = None):
@@ -163,11 +233,49 @@ class EWMA(UnaryIndicator):
         super().__init__(self.CODE, owner, params, input_col, name)
         self.halflife = qsig.util.time.parse_time_period(halflife)
 
-    def _compute(self):
-        data = self._owner.find(self.source)
-        halflife = self.halflife/data_interval(data)
-        result = data.ewm(halflife=halflife, adjust=False).mean()
-        self._store_result(result)
+    # The recursion is sequential in time, so a family is computed with the
+    # pandas ewm for each halflife, sharing a single read of the input.
+    def _calc(self, data):
+        halflife = self.halflife/self._interval
+        return data.ewm(halflife=halflife, adjust=False).mean()
+
+    # The EWMA state is its last value, and the number of missing inputs since
+    # the last observation, which have decayed the weight of that last value.
+    def _save_state(self, data, result):
+        self._last = result.iloc[-1]
+        self._trailing_nans = data.notna().iloc[::-1].cumsum().eq(0).sum()
+
+    # Build the input rows that, placed before new input rows, bring the
+    # pandas ewm recursion to the saved state: the last value, followed by as
+    # many missing values as there were after the last observation.  The count
+    # of missing values is capped where the weight of the last value has
+    # decayed to nothing.
+    def _state_prefix(self, new):
+        alpha = 1.0 - math.exp(-math.log(2) * self._interval / self.halflife)
+        cap = math.ceil(math.log(alpha * 1e-17) / math.log(1.0 - alpha)) if alpha < 1 else 0
+        trailing = np.minimum(np.atleast_1d(self._trailing_nans), cap)
+        rows = int(trailing.max()) + 1
+        values = np.full((rows, len(trailing)), np.nan)
+        values[rows - 1 - trailing, np.arange(len(trailing))] = np.atleast_1d(self._last)
+        index = new.index[[0] * rows]
+        if isinstance(new, pd.DataFrame):
+            return pd.DataFrame(values, index=index, columns=new.columns)
+        return pd.Series(values[:, 0], index=index, name=new.name)
+
+    def update(self, rows: int):
+        if not self._has_state():
+            return super().update(rows)
+        new = self._owner.find_appended(self.source)
+        if new is None:
+            return super().update(rows)
+        prefix = self._state_prefix(new)
+        data = pd.concat([prefix, new])
+        result = self._calc(data).iloc[len(prefix):]
+        self._extend_result(result)
+        self._save_state(data, result)
+
+    def canonical_params(self):
+        return (self.halflife,)
 
     @classmethod
     def create(cls,
@@ -186,3 +294,132 @@ class EWMA(UnaryIndicator):
 
 
 IndicatorFactory.instance().register(EWMA)
+
+
+# Base of indicators of a statistic over a rolling window of the input, whose
+# single parameter is the window, given as a time period as for SMA.  Windows
+# that are incomplete or have a missing value, NaN or infinite as for pandas,
+# give NaN.
+class _WindowStatistic(RollingIndicator):
+
+    PANEL = True
+    FAMILY = True
+
+    def __init__(self, owner, window: Union[int, str], input_col: str = None,
+                 name: str = None, params: list = None):
+        super().__init__(self.CODE, owner, params or [window], input_col, name=name)
+        self.window_sec = qsig.util.time.parse_time_period(window)
+
+    def lookback(self) -> int:
+        return self._window_rows(self.window_sec) - 1
+
+    def _calc(self, data):
+        return _kernel_result(data, self._kernel, self._window_rows(self.window_sec))
+
+    @abstractmethod
+    def _kernel(self, values, window: int):
+        """Calculate the statistic over (rows x columns) values"""
+        pass
+
+    def canonical_params(self):
+        return (self.window_sec,)
+
+    @classmethod
+    def create(cls, args: dict, owner: IndicatorContainer,
+               name=None, params=None, sources=None):
+        if args is not None:
+            window = args["window"]
+            source = args.get("source")
+            name = args.get("name")
+        else:
+            assert len(params) == 1
+            window = params[0]
+            source = cls._single_source(sources)
+        return cls(owner, window, source, name=name)
+
+
+class MIN(_WindowStatistic):
+    """Rolling minimum, in time independent of the window"""
+
+    CODE = "MIN"
+
+    def _kernel(self, values, window: int):
+        return rolling_extreme(values, window, maximum=False)
+
+
+IndicatorFactory.instance().register(MIN)
+
+
+class MAX(_WindowStatistic):
+    """Rolling maximum, in time independent of the window"""
+
+    CODE = "MAX"
+
+    def _kernel(self, values, window: int):
+        return rolling_extreme(values, window, maximum=True)
+
+
+IndicatorFactory.instance().register(MAX)
+
+
+class MEDIAN(_WindowStatistic):
+    """Rolling median"""
+
+    CODE = "MEDIAN"
+
+    def _kernel(self, values, window: int):
+        return rolling_median(values, window)
+
+
+IndicatorFactory.instance().register(MEDIAN)
+
+
+class RANK(_WindowStatistic):
+    """Percentile rank, in (0, 1], of the current value within its rolling
+    window; tied values take their average rank"""
+
+    CODE = "RANK"
+
+    def _kernel(self, values, window: int):
+        return rolling_rank(values, window)
+
+
+IndicatorFactory.instance().register(RANK)
+
+
+class QUANTILE(_WindowStatistic):
+    """Rolling quantile, linearly interpolated, eg QUANTILE(1h,0.9)[close]"""
+
+    CODE = "QUANTILE"
+    FAMILY = False
+
+    def __init__(self, owner, window: Union[int, str], quantile: Union[float, str],
+                 input_col: str = None, name: str = None):
+        super().__init__(owner, window, input_col, name=name,
+                         params=[str(window), str(quantile)])
+        self.quantile = float(quantile)
+        if not 0 <= self.quantile <= 1:
+            raise Exception(f"quantile must be between 0 and 1, not '{quantile}'")
+
+    def _kernel(self, values, window: int):
+        return rolling_quantile(values, window, self.quantile)
+
+    def canonical_params(self):
+        return (self.window_sec, self.quantile)
+
+    @classmethod
+    def create(cls, args: dict, owner: IndicatorContainer,
+               name=None, params=None, sources=None):
+        if args is not None:
+            window = args["window"]
+            quantile = args["quantile"]
+            source = args.get("source")
+            name = args.get("name")
+        else:
+            assert len(params) == 2
+            window, quantile = params
+            source = cls._single_source(sources)
+        return cls(owner, window, quantile, source, name=name)
+
+
+IndicatorFactory.instance().register(QUANTILE)
@@ -8,6 +8,8 @@ import pathlib
 import shutil
 import time
 
+from qsig.util.precision import cast_floats, resolve_dtype
+
 
 class DataRepoError(Exception):
 
@@ -38,8 +40,12 @@ class DataRepoError(Exception):
 class DataRepo:
 
     def __init__(self,
-                 storage_path):
+                 storage_path,
+                 float_dtype=None):
+        # float columns of items written are cast to `float_dtype`, if given,
+        # for example np.float32 to halve the size of feature datasets
         self._path = pathlib.Path(storage_path)
+        self._float_dtype = None if float_dtype is None else resolve_dtype(float_dtype)
         os.makedirs(self._path, exist_ok=True)
 
     def __str__(self):
@@ -141,7 +147,31 @@ class DataRepo:
         os.unlink(meta_path)
         os.unlink(data_filename)
 
-    def _write_item(self, library: str, key: str, data):
+    def _read_item_chunks(self, library: str, key: str, rows: int):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._validate_names(library, key)
+        meta_data = self._load_item_meta(library, key)
+        if meta_data["type"] != "dataframe":
+            raise DataRepoError("item is not a dataframe, cannot read in chunks",
+                                key=key, library=library)
+        data_file = pq.ParquetFile(self._path / library / meta_data["filename"])
+        data_name = meta_data.get("data_name")
+        for batch in data_file.iter_batches(batch_size=rows):
+            data = pa.Table.from_batches([batch]).to_pandas()
+            if data_name is not None:
+                data.name = data_name
+            yield data
+
+    def _cast_item(self, data, float_dtype=None):
+        if float_dtype is None:
+            float_dtype = self._float_dtype
+        if float_dtype is not None and isinstance(data, pd.DataFrame):
+            data = cast_floats(data, resolve_dtype(float_dtype))
+        return data
+
+    def _write_item(self, library: str, key: str, data, float_dtype=None):
         # try to get the data name - can be present on dataframes
         data_name = None
         try:
@@ -149,37 +179,36 @@ class DataRepo:
         except Exception as _:
             pass
 
+        data = self._cast_item(data, float_dtype)
         self._validate_names(library, key)
-        meta_filename = self._build_meta_path(library, key)
-        full_path = self._path / library
-
-        # create the new meta
-        if isinstance(data, pd.DataFrame):
-            data_filename = self._build_path(library, key, ".data.parq")
-            data_filename_tmp = self._build_path(library, key, ".temp.parq")
-            meta = {
-                "type": "dataframe",
-                "update_time": time.time(),  # noqa
-                "filename": data_filename.name,
-                "user": getpass.getuser(),
-                "key": key
-            }
-            if data_name is not None:
-                meta["data_name"] = data_name
-        else:
+        if not isinstance(data, pd.DataFrame):
             raise DataRepoError("data type not supported")
 
         # write the new item to a temporary location
-        meta_filename_tmp = self._build_path(library, key, ".temp.json")
+        data_filename_tmp = self._build_path(library, key, ".temp.parq")
+        os.makedirs(self._path / library, exist_ok=True)
+        data.to_parquet(data_filename_tmp)
+        self._commit_item(library, key, data_filename_tmp, data_name)
 
-        # create the library directory, if not exists
-        os.makedirs(full_path, exist_ok=True)
+    def _commit_item(self, library: str, key: str, data_filename_tmp, data_name=None):
+        # replace the item with the data written to `data_filename_tmp`
+        meta_filename = self._build_meta_path(library, key)
+        full_path = self._path / library
+        data_filename = self._build_path(library, key, ".data.parq")
+        meta = {
+            "type": "dataframe",
+            "update_time": time.time(),  # noqa
+            "filename": data_filename.name,
+            "user": getpass.getuser(),
+            "key": key
+        }
+        if data_name is not None:
+            meta["data_name"] = data_name
 
+        meta_filename_tmp = self._build_path(library, key, ".temp.json")
         with open(meta_filename_tmp, 'w', encoding='utf-8') as f:
             json.dump(meta, f, ensure_ascii=False, indent=4)
 
-        data.to_parquet(data_filename_tmp)
-
         if os.path.isfile(meta_filename):
             existing_meta = self._load_item_meta(library, key)
             existing_filename = full_path / existing_meta["filename"]
@@ -191,6 +220,64 @@ class DataRepo:
         os.rename(meta_filename_tmp, meta_filename)
 
 
+# Writes a dataframe item as a sequence of row chunks, such as the results of
+# a computation over a history larger than memory, without holding the whole
+# item in memory.  Chunks must have the same columns and dtypes.  The item is
+# replaced, as by Library.write, when the writer is closed; a writer left by
+# an exception leaves the existing item as it was.
+class ItemWriter:
+
+    def __init__(self, repo: DataRepo, library: str, key: str, float_dtype=None):
+        repo._validate_names(library, key)  # noqa
+        self._repo = repo
+        self._library = library
+        self._key = key
+        self._float_dtype = float_dtype
+        self._filename = repo._build_path(library, key, ".temp.parq")  # noqa
+        self._writer = None
+        self._data_name = None
+        self.rows = 0
+
+    def append(self, data: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._data_name is None:
+            self._data_name = getattr(data, "name", None)
+        table = pa.Table.from_pandas(self._repo._cast_item(data, self._float_dtype))  # noqa
+        if self._writer is None:
+            os.makedirs(self._filename.parent, exist_ok=True)
+            self._writer = pq.ParquetWriter(self._filename, table.schema)
+        self._writer.write_table(table)
+        self.rows += len(data)
+
+    def close(self):
+        """Replace the item with the chunks written"""
+        if self._writer is None:
+            os.makedirs(self._filename.parent, exist_ok=True)
+            pd.DataFrame().to_parquet(self._filename)
+        else:
+            self._writer.close()
+        self._repo._commit_item(self._library, self._key, self._filename,  # noqa
+                                self._data_name)
+
+    def abort(self):
+        """Discard the chunks written"""
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.isfile(self._filename):
+            os.unlink(self._filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
 class Library:
 
     def __init__(self, repo: DataRepo, name: str):
@@ -211,8 +298,19 @@ class Library:
     def read(self, key):
         return self._repo._read_item(self._name, key)  # noqa
 
-    def write(self, key, data):
-        return self._repo._write_item(self._name, key, data)  # noqa
+    def read_meta(self, key) -> dict:
+        return self._repo._load_item_meta(self._name, key)  # noqa
+
+    def read_chunks(self, key, rows: int):
+        """Iterate over the item in chunks of up to `rows` rows"""
+        return self._repo._read_item_chunks(self._name, key, rows)  # noqa
+
+    def write(self, key, data, float_dtype=None):
+        return self._repo._write_item(self._name, key, data, float_dtype)  # noqa
+
+    def writer(self, key, float_dtype=None) -> ItemWriter:
+        """ItemWriter that replaces the item with the chunks appended to it"""
+        return ItemWriter(self._repo, self._name, key, float_dtype)
 
     def delete(self, key: str):
         return self._repo._delete_item(self._name, key)  # noqa
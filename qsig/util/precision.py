@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Floating point precision policy.
+#
+# By default, data and indicator results are float64.  Setting the default
+# dtype to float32 (or passing dtype=np.float32 to an indicator container)
+# keeps indicator inputs and results in float32, which halves their memory
+# and the memory bandwidth used by wide rolling computations.  Kernels keep
+# their accumulators in float64: pandas rolling and ewm computations, and the
+# incremental EWMA state, run in float64 whatever the input dtype, and their
+# results are rounded to float32 only when stored.  The relative error of a
+# float32 result is then of the order of float32 resolution (about 6e-8) of
+# the inputs, which is well inside the noise of the features it is used for.
+# Keep float64 where results depend on small differences of large values.
+
+_SUPPORTED = (np.dtype(np.float64), np.dtype(np.float32))
+_default_dtype = np.dtype(np.float64)
+
+
+def set_default_dtype(dtype):
+    """Set the default float dtype for indicator containers and repo items"""
+    global _default_dtype
+    dtype = np.dtype(dtype)
+    if dtype not in _SUPPORTED:
+        raise Exception(f"unsupported float dtype '{dtype}'")
+    _default_dtype = dtype
+
+
+def default_dtype() -> np.dtype:
+    return _default_dtype
+
+
+def resolve_dtype(dtype=None) -> np.dtype:
+    """The given dtype, or the default when None"""
+    if dtype is None:
+        return _default_dtype
+    dtype = np.dtype(dtype)
+    if dtype not in _SUPPORTED:
+        raise Exception(f"unsupported float dtype '{dtype}'")
+    return dtype
+
+
+def cast_floats(data, dtype):
+    """Cast the float columns of a Series or DataFrame to `dtype`, leaving
+    other columns as they are.  Returns `data` itself if nothing changes."""
+    dtype = np.dtype(dtype)
+    if isinstance(data, pd.Series):
+        if data.dtype.kind == "f" and data.dtype != dtype:
+            return data.astype(dtype)
+        return data
+    cast = {col: dtype for col, col_dtype in data.dtypes.items()
+            if col_dtype.kind == "f" and col_dtype != dtype}
+    if not cast:
+        return data
+    name = getattr(data, "name", None) if "name" not in data.columns else None
+    data = data.astype(cast)
+    if name is not None:
+        data.name = name
+    return data
@@ -22,11 +22,11 @@ def signal_threshold(signal, threshold, fill=np.nan):
     return events
 
 
-def calc_fwd_returns(prices: pd.Series,
+def calc_fwd_returns(prices: pd.Series | pd.DataFrame,
                      prices_period_sec: int,
                      study_period_sec: int,
                      as_bps=False):
-    assert isinstance(prices, pd.Series)
+    assert isinstance(prices, (pd.Series, pd.DataFrame))
     # number of src bins to make up the study period
     window_period = int(study_period_sec / prices_period_sec)
     assert window_period * prices_period_sec == study_period_sec
@@ -36,10 +36,10 @@ def calc_fwd_returns(prices: pd.Series,
 
 # Calculate the time density of a series. For example the trade volume per
 # second for a specific lookback period.
-def calc_density(data: pd.Series,
+def calc_density(data: pd.Series | pd.DataFrame,
                  data_period_sec: int,
                  study_period_sec: int):
-    assert isinstance(data, pd.Series)
+    assert isinstance(data, (pd.Series, pd.DataFrame))
 
     # number of src bins to make up the study period
     window_period = int(study_period_sec / data_period_sec)
@@ -50,6 +50,260 @@ def calc_density(data: pd.Series,
     return roll_den
 
 
+# Rolling sums of `values` (rows x columns) over each of `windows` rows,
+# returned as a (windows x rows x columns) array.  As pandas rolling sums, a
+# window that is incomplete or has a missing value, NaN or inf, gives NaN.
+# All windows are taken as differences of one cumulative sum, which is taken
+# relative to the first value of each column, to limit the loss of precision
+# as it grows.
+def rolling_sum_family(values: np.ndarray, windows) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    rows, columns = values.shape
+    missing = ~np.isfinite(values)
+    first = values[np.argmax(~missing, axis=0), np.arange(columns)]
+    first = np.where(np.isfinite(first), first, 0.0)
+    sums = np.zeros((rows + 1, columns))
+    np.cumsum(np.where(missing, 0.0, values - first), axis=0, out=sums[1:])
+    counts = np.zeros((rows + 1, columns), dtype=np.int64)
+    np.cumsum(missing, axis=0, out=counts[1:])
+
+    result = np.full((len(windows), rows, columns), np.nan)
+    for i, window in enumerate(windows):
+        if window > rows:
+            continue
+        out = result[i, window - 1:]
+        np.subtract(sums[window:], sums[:rows + 1 - window], out=out)
+        out += window * first
+        out[counts[window:] != counts[:rows + 1 - window]] = np.nan
+    return result
+
+
+# Relative changes of `values` (rows x columns) over each of `lags` rows,
+# returned as a (lags x rows x columns) array.  A positive lag gives the
+# return over the preceding rows, as DataFrame.pct_change, and a negative lag
+# the return over the following rows, as calc_fwd_returns.
+def change_family(values: np.ndarray, lags) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind != "f":
+        values = values.astype(np.float64)
+    rows = len(values)
+    result = np.full((len(lags),) + values.shape, np.nan, dtype=values.dtype)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, lag in enumerate(lags):
+            if abs(lag) >= rows:
+                continue
+            if lag > 0:
+                out = result[i, lag:]
+                np.divide(values[lag:], values[:rows - lag], out=out)
+            else:
+                out = result[i, :rows + lag]
+                np.divide(values[-lag:], values[:rows + lag], out=out)
+            out -= 1.0
+    return result
+
+
+def _float_values(values) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind != "f":
+        values = values.astype(np.float64)
+    return values
+
+
+# Rows of windows of `window` rows, over `missing` (rows x columns), that
+# include a missing value; one row per complete window, so the first is the
+# window ending on row `window - 1`.
+def _missing_windows(missing: np.ndarray, window: int) -> np.ndarray:
+    counts = np.zeros((len(missing) + 1, missing.shape[1]), dtype=np.int64)
+    np.cumsum(missing, axis=0, out=counts[1:])
+    return counts[window:] != counts[:len(counts) - window]
+
+
+# Rolling maxima, or minima, of `values` (rows x columns) over `window` rows,
+# by the van Herk/Gil-Werman algorithm.  The rows are cut into blocks of
+# `window` rows, and the extreme of a window combines the extreme of the rest
+# of the block it starts in with that of the start of the block it ends in,
+# so the cost is a few passes over the input whatever the window.  As pandas
+# rolling max and min, a window that is incomplete or has a missing value
+# gives NaN, where, as for pandas, infinite values are missing.
+def rolling_extreme(values: np.ndarray, window: int, maximum=True) -> np.ndarray:
+    values = _float_values(values)
+    rows, columns = values.shape
+    result = np.full(values.shape, np.nan, dtype=values.dtype)
+    if window > rows:
+        return result
+    ufunc, fill = (np.maximum, -np.inf) if maximum else (np.minimum, np.inf)
+    missing = ~np.isfinite(values)
+    blocks = -(-rows // window)
+    padded = np.full((blocks * window, columns), fill, dtype=values.dtype)
+    np.copyto(padded[:rows], values, where=~missing)
+    padded = padded.reshape(blocks, window, columns)
+    prefix = ufunc.accumulate(padded, axis=1).reshape(-1, columns)
+    suffix = ufunc.accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape(-1, columns)
+    out = result[window - 1:]
+    ufunc(suffix[:rows - window + 1], prefix[window - 1:rows], out=out)
+    out[_missing_windows(missing, window)] = np.nan
+    return result
+
+
+# Wavelet matrix over integer codes in [0, 2**bits), which answers order
+# statistic queries over ranges of positions: the k-th smallest code, and the
+# numbers of codes less than, and equal to, a value, for many (left, right)
+# ranges at once, in `bits` vectorized steps.  Level i holds, for each position, the number
+# of codes before it whose bit (bits - 1 - i) is zero, the codes being stably
+# partitioned on that bit from one level to the next.
+class _WaveletMatrix:
+
+    def __init__(self, codes: np.ndarray, bits: int):
+        self.bits = bits
+        self.zeros = np.zeros((bits, len(codes) + 1), dtype=codes.dtype)
+        self.nzeros = np.empty(bits, dtype=codes.dtype)
+        positions = np.arange(len(codes), dtype=codes.dtype)
+        for i in range(bits):
+            zeros = ((codes >> (bits - 1 - i)) & 1) == 0
+            before = self.zeros[i, :-1]
+            np.cumsum(zeros, out=self.zeros[i, 1:])
+            self.nzeros[i] = self.zeros[i, -1]
+            # scatter the codes to their stably partitioned positions
+            target = positions - before
+            target += self.nzeros[i]
+            np.copyto(target, before, where=zeros)
+            partitioned = np.empty_like(codes)
+            partitioned[target] = codes
+            codes = partitioned
+
+    # Follow each range [left, right) down from level i, to its zeros or,
+    # where `ones`, to its ones, given the counts of zeros before its ends.
+    # `left` and `right` are updated in place.
+    def _descend(self, i, left, right, zleft, zright, ones):
+        left += self.nzeros[i] - zleft
+        right += self.nzeros[i] - zright
+        np.copyto(left, zleft, where=~ones)
+        np.copyto(right, zright, where=~ones)
+
+    def kth(self, left, right, k):
+        """The k-th smallest (from 0) code of each range [left, right)"""
+        left, right = left.copy(), right.copy()
+        k = np.broadcast_to(k, left.shape).astype(left.dtype)
+        code = np.zeros_like(left)
+        for i in range(self.bits):
+            zleft, zright = self.zeros[i, left], self.zeros[i, right]
+            zeros = zright - zleft
+            ones = k >= zeros
+            k -= zeros * ones
+            self._descend(i, left, right, zleft, zright, ones)
+            code |= ones.astype(code.dtype) << (self.bits - 1 - i)
+        return code
+
+    def count(self, left, right, x):
+        """The numbers of codes less than, and equal to, x in each range
+        [left, right)"""
+        left, right = left.copy(), right.copy()
+        less = np.zeros_like(left)
+        for i in range(self.bits):
+            zleft, zright = self.zeros[i, left], self.zeros[i, right]
+            ones = ((x >> (self.bits - 1 - i)) & 1).astype(bool)
+            less += (zright - zleft) * ones
+            self._descend(i, left, right, zleft, zright, ones)
+        return less, right - left
+
+
+# Evaluate an order statistic over the rolling windows of `window` rows of
+# `values` (rows x columns).  `query(matrix, uniq, codes, left, right)`
+# returns the statistic of each window [left, right) of positions in `codes`,
+# the values of a block of rows of a column as indices into their sorted
+# distinct values `uniq`.  Blocks hold about ORDER_CHUNK rows besides the
+# `window - 1` rows of history they need, which keeps the matrix
+# cache-friendly and its memory bounded.  As pandas rolling statistics, a
+# window that is incomplete or has a missing value, NaN or infinite, gives NaN.
+ORDER_CHUNK = 1 << 16
+
+
+def _rolling_order_stat(values, window: int, query) -> np.ndarray:
+    values = _float_values(values)
+    rows, columns = values.shape
+    result = np.full(values.shape, np.nan, dtype=np.float64)
+    if window > rows:
+        return result
+    step = max(ORDER_CHUNK, window)
+    dtype = np.int32 if step + window < 2**31 else np.int64
+    for column in range(columns):
+        for start in range(window - 1, rows, step):
+            stop = min(start + step, rows)
+            uniq, codes = np.unique(values[start - window + 1:stop, column],
+                                    return_inverse=True)
+            codes = codes.astype(dtype)
+            matrix = _WaveletMatrix(codes, max(int(len(uniq) - 1).bit_length(), 1))
+            right = np.arange(window, len(codes) + 1, dtype=dtype)
+            with np.errstate(invalid="ignore"):  # infinite values, masked below
+                result[start:stop, column] = query(matrix, uniq, codes, right - window, right)
+    result[window - 1:][_missing_windows(~np.isfinite(values), window)] = np.nan
+    return result
+
+
+# Rolling quantiles of `values` (rows x columns) over `window` rows, linearly
+# interpolated between order statistics as pandas rolling quantile.
+def rolling_quantile(values: np.ndarray, window: int, quantile: float) -> np.ndarray:
+    assert 0 <= quantile <= 1
+    position = quantile * (window - 1)
+    k = int(math.floor(position))
+    fraction = position - k
+
+    def query(matrix, uniq, codes, left, right):
+        low = uniq[matrix.kth(left, right, k)]
+        if fraction == 0:
+            return low
+        high = uniq[matrix.kth(left, right, k + 1)]
+        return low + (high - low) * fraction
+
+    return _rolling_order_stat(values, window, query)
+
+
+# Rolling medians of `values` (rows x columns) over `window` rows; the mean of
+# the two middle values of an even window.
+def rolling_median(values: np.ndarray, window: int) -> np.ndarray:
+    def query(matrix, uniq, codes, left, right):
+        low = uniq[matrix.kth(left, right, (window - 1) // 2)]
+        if window % 2:
+            return low
+        return (low + uniq[matrix.kth(left, right, window // 2)]) / 2
+
+    return _rolling_order_stat(values, window, query)
+
+
+# Percentile rank of each value of `values` (rows x columns) in the window of
+# `window` rows that it ends, in (0, 1]; ties take their average rank, as
+# pandas rolling rank(pct=True).  Small windows are ranked by comparing each
+# value with its window directly, which is faster than the wavelet matrix up
+# to about RANK_DIRECT_WINDOW rows.
+RANK_DIRECT_WINDOW = 256
+
+
+def rolling_rank(values: np.ndarray, window: int) -> np.ndarray:
+    if window > RANK_DIRECT_WINDOW:
+        def query(matrix, uniq, codes, left, right):
+            less, equal = matrix.count(left, right, codes[right - 1])
+            return (less + (equal + 1) / 2) / window
+
+        return _rolling_order_stat(values, window, query)
+
+    values = _float_values(values)
+    rows, columns = values.shape
+    result = np.full(values.shape, np.nan, dtype=np.float64)
+    if window > rows:
+        return result
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    step = max(ORDER_CHUNK // (columns * window), 1)
+    for start in range(0, len(windows), step):
+        block = windows[start:start + step]
+        x = values[start + window - 1:start + window - 1 + len(block), :, None]
+        less = np.count_nonzero(block < x, axis=2)
+        equal = np.count_nonzero(block == x, axis=2)
+        result[start + window - 1:start + window - 1 + len(block)] = \
+            (less + (equal + 1) / 2) / window
+    result[window - 1:][_missing_windows(~np.isfinite(values), window)] = np.nan
+    return result
+
+
 def halflife_to_span(half_life, granularity):
     """
     Convert exponential decay half-life into TA-Lib/Pandas EMA span. The
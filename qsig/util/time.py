@@ -27,3 +27,12 @@ def parse_time_period(period: str|int) -> int:
         return int(period[0:-1]) * 60 * 60
     else:
         raise Exception(f"cannot parse time period '{period}'")
+
+
+# Convert a number of seconds into a time period string, in the largest of
+# the units of `units` (seconds, minutes and hours) that divides it exactly.
+def format_time_period(seconds: int, units: str = "hms") -> str:
+    for unit, size in [("h", 3600), ("m", 60), ("s", 1)]:
+        if unit in units and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    raise Exception(f"cannot format time period of {seconds} seconds in units '{units}'")
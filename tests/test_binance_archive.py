@@ -0,0 +1,63 @@
+import datetime as dt
+import pathlib
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from qsig.data.binance.binance_archive import ingest_binance_kline_archives
+from qsig.data.binance.binance_data import build_tick_file_uri
+from qsig.data.binance.binance_fetch_bars import _klines_to_frame
+from qsig.model.marketdata import BarInterval
+from tests.test_binance_kline_fetcher import make_klines
+
+
+def _write_archive(path: pathlib.Path, rows, header=False, time_scale=1):
+    lines = ["open_time,open,high,low,close,volume,close_time,quote_volume,"
+             "count,taker_buy_volume,taker_buy_quote_volume,ignore"] if header else []
+    for row in rows:
+        row = [row[0] * time_scale] + row[1:6] + [row[6] * time_scale + (time_scale - 1)] + row[7:]
+        lines.append(",".join(str(x) for x in row))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(path.with_suffix(".csv").name, "\n".join(lines) + "\n")
+
+
+def test_ingest_kline_archives(tmp_path):
+    archive_dir = tmp_path / "archive"
+    tick_home = pathlib.Path(tmp_path / "tickdata")
+    folder = archive_dir / "spot"
+    march = int(pd.Timestamp("2024-03-01").value // 10**6)
+    april = int(pd.Timestamp("2024-04-01").value // 10**6)
+    day = 86_400_000
+
+    # a monthly archive for March, with a header row, and a daily archive for
+    # the 1st of April with microsecond timestamps
+    _write_archive(folder / "monthly/klines/BTCUSDT/1h/BTCUSDT-1h-2024-03.zip",
+                   make_klines(march, april - 1, "1h", 1000), header=True)
+    _write_archive(folder / "daily/klines/BTCUSDT/1h/BTCUSDT-1h-2024-04-01.zip",
+                   make_klines(april, april + day - 1, "1h", 1000), time_scale=1000)
+
+    interval = BarInterval("1h")
+    report = ingest_binance_kline_archives(["BTCUSDT"], dt.date(2024, 3, 30),
+                                           dt.date(2024, 4, 3), interval,
+                                           archive_dir, max_workers=2,
+                                           tick_home=tick_home)
+    assert report.archives_read == 2
+    assert report.files_written == 3
+    assert report.days_missing == 1
+
+    for date in [dt.date(2024, 3, 31), dt.date(2024, 4, 1)]:
+        t0 = int(pd.Timestamp(date).value // 10**6)
+        expected = _klines_to_frame(np.array(make_klines(t0, t0 + day - 1, "1h", 1000), dtype=float))
+        actual = pd.read_parquet(build_tick_file_uri("BTCUSDT", date, interval,
+                                                     tick_home=tick_home).path)
+        assert len(actual) == 24
+        for col in expected.columns:
+            assert (actual[col].values == expected[col].values).all(), col
+
+    report = ingest_binance_kline_archives(["BTCUSDT"], dt.date(2024, 3, 30),
+                                           dt.date(2024, 4, 2), interval,
+                                           archive_dir, tick_home=tick_home)
+    assert report.archives_read == 0
+    assert report.files_already_existed == 3
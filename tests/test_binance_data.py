@@ -0,0 +1,52 @@
+import datetime as dt
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+import qsig
+from qsig.data.binance.binance_data import build_tick_file_uri, build_binance_trade_features_dataset
+from qsig.data.binance.binance_fetch_bars import _klines_to_frame
+from tests.test_binance_kline_fetcher import make_klines
+
+
+def _write_bar_files(tick_home, universe, dates, interval):
+    for inst in universe:
+        for date in dates:
+            uri = build_tick_file_uri(inst, date, interval, tick_home=tick_home)
+            t0 = int(pd.Timestamp(date).value // 10**6)
+            klines = np.array(make_klines(t0, t0 + 86_400_000 - 1, str(interval), 1000))
+            uri.folder.mkdir(parents=True, exist_ok=True)
+            _klines_to_frame(klines.astype(float)).to_parquet(uri.path)
+
+
+def test_build_trade_features_dataset(tmp_path):
+    tick_home = pathlib.Path(tmp_path / "tickdata")
+    interval = qsig.BarInterval("1h")
+    universe = [qsig.Instrument.from_ticker(t, qsig.ExchCode.BINANCE)
+                for t in ["BTC/USDT", "ETH/USDT", "SOL/USDT"]]
+    dates = [dt.date(2024, 3, 1), dt.date(2024, 3, 2)]
+    _write_bar_files(tick_home, universe[:2], dates, interval)
+
+    repo = qsig.DataRepo(tmp_path / "repo")
+    in_memory = repo.get_library("in_memory")
+    spilled = repo.get_library("spilled")
+    for lib, budget in [(in_memory, None), (spilled, 1)]:
+        build_binance_trade_features_dataset(universe, dates[0], dt.date(2024, 3, 3),
+                                             interval, lib, skip_missing_files=True,
+                                             memory_budget=budget, tick_home=tick_home)
+
+    keys = {"open", "high", "low", "close", "return", "volume",
+            "taker_buy_volume", "taker_sell_volume"}
+    assert set(in_memory.list_keys()) == keys
+    assert set(spilled.list_keys()) == keys  # no '_part.*' items left behind
+    for key in keys:
+        pd.testing.assert_frame_equal(in_memory.read(key), spilled.read(key))
+
+    close = in_memory.read("close")
+    assert list(close.columns) == [x.ticker() for x in universe]
+    assert len(close) == 48
+    assert close.index[0] == pd.Timestamp("2024-03-01 01:00")
+    assert close["SOL/USDT.BNC"].isna().all()
+    ret = in_memory.read("return")["BTC/USDT.BNC"]
+    assert np.allclose(ret.iloc[1:], close["BTC/USDT.BNC"].pct_change().iloc[1:])
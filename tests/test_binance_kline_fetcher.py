@@ -0,0 +1,276 @@
+import datetime as dt
+import http.server
+import json
+import pathlib
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+import requests
+
+from qsig.data.binance.binance_data import build_tick_file_uri
+from qsig.data.binance.binance_fetch_bars import fetch_binance_bars_range
+from qsig.data.binance.binance_kline_fetcher import BinanceKlineFetcher
+from qsig.model.marketdata import BarInterval
+
+INTERVAL_MS = {"1m": 60_000, "1h": 3_600_000}
+
+
+def make_klines(start_time: int, end_time: int, interval: str, limit: int, absent=()):
+    step = INTERVAL_MS[interval]
+    t = -(-start_time // step) * step  # first bar opening at or after start
+    rows = []
+    while t <= end_time and len(rows) < limit:
+        i = t // step
+        if any(a <= t < b for a, b in absent):
+            t += step
+            continue
+        rows.append([t, f"{100 + i % 7}.5", "110.0", "90.0", f"{100 + i % 5}.25",
+                     "12.5", t + step - 1, "1250.0", int(i % 11), "6.0", "600.0", "0"])
+        t += step
+    return rows
+
+
+# Local stand-in for the Binance klines endpoint.  The first request for each
+# symbol in `throttle_once` is rejected with a 429, and for each symbol in
+# `stall_once` is answered only after a second.
+class _BinanceStandIn(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    throttle_once = set()
+    stall_once = set()
+    requests_seen = []
+    absent = []  # [start, end) ms ranges of bars the exchange does not have
+    lock = threading.Lock()
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with self.lock:
+            self.requests_seen.append(query)
+            used = len(self.requests_seen) * 2
+            throttle = query["symbol"] in self.throttle_once
+            self.throttle_once.discard(query["symbol"])
+            stall = query["symbol"] in self.stall_once
+            self.stall_once.discard(query["symbol"])
+        if stall:
+            time.sleep(1.0)
+        if throttle:
+            self._reply(429, b'{"code":-1003}', {"Retry-After": "0"})
+            return
+        rows = make_klines(int(query["startTime"]), int(query["endTime"]),
+                           query["interval"], int(query["limit"]), self.absent)
+        self._reply(200, json.dumps(rows).encode(), {"X-MBX-USED-WEIGHT-1M": str(used)})
+
+    def _reply(self, code, body, headers):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # the client gave up waiting
+
+    def log_message(self, *args):
+        pass
+
+
+def start_binance_stand_in():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _BinanceStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_fetch_bars_parallel(tmp_path):
+    server = start_binance_stand_in()
+    try:
+        _BinanceStandIn.throttle_once = {"ETHUSDT"}
+        _BinanceStandIn.requests_seen = []
+        fetcher = BinanceKlineFetcher(api_url=f"http://127.0.0.1:{server.server_port}",
+                                      max_workers=4,
+                                      tick_home=pathlib.Path(tmp_path))
+        interval = BarInterval("1h")
+        symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+        report = fetcher.fetch_bars(symbols, dt.date(2024, 3, 1), dt.date(2024, 3, 3), interval)
+
+        assert report.files_requested == 6
+        assert report.new_files_downloaded == 6
+        assert report.files_failed == 0
+        assert fetcher.requests_throttled == 1
+
+        uri = build_tick_file_uri("ETHUSDT", dt.date(2024, 3, 2), interval,
+                                  tick_home=pathlib.Path(tmp_path))
+        df = pd.read_parquet(uri.path)
+        assert len(df) == 24
+        assert df["open_time"].iloc[0] == pd.Timestamp("2024-03-02")
+        assert df["close"].dtype == float
+    finally:
+        server.shutdown()
+
+
+def test_fetch_klines_retries_timeouts(tmp_path):
+    server = start_binance_stand_in()
+    try:
+        _BinanceStandIn.throttle_once = set()
+        _BinanceStandIn.stall_once = {"BTCUSDT"}
+        _BinanceStandIn.requests_seen = []
+        fetcher = BinanceKlineFetcher(api_url=f"http://127.0.0.1:{server.server_port}",
+                                      backoff_sec=0.0, timeout_sec=0.2,
+                                      tick_home=pathlib.Path(tmp_path))
+        start = int(pd.Timestamp("2024-03-01").value // 10**6)
+        rows = json.loads(fetcher.fetch_klines("BTCUSDT", start, start + 5 * INTERVAL_MS["1h"],
+                                               BarInterval("1h")))
+        assert len(rows) == 6
+        assert len(_BinanceStandIn.requests_seen) == 2
+        assert fetcher.requests_made == 1
+    finally:
+        _BinanceStandIn.stall_once = set()
+        server.shutdown()
+
+    # connection errors are retried up to max_retries, and then raised
+    fetcher = BinanceKlineFetcher(api_url=f"http://127.0.0.1:{server.server_port}",
+                                  max_retries=2, backoff_sec=0.0,
+                                  tick_home=pathlib.Path(tmp_path))
+    server.server_close()
+    with pytest.raises(requests.ConnectionError):
+        fetcher.fetch_klines("BTCUSDT", start, start, BarInterval("1h"))
+
+
+def test_decode_klines():
+    from qsig.data.binance.binance_fetch_bars import (
+        _decode_klines, _klines_to_frame, _normalise_klines)
+
+    rows = make_klines(1_709_251_200_000, 1_709_251_200_000 + 3_600_000 * 5, "1m", 1000)
+    raw = json.dumps(rows, separators=(",", ":"))
+    expected = _normalise_klines(pd.DataFrame(json.loads(raw)))
+    actual = _klines_to_frame(_decode_klines(raw))
+
+    assert list(actual.columns) == list(expected.columns)
+    assert actual["number_of_trades"].dtype == "int64"
+    assert actual["close"].dtype == "float64"
+    for col in actual.columns:
+        assert (actual[col].values == expected[col].values).all()
+
+    assert _decode_klines("[]").shape == (0, 12)
+
+
+def test_fetch_bars_coalesced(tmp_path):
+    server = start_binance_stand_in()
+    try:
+        _BinanceStandIn.throttle_once = set()
+        _BinanceStandIn.requests_seen = []
+        fetcher = BinanceKlineFetcher(api_url=f"http://127.0.0.1:{server.server_port}",
+                                      tick_home=pathlib.Path(tmp_path))
+        interval = BarInterval("1h")
+        date_from = dt.date(2024, 3, 1)
+        date_upto = dt.date(2024, 3, 31)
+
+        report = fetcher.fetch_bars(["BTCUSDT"], date_from, date_upto, interval,
+                                    coalesce=True)
+        assert report.new_files_downloaded == 30
+        assert len(_BinanceStandIn.requests_seen) == 1  # 720 bars
+
+        def _uri(date):
+            return build_tick_file_uri("BTCUSDT", date, interval,
+                                       tick_home=pathlib.Path(tmp_path))
+
+        # same result as the per-day fetch
+        expected = pd.read_parquet(_uri(dt.date(2024, 3, 7)).path)
+        assert len(expected) == 24
+        assert expected["close_time"].iloc[-1] < pd.Timestamp("2024-03-08")
+
+        # punch gaps into two files, and check only those bars are fetched
+        for date in [dt.date(2024, 3, 7), dt.date(2024, 3, 20)]:
+            df = pd.read_parquet(_uri(date).path)
+            df.drop(index=[3, 4, 5]).to_parquet(_uri(date).path)
+        _BinanceStandIn.requests_seen = []
+
+        report = fetcher.fetch_bars(["BTCUSDT"], date_from, date_upto, interval,
+                                    coalesce=True)
+        assert report.files_already_existed == 28
+        assert report.files_updated == 2
+        assert len(_BinanceStandIn.requests_seen) == 2
+        actual = pd.read_parquet(_uri(dt.date(2024, 3, 7)).path)
+        for col in expected.columns:
+            assert (actual[col].values == expected[col].values).all()
+    finally:
+        server.shutdown()
+
+
+def test_fetch_bars_coalesced_skips_absent_bars(tmp_path):
+    server = start_binance_stand_in()
+    try:
+        _BinanceStandIn.throttle_once = set()
+        _BinanceStandIn.requests_seen = []
+        listing = int(pd.Timestamp("2024-03-05 06:00").value // 10**6)
+        outage = int(pd.Timestamp("2024-03-20 10:00").value // 10**6)
+        _BinanceStandIn.absent = [(0, listing), (outage, outage + 3 * INTERVAL_MS["1h"])]
+        fetcher = BinanceKlineFetcher(api_url=f"http://127.0.0.1:{server.server_port}",
+                                      tick_home=pathlib.Path(tmp_path))
+        interval = BarInterval("1h")
+        date_from, date_upto = dt.date(2024, 2, 26), dt.date(2024, 3, 31)
+
+        report = fetcher.fetch_bars(["BTCUSDT"], date_from, date_upto, interval,
+                                    coalesce=True)
+        assert report.new_files_downloaded == 34
+        assert len(_BinanceStandIn.requests_seen) > 0
+
+        def _read(date):
+            return pd.read_parquet(build_tick_file_uri("BTCUSDT", date, interval,
+                                                       tick_home=pathlib.Path(tmp_path)).path)
+
+        assert _read(dt.date(2024, 3, 1)).empty
+        assert len(_read(dt.date(2024, 3, 5))) == 18
+        assert len(_read(dt.date(2024, 3, 20))) == 21
+
+        # bars the exchange does not have are not requested again
+        _BinanceStandIn.requests_seen = []
+        report = fetcher.fetch_bars(["BTCUSDT"], date_from, date_upto, interval,
+                                    coalesce=True)
+        assert report.files_already_existed == 34
+        assert len(_BinanceStandIn.requests_seen) == 0
+
+        # unless asked to, which fills the outage once the exchange has the bars
+        _BinanceStandIn.absent = [(0, listing)]
+        report = fetcher.fetch_bars(["BTCUSDT"], date_from, date_upto, interval,
+                                    coalesce=True, refetch_empty=True)
+        assert len(_BinanceStandIn.requests_seen) > 0
+        assert report.files_updated == 1
+        assert len(_read(dt.date(2024, 3, 20))) == 24
+        assert len(_read(dt.date(2024, 3, 5))) == 18
+    finally:
+        _BinanceStandIn.absent = []
+        server.shutdown()
+
+
+def test_fetch_bars_coalesced_requests_recent_absent_bars_again(tmp_path):
+    server = start_binance_stand_in()
+    try:
+        _BinanceStandIn.throttle_once = set()
+        _BinanceStandIn.requests_seen = []
+        lag = int(pd.Timestamp("2024-03-31 05:00").value // 10**6)
+        _BinanceStandIn.absent = [(lag, lag + 2 * INTERVAL_MS["1h"])]
+        fetcher = BinanceKlineFetcher(api_url=f"http://127.0.0.1:{server.server_port}",
+                                      tick_home=pathlib.Path(tmp_path))
+        interval = BarInterval("1h")
+        now = dt.datetime(2024, 3, 31, 12, tzinfo=dt.timezone.utc)
+
+        def _fetch():
+            fetch_binance_bars_range("BTCUSDT", dt.date(2024, 3, 30), dt.date(2024, 4, 1),
+                                     interval, fetch_klines=fetcher.fetch_klines,
+                                     tick_home=pathlib.Path(tmp_path), now=now)
+            return pd.read_parquet(build_tick_file_uri("BTCUSDT", dt.date(2024, 3, 31),
+                                                       interval,
+                                                       tick_home=pathlib.Path(tmp_path)).path)
+
+        # bars missing within the margin of now are not recorded as empty
+        assert len(_fetch()) == 10
+        _BinanceStandIn.requests_seen = []
+        _BinanceStandIn.absent = []
+        assert len(_fetch()) == 12
+        assert len(_BinanceStandIn.requests_seen) == 1
+    finally:
+        _BinanceStandIn.absent = []
+        server.shutdown()
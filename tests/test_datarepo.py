@@ -1,5 +1,7 @@
+import json
 import pandas as pd
 import math
+import numpy as np
 
 from qsig import DataRepo, DataRepoError
 
@@ -88,3 +90,52 @@ def test_list_of_empty_repo():
     repo = DataRepo(storage_path="/var/tmp/NEW_TEST")
     libs = repo.list_libraries()
     assert len(libs) == 0
+
+
+def test_float_dtype(tmp_path):
+    repo = DataRepo(storage_path=tmp_path, float_dtype=np.float32)
+    lib = repo.get_library("test_float_dtype")
+    data = pd.DataFrame({'a': [1, 2, 3], 'b': [10.5, 22.25, math.nan]})
+    lib.write("prices", data)
+    recovered_data = lib.read("prices")
+    assert list(recovered_data.dtypes) == [np.int64, np.float32]
+    assert recovered_data["b"].fillna(0).eq(data["b"].fillna(0)).all()
+
+    lib.write("prices", data, float_dtype=np.float64)
+    assert lib.read("prices")["b"].dtype == np.float64
+
+
+def test_read_chunks_and_writer(tmp_path):
+    repo = DataRepo(storage_path=tmp_path)
+    lib = repo.get_library("test_chunks")
+    index = pd.date_range("2024-01-01", periods=10, freq="min")
+    data = pd.DataFrame({'a': np.arange(10.0), 'b': np.arange(10)}, index=index)
+    data.name = "bars"
+    lib.write("bars", data)
+
+    chunks = list(lib.read_chunks("bars", 4))
+    assert [len(x) for x in chunks] == [4, 4, 2]
+    assert chunks[0].name == "bars"
+    with lib.writer("copy") as writer:
+        for chunk in chunks:
+            writer.append(chunk)
+    pd.testing.assert_frame_equal(lib.read("copy"), data, check_freq=False)
+
+    # a writer left by an exception leaves the existing item as it was
+    try:
+        with lib.writer("copy") as writer:
+            writer.append(chunks[0])
+            raise ValueError("abandoned")
+    except ValueError:
+        pass
+    pd.testing.assert_frame_equal(lib.read("copy"), data, check_freq=False)
+
+    # only dataframe items can be read in chunks
+    meta_path = repo._build_meta_path("test_chunks", "bars")  # noqa
+    meta = json.loads(meta_path.read_text())
+    meta_path.write_text(json.dumps(dict(meta, type="series")))
+    try:
+        list(lib.read_chunks("bars", 4))
+        assert False
+    except DataRepoError as e:
+        assert e.key == "bars"
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+
+def _run(code: str) -> str:
+    return subprocess.run([sys.executable, "-c", code], check=True,
+                          capture_output=True, text=True).stdout
+
+
+def test_import_is_lazy():
+    # importing the package must not import pandas, numpy or the optional
+    # backends, nor print anything
+    output = _run("import sys, qsig, qsig.indicators\n"
+                  "print(sorted(x for x in ['pandas', 'numpy', 'talib', 'webbrowser']"
+                  " if x in sys.modules))")
+    assert output == "[]\n"
+
+
+def test_lazy_attributes_and_backends():
+    output = _run("import qsig\n"
+                  "from qsig.indicators import IndicatorFactory\n"
+                  "print(qsig.DataRepo.__name__, qsig.BarInterval('1m'))\n"
+                  "print(IndicatorFactory.instance().list())")
+    assert output.splitlines()[0] == "DataRepo 1m"
+    assert {"SMA", "EWMA", "RET", "FWD", "DEN"} <= set(eval(output.splitlines()[1]))
@@ -0,0 +1,751 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from qsig.indicators import ItemIndicatorCache, IndicatorFactory, RollingIndicator, UnaryIndicator
+from qsig.indicators.expression import format_expression, parse_expression
+from qsig.indicators.indicator_cache import IndicatorPath, RootIndicatorCache
+from qsig import DataRepo
+from qsig.indicators.indicator_graph import evaluate_graph, topological_sort
+from qsig.indicators.result_cache import IndicatorResultCache
+from qsig.indicators.result_store import ResultStore
+
+
+EXPRESSIONS = [
+    "SMA(5m)[close]",
+    "FAST=EWMA(2m)[close]",
+    "SLOW=EWMA(10m)[close]",
+    "SMOOTH=SMA(3m)[FAST]",
+    "RET(1m)[SMOOTH]",
+    "DEN(5m)[volume]",
+    "FWD(5m)",
+    "RET(5m)",
+]
+
+
+def make_bars(rows=500, seed=1):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01 09:00:00", periods=rows, freq="min", unit="ns")
+    data = pd.DataFrame(index=index)
+    data["close"] = 100.0 + rng.standard_normal(rows).cumsum()
+    data["volume"] = rng.uniform(0.0, 10.0, rows)
+    return data
+
+
+def make_item_cache(data, expressions=EXPRESSIONS):
+    cache = ItemIndicatorCache(instrument="BTCUSDT")
+    cache.add_data(data)
+    for expr in expressions:
+        cache.add_indicator(expr)
+    return cache
+
+
+def test_parallel_compute_matches_sequential():
+    data = make_bars()
+    sequential = make_item_cache(data)
+    sequential.compute(max_workers=1)
+    parallel = make_item_cache(data)
+    report = parallel.compute(max_workers=4)
+
+    pd.testing.assert_frame_equal(parallel.to_frame(), sequential.to_frame())
+    assert report.indicators == len(EXPRESSIONS)
+    chain = ["FAST", "SMOOTH", "RET(1m)[SMOOTH]"]
+    assert report.critical_path_sec >= sum(report.durations[x] for x in chain)
+    assert report.critical_path_sec <= report.busy_sec
+
+
+def test_root_compute_with_dependencies():
+    data = make_bars()
+    close = pd.DataFrame({"A": data["close"], "B": data["close"] * 2})
+    close.name = "close"
+    cache = RootIndicatorCache()
+    cache.add_data(close)
+    cache.add_indicator("FAST=EWMA(2m)")
+    cache.add_indicator("SMA(3m)[FAST]")
+    cache.compute(max_workers=4)
+
+    expected = close["B"].ewm(halflife=2, adjust=False).mean().rolling(3).mean()
+    np.testing.assert_allclose(cache.results("SMA(3m)[FAST]", "B").values, expected.values)
+    assert cache.compute_report.indicators == 4
+
+
+def test_evaluate_graph_runs_independent_nodes_concurrently():
+    graph = {f"n{i}": [] for i in range(8)}
+    graph["last"] = [f"n{i}" for i in range(8)]
+    report = evaluate_graph(graph, lambda node: time.sleep(0.05), max_workers=8)
+    assert report.busy_sec >= 0.45
+    assert report.wall_sec < 0.3
+    assert len(report.critical_path) == 2
+    assert report.critical_path[-1] == "last"
+
+
+def test_topological_sort_detects_cycles():
+    assert topological_sort({"a": ["b"], "b": ["c"], "c": []}) == ["c", "b", "a"]
+    with pytest.raises(Exception, match="circular"):
+        topological_sort({"a": ["b"], "b": ["a"], "c": []})
+
+
+def make_panel(name, rows=300, symbols=("A", "B", "C"), seed=2):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=rows, freq="min", unit="ns")
+    panel = pd.DataFrame(100.0 + rng.standard_normal((rows, len(symbols))).cumsum(axis=0),
+                         index=index, columns=list(symbols))
+    panel.name = name
+    return panel
+
+
+class NEG(UnaryIndicator):
+    """Negated input, evaluated per item only"""
+
+    CODE = "NEG"
+
+    def __init__(self, owner, input_col, name=None):
+        super().__init__(self.CODE, owner, [], input_col, name=name)
+
+    def _compute(self):
+        self._store_result(-self._owner.find(self.source))
+
+    @classmethod
+    def create(cls, args, owner, name=None, params=None, sources=None):
+        return cls(owner, cls._single_source(sources), name)
+
+
+IndicatorFactory.instance().register(NEG)
+
+
+class UP(RollingIndicator):
+    """True where the input rose, a non-float result held outside the store"""
+
+    CODE = "UP"
+
+    def __init__(self, owner, input_col, name=None):
+        super().__init__(self.CODE, owner, [], input_col, name=name)
+
+    def lookback(self) -> int:
+        return 1
+
+    def _calc(self, data):
+        return data.diff() > 0
+
+    @classmethod
+    def create(cls, args, owner, name=None, params=None, sources=None):
+        return cls(owner, cls._single_source(sources), name)
+
+
+IndicatorFactory.instance().register(UP)
+
+
+def test_panel_mode_matches_item_mode():
+    expressions = ["SMA(5m)", "FAST=EWMA(2m)", "RET(3m)[FAST]", "DEN(5m)[volume]",
+                   "FWD(5m)", "N=NEG()[FAST]", "SMA(2m)[N]"]
+    caches = []
+    for panel in [False, True]:
+        cache = RootIndicatorCache(panel=panel)
+        cache.add_data(make_panel("close"))
+        cache.add_data(make_panel("volume", seed=3))
+        cache.set_universe(["A", "B", "C"])
+        for expr in expressions:
+            cache.add_indicator(expr)
+        caches.append(cache.compute(max_workers=2))
+    items, panels = caches
+
+    assert set(panels._panel_indicators.names) == {"SMA(5m)", "FAST", "RET(3m)[FAST]",
+                                             "DEN(5m)[volume]", "FWD(5m)"}
+    result = panels.results("FAST")
+    assert np.shares_memory(result.to_numpy(), panels.result_store().column(
+        (panels._panel_indicators.get("FAST"), "", "B")))
+    for expr in ["SMA(5m)", "FAST", "RET(3m)[FAST]", "DEN(5m)[volume]", "FWD(5m)",
+                 "N", "SMA(2m)[N]"]:
+        pd.testing.assert_frame_equal(panels.results(expr), items.results(expr),
+                                      check_names=False)
+    pd.testing.assert_frame_equal(panels.results(symbol="B").sort_index(axis=1),
+                                  items.results(symbol="B").sort_index(axis=1))
+    pd.testing.assert_series_equal(panels.results("FWD(5m)", "C"), items.results("FWD(5m)", "C"))
+
+
+def test_duplicate_indicators_become_aliases():
+    cache = ItemIndicatorCache(instrument="BTCUSDT")
+    cache.add_data(make_bars())
+    fast = cache.add_indicator("FAST=SMA(5m)[close]")
+    assert cache.add_indicator("SMA(5m)") is fast
+    assert cache.add_indicator("SMA(300s)[close]") is fast
+    assert cache.add_indicator("SMA", window="5m", source="close", name="CFG") is fast
+    smooth = cache.add_indicator("EWMA(2m)[FAST]")
+    assert cache.add_indicator("EWMA(120s)[SMA(5m)]") is smooth
+    cache.add_indicator("SMA(10m)")
+    with pytest.raises(Exception, match="duplicate"):
+        cache.add_indicator("SMA(5m)")
+
+    assert len(cache.indicators()) == 3
+    assert cache.aliases() == {"SMA(5m)": "FAST", "SMA(300s)[close]": "FAST",
+                               "CFG": "FAST", "EWMA(120s)[SMA(5m)]": "EWMA(2m)[FAST]"}
+    report = cache.compute()
+    assert report.indicators == 3
+
+    df = cache.to_frame()
+    expected = df["close"].rolling(5).mean()
+    for name in ["FAST", "SMA(5m)", "SMA(300s)[close]", "CFG"]:
+        np.testing.assert_array_equal(df[name].values, expected.values)
+    pd.testing.assert_series_equal(cache.result("EWMA(120s)[SMA(5m)]"),
+                                   df["EWMA(120s)[SMA(5m)]"], check_freq=False)
+
+    root = RootIndicatorCache(panel=True)
+    root.add_data(make_panel("close"))
+    root.add_indicator("FAST=EWMA(2m)")
+    root.add_indicator("EWMA(2m)[close]")
+    root.compute()
+    assert root.results("EWMA(2m)[close]").name == "EWMA(2m)[close]"
+    assert root.results("FAST").name == "FAST"
+    pd.testing.assert_frame_equal(root.results("EWMA(2m)[close]"), root.results("FAST"))
+
+
+def test_append_data_matches_full_compute():
+    data = make_bars(rows=400)
+    data.iloc[100:110, 0] = np.nan  # missing prices across a chunk boundary
+    data.iloc[195:200, 0] = np.nan
+    expressions = EXPRESSIONS + ["N=NEG()[FAST]", "SMA(2m)[N]", "EWMA(30m)[N]", "UP()[FAST]",
+                                 "F=FWD(1m)[close]", "SMA(5m)[F]", "EWMA(3m)[SMA(5m)[F]]"]
+
+    full = make_item_cache(data, expressions)
+    full.compute()
+
+    incremental = make_item_cache(data.iloc[:105], expressions)
+    incremental.compute()
+    for start, stop in [(105, 106), (106, 200), (200, 203), (203, 400)]:
+        incremental.append_data(data.iloc[start:stop])
+
+    expected = full.to_frame()
+    result = incremental.to_frame()
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(result, expected, check_freq=False, rtol=1e-12)
+    assert result["UP()[FAST]"].dtype == bool
+    assert not incremental.find_indicator("UP()[FAST]").is_stored()
+
+    with pytest.raises(Exception, match="must start after"):
+        incremental.append_data(data.iloc[-1:])
+
+
+def test_result_cache_loads_hits_and_replaces_stale(tmp_path):
+    result_cache = IndicatorResultCache(DataRepo(tmp_path).get_library("indicators"))
+    data = make_bars()
+    expressions = EXPRESSIONS + ["N=NEG()[FAST]", "SMA(2m)[N]"]
+
+    def _run(data):
+        cache = make_item_cache(data, expressions)
+        cache._result_cache = result_cache
+        cache.compute()
+        return cache
+
+    first = _run(data)
+    assert (result_cache.hits, result_cache.misses) == (0, len(expressions) - 1)
+    keys = sorted(result_cache.library.list_keys())
+
+    second = _run(data)
+    assert result_cache.hits == len(expressions) - 1
+    pd.testing.assert_frame_equal(second.to_frame(), first.to_frame(), check_freq=False)
+
+    # the volume change only invalidates the DEN indicator
+    changed = data.copy()
+    changed.iloc[-1, 1] += 1.0
+    third = _run(changed)
+    assert result_cache.misses == len(expressions)
+    assert sorted(result_cache.library.list_keys()) == keys
+    np.testing.assert_allclose(third.result("DEN(5m)[volume]").values,
+                               changed["volume"].rolling(5).sum().values / 300)
+
+    # a loaded indicator can still be updated incrementally
+    second.append_data(make_bars(rows=510).iloc[500:])
+    assert len(second.result("SLOW")) == 510
+
+
+def test_result_cache_panel_mode(tmp_path):
+    result_cache = IndicatorResultCache(DataRepo(tmp_path).get_library("indicators"))
+    results = []
+    for _ in range(2):
+        cache = RootIndicatorCache(panel=True, result_cache=result_cache)
+        cache.add_data(make_panel("close"))
+        cache.add_indicator("FAST=EWMA(2m)")
+        cache.add_indicator("RET(1m)[FAST]")
+        cache.add_indicator("N=NEG()[FAST]")
+        results.append(cache.compute().results(symbol="A"))
+    assert (result_cache.hits, result_cache.misses) == (2, 2)
+    pd.testing.assert_frame_equal(results[0], results[1], check_freq=False)
+
+
+def test_compute_only_recomputes_invalidated_indicators():
+    data = make_bars()
+    cache = make_item_cache(data)
+    assert cache.compute().indicators == len(EXPRESSIONS)
+    assert cache.compute().indicators == 0
+
+    cache.add_indicator("SMA(7m)[SLOW]")
+    assert cache.compute().indicators == 1
+
+    changed = data.copy()
+    changed.iloc[-1, 1] += 1.0  # volume
+    cache.add_data(changed)
+    assert set(cache.compute().durations) == {"DEN(5m)[volume]"}
+
+    changed = changed.copy()
+    changed.iloc[0, 0] += 1.0  # close
+    cache.add_data(changed)
+    assert cache.compute().indicators == len(EXPRESSIONS)  # all but DEN, plus SMA(7m)
+
+    assert cache.invalidate("SMOOTH") == {"SMOOTH", "RET(1m)[SMOOTH]"}
+    assert cache.compute().indicators == 2
+
+    expected = make_item_cache(changed, EXPRESSIONS + ["SMA(7m)[SLOW]"])
+    expected.compute()
+    pd.testing.assert_frame_equal(cache.to_frame(), expected.to_frame())
+    assert cache.compute(force=True).indicators == len(EXPRESSIONS) + 1
+
+
+def test_root_data_change_recomputes_changed_symbols():
+    for panel in [False, True]:
+        close = make_panel("close")
+        cache = RootIndicatorCache(panel=panel)
+        cache.add_data(close)
+        cache.set_universe(["A", "B", "C"])
+        cache.add_indicator("FAST=EWMA(2m)")
+        cache.add_indicator("N=NEG()[FAST]")
+        cache.compute()
+
+        close = close.copy()
+        close.iloc[-1, 1] += 1.0
+        close.name = "close"
+        cache.add_data(close)
+        computed = set(cache.compute().compute_report.durations)
+        if panel:
+            assert computed == {IndicatorPath("*", "FAST"), IndicatorPath("A", "N"),
+                                IndicatorPath("B", "N"), IndicatorPath("C", "N")}
+        else:
+            assert computed == {IndicatorPath("B", "FAST"), IndicatorPath("B", "N")}
+        expected = close["B"].ewm(halflife=2, adjust=False).mean()
+        np.testing.assert_allclose(cache.results("N", "B").values, -expected.values)
+
+
+def test_result_store_frames_are_views():
+    cache = make_item_cache(make_bars())
+    cache.compute()
+    store = cache.result_store()
+    frame = cache.to_frame(include_data=False)
+    assert list(frame.columns) == [x.split("=")[0] for x in EXPRESSIONS]
+    assert np.shares_memory(frame.to_numpy(), store.column((cache.find_indicator("FAST"), "")))
+    pd.testing.assert_frame_equal(cache.to_frame()[frame.columns], frame)
+
+    # views are read-only, so cannot change the stored results
+    value = cache.result("FAST").iloc[11]
+    for view in [frame, cache.result("FAST")]:
+        with pytest.raises(ValueError, match="read-only"):
+            view.iloc[11] = -777.0
+    assert cache.result("FAST").iloc[11] == value
+    copied = frame.copy()
+    copied.iloc[11] = -777.0
+    assert cache.result("FAST").iloc[11] == value
+
+    root = RootIndicatorCache()
+    root.add_data(make_panel("close"))
+    root.set_universe(["A", "B", "C"])
+    for expr in ["FAST=EWMA(2m)", "SMA(5m)", "N=NEG()[FAST]"]:
+        root.add_indicator(expr)
+    root.compute()
+    block = root.result_store().column((root.get_item_indicator_cache("C").find_indicator("N"), ""))
+    by_name = root.results("N")
+    by_symbol = root.results(symbol="C")
+    assert list(by_symbol.columns) == ["FAST", "SMA(5m)", "N"]
+    assert np.shares_memory(by_name.to_numpy(), block)
+    assert np.shares_memory(by_symbol.to_numpy(), block)
+    np.testing.assert_array_equal(by_name["C"].values, by_symbol["N"].values)
+    with pytest.raises(ValueError, match="read-only"):
+        by_name.iloc[0, 0] = -777.0
+
+
+def test_result_store_grows():
+    index = pd.date_range("2024-01-01", periods=4, freq="min")
+    store = ResultStore(index)
+    for i in range(40):
+        store.write(i, np.arange(4.0) + i)
+    store.extend_index(pd.date_range(index[-1], periods=3, freq="min")[1:])
+    store.write(3, [10.0, 11.0], start=4)
+    assert store.rows == 6
+    np.testing.assert_array_equal(store.series(3).values, [3, 4, 5, 6, 10, 11])
+    frame = store.frame([0, 2, 4], ["a", "b", "c"])
+    np.testing.assert_array_equal(frame["c"].values[:4], [4, 5, 6, 7])
+    assert np.isnan(frame.iloc[4:].to_numpy()).all()
+
+
+def test_float32_results_are_close_to_float64():
+    data = make_bars(rows=2000)
+    expected = make_item_cache(data)
+    expected.compute()
+
+    cache = ItemIndicatorCache(instrument="BTCUSDT", dtype=np.float32)
+    cache.add_data(data)
+    for expr in EXPRESSIONS:
+        cache.add_indicator(expr)
+    cache.compute()
+    assert cache.result_store().dtype == np.float32
+    assert cache.find("close").dtype == np.float32
+
+    for name in ["SMA(5m)[close]", "FAST", "SLOW", "SMOOTH", "DEN(5m)[volume]"]:
+        result = cache.result(name)
+        assert result.dtype == np.float32
+        error = ((result - expected.result(name)) / expected.result(name)).abs().max()
+        assert error < 1e-6, name
+    for name in ["RET(1m)[SMOOTH]", "FWD(5m)", "RET(5m)"]:
+        error = (cache.result(name) - expected.result(name)).abs().max()
+        assert error < 1e-6, name
+
+    # panel results, and item results within a root, use the root dtype
+    root = RootIndicatorCache(panel=True, dtype=np.float32)
+    root.add_data(make_panel("close"))
+    root.set_universe(["A", "B", "C"])
+    root.add_indicator("EWMA(5m)")
+    root.add_indicator("N=NEG()")
+    root.compute()
+    assert (root.results("EWMA(5m)").dtypes == np.float32).all()
+    assert root.results("N", "A").dtype == np.float32
+
+
+
+def test_indicator_family_matches_separate_indicators():
+    data = make_bars(rows=600)
+    data.iloc[100:110, 0] = np.nan
+    data.loc[data.index[200], ["close", "volume"]] = np.inf
+    families = ["EWMA(1m..4m:1m)[close]", "S=SMA(2m,5m,30m)[close]", "RET(1m,5m)",
+                "FWD(1m,5m)", "DEN(60s..3m:60s)[volume]", "SMA(30m)[S(5m)]"]
+    expressions = ["EWMA(1m)[close]", "EWMA(2m)[close]", "EWMA(3m)[close]", "EWMA(4m)[close]",
+                   "SMA(2m)[close]", "S5=SMA(5m)[close]", "SMA(30m)[close]",
+                   "RET(1m)", "RET(5m)", "FWD(1m)", "FWD(5m)", "DEN(60s)[volume]",
+                   "DEN(120s)[volume]", "DEN(180s)[volume]", "SMA(30m)[S5]",
+                   "E2=EWMA(2m)[close]"]
+
+    cache = ItemIndicatorCache(instrument="BTCUSDT")
+    cache.add_data(data)
+    cache.add_indicator("E2=EWMA(2m)[close]")
+    members = [cache.add_indicator(expr) for expr in families]
+    assert [x.name for x in members[0]] == [
+        "EWMA(1m)[close]", "E2", "EWMA(3m)[close]", "EWMA(4m)[close]"]
+    assert members[0][1] is cache.find_indicator("E2")  # an alias, outside the family
+    assert members[0][1]._family is None  # noqa
+    assert members[0][0]._family is members[0][2]._family  # noqa
+    cache.compute(max_workers=4)
+
+    expected = make_item_cache(data, expressions)
+    expected.compute()
+    renamed = {"S(2m)": "SMA(2m)[close]", "S(5m)": "S5", "S(30m)": "SMA(30m)[close]",
+               "SMA(30m)[S(5m)]": "SMA(30m)[S5]"}
+    assert len(cache.indicator_names()) == len(expected.indicator_names())
+    for name in cache.indicator_names():
+        pd.testing.assert_series_equal(cache.result(name),
+                                       expected.result(renamed.get(name, name)),
+                                       check_names=False, rtol=1e-10)
+
+    # members are recomputed together after a data change, and updated on append
+    cache.invalidate("close")
+    cache.compute()
+    incremental = ItemIndicatorCache(instrument="BTCUSDT")
+    incremental.add_data(data.iloc[:400])
+    for expr in ["E2=EWMA(2m)[close]"] + families:
+        incremental.add_indicator(expr)
+    incremental.compute()
+    incremental.append_data(data.iloc[400:])
+    pd.testing.assert_frame_equal(incremental.to_frame(), cache.to_frame(), check_freq=False,
+                                  rtol=1e-10)
+
+
+def test_indicator_family_panel_mode():
+    caches = []
+    for panel in [False, True]:
+        cache = RootIndicatorCache(panel=panel)
+        cache.add_data(make_panel("close"))
+        cache.set_universe(["A", "B", "C"])
+        cache.add_indicator("F=EWMA(1m..3m:1m)")
+        cache.add_indicator("SMA(1m..10m:3m)")
+        caches.append(cache.compute())
+    items, panels = caches
+    assert set(panels._panel_indicators.names) == {"F(1m)", "F(2m)", "F(3m)", "SMA(1m)",
+                                                   "SMA(4m)", "SMA(7m)", "SMA(10m)"}
+    for name in panels._panel_indicators.names:
+        pd.testing.assert_frame_equal(panels.results(name), items.results(name),
+                                      check_names=False, rtol=1e-10)
+
+
+def test_arithmetic_expressions():
+    for text, expected in [("SMA(5m) - SMA(30m)", "SMA(5m)-SMA(30m)"),
+                           ("(a - (b - c)) * -d", "(a-(b-c))*-d"),
+                           ("a ** -b ** 2 / 2.5", "a**(-b**2)/2.5"),
+                           ("SMA(10m)[abs(close - open)]", "SMA(10m)[abs(close-open)]")]:
+        assert format_expression(parse_expression(text)) == expected
+    with pytest.raises(Exception, match="not valid indicator expression"):
+        parse_expression("close - ")
+
+    data = make_bars(rows=400)
+    cache = make_item_cache(data, ["SPREAD=SMA(5m) - SMA(30m)",
+                                   "RET(1m)/DEN(5m)[volume]",
+                                   "Z=(close-SMA(30m))/sqrt(SMA(30m)[(close-SMA(30m))**2])",
+                                   "SMA(10m)[max(RET(1m), 0)]"])
+    cache.compute(max_workers=2)
+    assert cache.indicator_names() == [
+        "(close-SMA(30m))**2", "DEN(5m)[volume]", "RET(1m)", "RET(1m)/DEN(5m)[volume]",
+        "SMA(10m)[max(RET(1m),0)]", "SMA(30m)", "SMA(30m)[(close-SMA(30m))**2]", "SMA(5m)",
+        "SPREAD", "Z", "max(RET(1m),0)"]
+
+    close, volume = data["close"], data["volume"]
+    sma30 = close.rolling(30).mean()
+    ret = close.pct_change(fill_method=None)
+    for name, expected in [
+            ("SPREAD", close.rolling(5).mean() - sma30),
+            ("RET(1m)/DEN(5m)[volume]", ret / (volume.rolling(5).sum() / 300)),
+            ("Z", (close - sma30) / np.sqrt(((close - sma30) ** 2).rolling(30).mean())),
+            ("SMA(10m)[max(RET(1m),0)]", np.maximum(ret, 0).rolling(10).mean())]:
+        pd.testing.assert_series_equal(cache.result(name), expected, check_names=False)
+
+    # expressions are updated from the appended rows only
+    incremental = make_item_cache(data.iloc[:300], ["SPREAD=SMA(5m) - SMA(30m)", "Z2=close*2"])
+    incremental.compute()
+    incremental.append_data(data.iloc[300:])
+    pd.testing.assert_series_equal(incremental.result("SPREAD"), cache.result("SPREAD"),
+                                   check_freq=False)
+    assert len(incremental.find_indicator("Z2").appended_result()) == 100
+
+    # an error reading the appended rows is raised, not taken as a reason to
+    # recompute
+    def broken(source):
+        raise Exception(f"broken source '{source}'")
+    doubled = make_item_cache(data.iloc[:300], ["Z2=close*2"])
+    doubled.compute()
+    doubled.find_appended = broken
+    with pytest.raises(Exception, match="broken source 'close'"):
+        doubled.append_data(data.iloc[300:])
+
+
+def test_arithmetic_expressions_panel_mode():
+    caches = []
+    for panel in [False, True]:
+        cache = RootIndicatorCache(panel=panel)
+        cache.add_data(make_panel("close"))
+        cache.set_universe(["A", "B", "C"])
+        cache.add_indicator("S=SMA(5m)-SMA(30m)")
+        cache.add_indicator("N=NEG()")
+        cache.add_indicator("X=N/SMA(5m)")
+        caches.append(cache.compute())
+    items, panels = caches
+    assert set(panels._panel_indicators.names) == {"SMA(5m)", "SMA(30m)", "S"}
+    for name in ["S", "X"]:
+        pd.testing.assert_frame_equal(panels.results(name), items.results(name),
+                                      check_names=False)
+
+
+def test_indicator_profile():
+    data = make_bars(rows=400)
+    cache = make_item_cache(data.iloc[:300], EXPRESSIONS + ["N=NEG()[FAST]"])
+    cache.compute(max_workers=2)
+    cache.append_data(data.iloc[300:])
+    profile = cache.profile()
+    assert list(profile.columns) == ["code", "calls", "wall_sec", "cpu_sec", "rows",
+                                     "result_bytes"]
+    assert set(profile.index) == set(x.name for x in cache.indicators())
+    assert profile["wall_sec"].is_monotonic_decreasing
+    assert (profile["calls"] == 2).all()
+    assert (profile["rows"] == 400).all()
+    assert (profile["result_bytes"] == 400 * 8).all()
+    assert profile.loc["FAST", "code"] == "EWMA"
+
+    root = RootIndicatorCache(panel=True)
+    root.add_data(make_panel("close"))
+    root.set_universe(["A", "B", "C"])
+    root.add_indicator("SMA(5m)")
+    root.add_indicator("N=NEG()")
+    root.compute()
+    profile = root.profile()
+    assert profile.loc["SMA(5m)", ["items", "calls", "result_bytes"]].tolist() == [3, 1, 300 * 3 * 8]
+    assert profile.loc["N", ["items", "calls", "rows"]].tolist() == [3, 3, 900]
+    by_symbol = root.profile(by_symbol=True)
+    assert set(by_symbol.index) == {("*", "SMA(5m)"), ("A", "N"), ("B", "N"), ("C", "N")}
+
+
+def test_window_statistics_match_pandas(monkeypatch):
+    data = make_bars(rows=400)
+    data.iloc[100:103, 0] = np.nan
+    data["close"] = data["close"].round(0)  # ties
+    data.iloc[[200, 300], 0] = [np.inf, -np.inf]  # missing, as for pandas
+    expressions = ["MIN(5m)", "MAX(17m)", "MEDIAN(4m)", "MEDIAN(7m)", "RANK(10m)",
+                   "QUANTILE(9m,0.25)", "Q=QUANTILE(5m, 1)", "MAX(1m..3m:1m)"]
+    cache = make_item_cache(data, expressions)
+    close = data["close"]
+    expected = {
+        "MIN(5m)": close.rolling(5).min(),
+        "MAX(17m)": close.rolling(17).max(),
+        "MEDIAN(4m)": close.rolling(4).median(),
+        "MEDIAN(7m)": close.rolling(7).median(),
+        "RANK(10m)": close.rolling(10).rank(pct=True),
+        "QUANTILE(9m,0.25)": close.rolling(9).quantile(0.25),
+        "Q": close.rolling(5).max(),
+        "MAX(2m)": close.rolling(2).max(),
+    }
+    for name, series in expected.items():
+        pd.testing.assert_series_equal(cache.result(name), series, check_names=False,
+                                       check_freq=False, rtol=1e-12)
+
+    # rows appended later, and blocks of the order statistic kernels
+    monkeypatch.setattr("qsig.util.signal.ORDER_CHUNK", 64)
+    monkeypatch.setattr("qsig.util.signal.RANK_DIRECT_WINDOW", 4)
+    full = make_item_cache(data, expressions)
+    full.compute()
+    incremental = make_item_cache(data.iloc[:150], expressions)
+    incremental.compute()
+    incremental.append_data(data.iloc[150:160])
+    incremental.append_data(data.iloc[160:])
+    pd.testing.assert_frame_equal(incremental.to_frame(), full.to_frame(),
+                                  check_freq=False, rtol=1e-12)
+    for name, series in expected.items():
+        pd.testing.assert_series_equal(full.result(name), series, check_names=False,
+                                       check_freq=False, rtol=1e-12)
+
+    with pytest.raises(Exception, match="quantile must be"):
+        make_item_cache(data, ["QUANTILE(5m,1.5)"])
+
+
+def test_window_statistics_panel_mode():
+    cache = RootIndicatorCache(panel=True)
+    panel = make_panel("close")
+    panel.iloc[50, 1] = np.nan
+    cache.add_data(panel)
+    cache.set_universe(["A", "B", "C"])
+    for expr in ["MIN(3m)", "RANK(6m)", "QUANTILE(8m,0.75)"]:
+        cache.add_indicator(expr)
+    cache.compute()
+    assert set(cache._panel_indicators.names) == {"MIN(3m)", "RANK(6m)", "QUANTILE(8m,0.75)"}
+    rolling = panel.rolling
+    pd.testing.assert_frame_equal(cache.results("MIN(3m)"), rolling(3).min(), check_names=False)
+    pd.testing.assert_frame_equal(cache.results("RANK(6m)"), rolling(6).rank(pct=True),
+                                  check_names=False)
+    pd.testing.assert_frame_equal(cache.results("QUANTILE(8m,0.75)"), rolling(8).quantile(0.75),
+                                  check_names=False)
+
+
+def test_sharded_compute_matches_single_process():
+    expressions = ["SMA(5m)", "FAST=EWMA(2m)", "RET(3m)[FAST]", "DEN(5m)[volume]",
+                   "N=NEG()[FAST]", "SMA(2m)[N]", "MAX(1m..3m:1m)", "Z=FAST-SMA(5m)"]
+    symbols = ("A", "B", "C", "D", "E")
+    for panel in [False, True]:
+        caches = []
+        for processes in [None, 2]:
+            cache = RootIndicatorCache(panel=panel)
+            cache.add_data(make_panel("close", symbols=symbols))
+            cache.add_data(make_panel("volume", symbols=symbols + ("X",), seed=3))
+            cache.set_universe(list(symbols))
+            for expr in expressions:
+                cache.add_indicator(expr)
+            caches.append(cache.compute(max_workers=2, processes=processes))
+        single, sharded = caches
+        assert sharded.compute_report.workers == 2
+        assert sharded.compute_report.indicators == single.compute_report.indicators
+        pd.testing.assert_frame_equal(sharded.results(), single.results())
+        assert (sharded.profile()["calls"] > 0).all()
+
+        # recompute the indicators invalidated by a change of one symbol
+        close = make_panel("close", symbols=symbols)
+        close.iloc[-10:, 3] += 1.0
+        for cache in caches:
+            cache.add_data(close)
+        sharded.compute(processes=2)
+        single.compute()
+        if not panel:
+            assert {x.symbol for x in sharded.compute_report.durations} == {"D"}
+        pd.testing.assert_frame_equal(sharded.results(), single.results())
+
+
+def test_chunked_compute_matches_in_memory(tmp_path):
+    data = make_bars(rows=400)
+    data.iloc[100:110, 0] = np.nan  # missing prices across a chunk boundary
+    expressions = EXPRESSIONS + ["MEDIAN(4m)", "Z=FAST-SLOW", "FWD(3m)[SLOW]"]
+    repo = DataRepo(tmp_path)
+    bars, results = repo.get_library("bars"), repo.get_library("results")
+    bars.write("BTCUSDT", data)
+
+    full = make_item_cache(data, expressions)
+    full.compute()
+    for include_data in [False, True]:
+        expected = full.to_frame(include_data=include_data)
+        for chunk_rows in [37, 400]:
+            cache = ItemIndicatorCache(instrument="BTCUSDT")
+            for expr in expressions:
+                cache.add_indicator(expr)
+            report = cache.compute_chunked(bars, "BTCUSDT", results, "BTCUSDT", chunk_rows,
+                                           include_data=include_data)
+            assert (report.chunks, report.rows) == (-(-400 // chunk_rows), 400)
+            assert len(cache.to_frame()) < 400 or chunk_rows == 400
+            pd.testing.assert_frame_equal(results.read("BTCUSDT"), expected,
+                                          check_freq=False, rtol=1e-12)
+
+    # indicators that cannot be updated from a trimmed cache are rejected
+    for expr in ["N=NEG()[FAST]", "SMA(2m)[FWD(5m)]", "Y=FWD(5m)-SMA(5m)"]:
+        cache = ItemIndicatorCache(instrument="BTCUSDT")
+        for x in ["FAST=EWMA(2m)", "FWD(5m)", expr]:
+            cache.add_indicator(x)
+        with pytest.raises(Exception, match="cannot be computed in chunks"):
+            cache.compute_chunked(bars, "BTCUSDT", results, "rejected", 50)
+        assert "rejected" not in results.list_keys()
+
+    # the data interval needs at least 2 rows in the first chunk
+    bars.write("short", data.iloc[:1])
+    for key, chunk_rows in [("BTCUSDT", 1), ("short", 50)]:
+        cache = ItemIndicatorCache(instrument="BTCUSDT")
+        cache.add_indicator("SMA(5m)")
+        with pytest.raises(Exception, match="at least 2|fewer than 2"):
+            cache.compute_chunked(bars, key, results, "rejected", chunk_rows)
+    assert "rejected" not in results.list_keys()
+
+
+class SPREAD:
+    """GenericIndicator details of a scaled spread between two inputs"""
+
+    @dataclass
+    class Params:
+        scale: float
+
+    @dataclass
+    class Inputs:
+        near: pd.Series
+        far: pd.Series
+
+    @staticmethod
+    def calc(params, inputs):
+        return (inputs.near - inputs.far) * params.scale
+
+    @staticmethod
+    def parse_config(config: dict):
+        return SPREAD.Params(config.get("scale", 1.0)), {x: config[x] for x in config["roles"]}
+
+
+IndicatorFactory.instance().register("SPREAD", SPREAD)
+
+
+def test_generic_indicator_structural_key():
+    cache = ItemIndicatorCache(instrument="BTCUSDT")
+    cache.add_data(make_bars())
+    a = cache.add_indicator("SPREAD", {"name": "A", "roles": ["near", "far"],
+                                       "near": "close", "far": "volume"})
+    # the same inputs bound to the same roles, listed in another order
+    assert cache.add_indicator("SPREAD", {"name": "B", "roles": ["far", "near"],
+                                          "near": "close", "far": "volume"}) is a
+    # the same inputs bound to swapped roles, in the same input order as A
+    swapped = cache.add_indicator("SPREAD", {"name": "C", "roles": ["far", "near"],
+                                             "near": "volume", "far": "close"})
+    assert swapped is not a
+    cache.compute()
+    data = cache.to_frame()
+    np.testing.assert_allclose(data["A"], data["close"] - data["volume"])
+    np.testing.assert_allclose(data["C"], data["volume"] - data["close"])
+
+    # the key is built from parameter values, not their repr, so it is the same
+    # from one run to the next
+    key = repr(cache._indicators.structural_key("A"))  # noqa
+    assert "0x" not in key and "scale" in key
+    a._params = object()
+    assert a.canonical_params() is None
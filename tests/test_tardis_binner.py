@@ -0,0 +1,51 @@
+import datetime as dt
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from qsig import DataRepo
+from qsig.data.tardis.tardis_binner import (assemble_feature_panels, build_trade_bin_uri,
+                                            calc_trade_bins)
+from qsig.data.tickfiles import read_tick_file, write_tick_file, MONTHLY
+from qsig.model.instrument import Instrument, ExchCode
+from qsig.util.time import date_range
+
+
+def _trades(date, seed):
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp(date) + pd.to_timedelta(np.sort(rng.uniform(0, 86400, 500)), unit="s")
+    return pd.DataFrame({"price": 100 + rng.standard_normal(500).cumsum(),
+                         "amount": rng.uniform(0.1, 2.0, 500),
+                         "side": rng.choice(["buy", "sell"], 500)}, index=times)
+
+
+def test_assemble_feature_panels(tmp_path):
+    tick_home = pathlib.Path(tmp_path) / "ticks"
+    universe = [Instrument("BTC", "USDT", ExchCode.BINANCE),
+                Instrument("ETH", "USDT", ExchCode.BINANCE)]
+    date_from, date_upto = dt.date(2025, 1, 30), dt.date(2025, 2, 2)
+    for i, inst in enumerate(universe):
+        for j, date in enumerate(date_range(date_from, date_upto)):
+            bins = calc_trade_bins(date, _trades(date, 10 * i + j), "1h")
+            # one instrument in the monthly layout, which is read the same way
+            write_tick_file(build_trade_bin_uri(inst, date, "1h", tick_home=tick_home), bins,
+                            layout=MONTHLY if i else None)
+
+    features = ["close", "volume", "count", "vwap"]
+    lib = DataRepo(pathlib.Path(tmp_path) / "repo").get_library("features")
+    assert assemble_feature_panels(universe, date_from, date_upto, "1h", features, lib,
+                                   max_workers=2, tick_home=tick_home) == features
+
+    # the same panels as reading every bins file once per feature
+    for feature in features:
+        columns = []
+        for inst in universe:
+            days = [read_tick_file(build_trade_bin_uri(inst, date, "1h", tick_home=tick_home))[feature]
+                    for date in date_range(date_from, date_upto)]
+            columns.append(pd.concat(days).rename(inst.ticker()))
+        expected = pd.concat(columns, axis=1)
+        panel = lib.read(feature)
+        assert panel.name == feature
+        assert len(panel) == 3 * 24
+        pd.testing.assert_frame_equal(panel, expected, check_freq=False)
@@ -0,0 +1,153 @@
+import datetime as dt
+import gzip
+import http.server
+import threading
+import pathlib
+
+from qsig.data.tardis.tardis_downloader import TardisDownloader
+
+
+def _file_content(path):
+    return gzip.compress(f"path,{path}\n".encode() * 1000, mtime=0)
+
+
+# Local stand-in for the Tardis datasets server.  Paths listed in `flaky` fail
+# with a 503 for the given number of requests before succeeding, paths
+# containing "MISSING" always return 404 and paths containing "CORRUPT" return
+# a body that is not valid gzip.  Range requests are supported.
+class _TardisStandIn(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    flaky = dict()
+    requests_seen = []
+    range_requests = []
+
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        remaining = self.flaky.get(self.path, 0)
+        if remaining > 0:
+            self.flaky[self.path] = remaining - 1
+            self._reply(503, b"busy")
+        elif "MISSING" in self.path:
+            self._reply(404, b"not found")
+        elif "CORRUPT" in self.path:
+            self._reply(200, b"this is not gzip data")
+        else:
+            body = _file_content(self.path)
+            range_header = self.headers.get("Range")
+            if range_header:
+                self.range_requests.append((self.path, range_header))
+                start = int(range_header.removeprefix("bytes=").split("-")[0])
+                self._reply(206, body[start:],
+                            {"Content-Range": f"bytes {start}-{len(body)-1}/{len(body)}"})
+            else:
+                self._reply(200, body)
+
+    def _reply(self, code, body, headers=None):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _TardisStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def test_fetch_csv_files(tmp_path):
+    server = _start_server()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        _TardisStandIn.flaky = {"/v1/binance/trades/2025/01/02/ETHUSDT.csv.gz": 2}
+        _TardisStandIn.requests_seen = []
+
+        tardis = TardisDownloader(api_key="",
+                                  base_tick_data_dir=pathlib.Path(tmp_path),
+                                  base_url=base_url,
+                                  backoff_sec=0.01)
+        results = tardis.fetch_csv_files(exchange="binance",
+                                         dataset="trades",
+                                         symbols=["BTCUSDT", "ETHUSDT", "MISSING"],
+                                         date_from=dt.date(2025, 1, 1),
+                                         date_upto=dt.date(2025, 1, 3),
+                                         max_workers=4)
+
+        assert len(results) == 6
+        status = {(x.symbol, x.date.day): x.status for x in results}
+        assert status[("BTCUSDT", 1)] == "downloaded"
+        assert status[("ETHUSDT", 2)] == "downloaded"
+        assert status[("MISSING", 1)] == "failed"
+
+        flaky = [x for x in results if x.symbol == "ETHUSDT" and x.date.day == 2][0]
+        assert flaky.attempts == 3
+        with gzip.open(flaky.path) as f:
+            assert f.read().decode().strip().endswith("ETHUSDT.csv.gz")
+
+        # second pass finds the files already on disk
+        count = len(_TardisStandIn.requests_seen)
+        results = tardis.fetch_csv_files(exchange="binance",
+                                         dataset="trades",
+                                         symbols=["BTCUSDT", "ETHUSDT"],
+                                         date_from=dt.date(2025, 1, 1),
+                                         date_upto=dt.date(2025, 1, 3))
+        assert all(x.status == "exists" for x in results)
+        assert len(_TardisStandIn.requests_seen) == count
+    finally:
+        server.shutdown()
+
+
+def test_resume_partial_download(tmp_path):
+    server = _start_server()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        url_path = "/v1/binance/trades/2025/01/01/BTCUSDT.csv.gz"
+        _TardisStandIn.flaky = dict()
+        _TardisStandIn.range_requests = []
+
+        tardis = TardisDownloader(api_key="",
+                                  base_tick_data_dir=pathlib.Path(tmp_path),
+                                  base_url=base_url,
+                                  backoff_sec=0.01)
+
+        # simulate an earlier, interrupted download
+        local_path = tmp_path / "tardis/binance/trades/2025/01/01/BTCUSDT.csv.gz"
+        local_path.parent.mkdir(parents=True)
+        content = _file_content(url_path)
+        with open(f"{local_path}.part", "wb") as f:
+            f.write(content[:100])
+
+        tardis.fetch_csv_file(year=2025, month=1, day=1, dataset="trades",
+                              exchange="binance", symbol="BTCUSDT")
+
+        assert _TardisStandIn.range_requests == [(url_path, "bytes=100-")]
+        assert local_path.read_bytes() == content
+        assert not pathlib.Path(f"{local_path}.part").exists()
+    finally:
+        server.shutdown()
+
+
+def test_corrupt_download_not_kept(tmp_path):
+    server = _start_server()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+        tardis = TardisDownloader(api_key="",
+                                  base_tick_data_dir=pathlib.Path(tmp_path),
+                                  base_url=base_url,
+                                  backoff_sec=0.01)
+        results = tardis.fetch_csv_files(exchange="binance",
+                                         dataset="trades",
+                                         symbols=["CORRUPT"],
+                                         date_from=dt.date(2025, 1, 1),
+                                         date_upto=dt.date(2025, 1, 2))
+        assert results[0].status == "failed"
+        assert not pathlib.Path(results[0].path).exists()
+        assert not pathlib.Path(f"{results[0].path}.part").exists()
+    finally:
+        server.shutdown()
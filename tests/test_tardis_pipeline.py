@@ -0,0 +1,73 @@
+import datetime as dt
+import gzip
+import http.server
+import threading
+import pathlib
+
+import pandas as pd
+
+from qsig.data.tardis.tardis_downloader import TardisDownloader
+from qsig.data.tardis.tardis_pipeline import run_trade_bins_pipeline
+from qsig.data.tardis.tardis_binner import build_trade_bin_uri
+from qsig.model.instrument import Instrument, ExchCode
+
+
+def _trades_csv(path: str) -> bytes:
+    # build a small raw trades file, in the Tardis CSV layout
+    parts = path.split("/")
+    t0 = pd.Timestamp(f"{parts[-4]}-{parts[-3]}-{parts[-2]}")
+    rows = ["exchange,symbol,timestamp,local_timestamp,id,side,price,amount"]
+    for i in range(100):
+        ts = int((t0 + pd.Timedelta(minutes=10 * i)).value / 1000)
+        side = "buy" if i % 2 else "sell"
+        rows.append(f"binance,X,{ts},{ts},{i},{side},{100 + i},{1 + i % 3}")
+    return gzip.compress("\n".join(rows).encode())
+
+
+class _TardisStandIn(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = _trades_csv(self.path)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_trade_bins_pipeline(tmp_path):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _TardisStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tardis = TardisDownloader(api_key="",
+                                  base_tick_data_dir=pathlib.Path(tmp_path),
+                                  base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        universe = [Instrument("BTC", "USDT", ExchCode.BINANCE),
+                    Instrument("ETH", "USDT", ExchCode.BINANCE)]
+        date_from = dt.date(2025, 1, 1)
+        date_upto = dt.date(2025, 1, 4)
+
+        report = run_trade_bins_pipeline(universe, date_from, date_upto, "1h",
+                                         tardis, download_workers=3,
+                                         bin_workers=2, queue_size=1,
+                                         use_processes=False)
+        assert report.download.files == 6
+        assert report.binning.files == 6
+        assert not report.errors
+
+        uri = build_trade_bin_uri(universe[1], dt.date(2025, 1, 2), "1h",
+                                  tick_home=pathlib.Path(tmp_path))
+        bins = pd.read_parquet(uri.path)
+        assert len(bins) == 24
+        assert bins["count"].sum() == 100
+
+        # second run finds all trade bins already built
+        report = run_trade_bins_pipeline(universe, date_from, date_upto, "1h",
+                                         tardis, use_processes=False)
+        assert report.skipped == 6
+        assert report.download.files == 0
+    finally:
+        server.shutdown()
@@ -0,0 +1,120 @@
+import datetime as dt
+import pathlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from qsig.data.tickfiles import (TickFileURI, scan_tick_files, tick_file_exists,
+                                 read_tick_file, read_tick_files, write_tick_file,
+                                 write_tick_files, migrate_tick_files_to_monthly, MONTHLY)
+
+
+def _uri(tick_home, date, symbol="BTCUSDT"):
+    return TickFileURI(filename=f"{symbol}.parquet", collection="binance",
+                       venue="binance", dataset="trades@1h", date=date,
+                       symbol=symbol, tick_home=tick_home)
+
+
+def _bars(date):
+    idx = pd.date_range(pd.Timestamp(date), periods=24, freq="h", unit="ns")
+    return pd.DataFrame({"open_time": idx,
+                         "close": np.arange(24.0) + date.day,
+                         "number_of_trades": np.arange(24)})
+
+
+def test_migrate_to_monthly(tmp_path):
+    tick_home = pathlib.Path(tmp_path)
+    dates = [dt.date(2024, 3, 1), dt.date(2024, 3, 2), dt.date(2024, 4, 1)]
+    for date in dates:
+        write_tick_file(_uri(tick_home, date), _bars(date))
+    write_tick_file(_uri(tick_home, dt.date(2024, 3, 3)), _bars(dt.date(2024, 3, 3)).iloc[:0])
+    assert len(scan_tick_files(tick_home)) == 4
+
+    monthly = migrate_tick_files_to_monthly(tick_home, remove_daily=True)
+    assert monthly == [_uri(tick_home, dates[0]).monthly_path,
+                       _uri(tick_home, dates[2]).monthly_path]
+    assert len(scan_tick_files(tick_home)) == 0
+
+    # reads work the same on the monthly layout
+    for date in dates:
+        uri = _uri(tick_home, date)
+        assert not uri.path.exists()
+        assert tick_file_exists(uri)
+        pd.testing.assert_frame_equal(read_tick_file(uri), _bars(date))
+    empty = read_tick_file(_uri(tick_home, dt.date(2024, 3, 3)), columns=["close"])
+    assert empty.empty and list(empty.columns) == ["close"]
+    assert not tick_file_exists(_uri(tick_home, dt.date(2024, 3, 4)))
+
+    frames = read_tick_files([_uri(tick_home, x) for x in
+                              [dt.date(2024, 3, 2), dt.date(2024, 3, 9), dt.date(2024, 4, 1)]],
+                             columns=["close"])
+    assert frames[1] is None
+    assert frames[0]["close"].iloc[0] == 2.0
+    assert list(frames[2].columns) == ["close"]
+
+    # new days are added to the existing monthly file
+    write_tick_file(_uri(tick_home, dt.date(2024, 3, 5)), _bars(dt.date(2024, 3, 5)))
+    assert not _uri(tick_home, dt.date(2024, 3, 5)).path.exists()
+    pd.testing.assert_frame_equal(read_tick_file(_uri(tick_home, dt.date(2024, 3, 5))),
+                                  _bars(dt.date(2024, 3, 5)))
+    pd.testing.assert_frame_equal(read_tick_file(_uri(tick_home, dates[0])), _bars(dates[0]))
+
+
+def test_migrate_keeping_daily_files(tmp_path):
+    tick_home = pathlib.Path(tmp_path)
+    dates = [dt.date(2024, 3, 1), dt.date(2024, 3, 2)]
+    for date in dates:
+        write_tick_file(_uri(tick_home, date), _bars(date))
+    assert migrate_tick_files_to_monthly(str(tick_home)) == [_uri(tick_home, dates[0]).monthly_path]
+    assert _uri(tick_home, dates[0]).path.exists()
+
+    # a rewritten day goes to the monthly file, and is read back from it
+    bars = _bars(dates[0])
+    bars["close"] += 1.0
+    write_tick_file(_uri(tick_home, dates[0]), bars)
+    pd.testing.assert_frame_equal(read_tick_file(_uri(tick_home, dates[0])), bars)
+    frames = read_tick_files([_uri(tick_home, x) for x in dates + [dt.date(2024, 3, 3)]])
+    pd.testing.assert_frame_equal(frames[0], bars)
+    pd.testing.assert_frame_equal(frames[1], _bars(dates[1]))
+    assert frames[2] is None
+
+
+def test_monthly_with_datetime_index(tmp_path):
+    tick_home = pathlib.Path(tmp_path)
+    date = dt.date(2024, 3, 1)
+    bars = _bars(date).set_index("open_time")
+    write_tick_file(_uri(tick_home, date), bars, layout=MONTHLY)
+    assert _uri(tick_home, date).monthly_path.exists()
+    pd.testing.assert_frame_equal(read_tick_file(_uri(tick_home, date), columns=["close"]),
+                                  bars[["close"]], check_freq=False)
+
+
+def _write_day(tick_home, day):
+    date = dt.date(2024, 3, day)
+    write_tick_file(_uri(tick_home, date), _bars(date))
+
+
+def test_concurrent_monthly_writes(tmp_path):
+    tick_home = pathlib.Path(tmp_path)
+    date = dt.date(2024, 3, 1)
+    write_tick_file(_uri(tick_home, date), _bars(date), layout=MONTHLY)
+
+    # writers of the same monthly file, in threads and in processes
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda day: _write_day(tick_home, day), range(2, 20)))
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_write_day, [tick_home] * 9, range(20, 29)))
+
+    month = _uri(tick_home, date).monthly_path
+    assert sorted(x.name for x in month.parent.iterdir()) == [month.name, month.name + ".lock"]
+    for day in range(1, 29):
+        date = dt.date(2024, 3, day)
+        pd.testing.assert_frame_equal(read_tick_file(_uri(tick_home, date)), _bars(date))
+
+    # a batch writes the days of each month together
+    dates = [dt.date(2024, 3, 29), dt.date(2024, 3, 30), dt.date(2024, 4, 1)]
+    write_tick_files([_uri(tick_home, x) for x in dates], [_bars(x) for x in dates],
+                     layout=MONTHLY)
+    for date in dates:
+        pd.testing.assert_frame_equal(read_tick_file(_uri(tick_home, date)), _bars(date))